@@ -0,0 +1,146 @@
+import collections
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import speech_recognition as sr
+
+from pipeline import capture, utterance
+from vad import Endpointer, VoiceActivityDetector
+
+
+class AudioStream:
+    """Long-lived microphone capture feeding a ring buffer.
+
+    A background thread reads the microphone continuously and keeps the
+    last ``buffer_seconds`` of audio, so nothing said between two
+    ``listen()`` calls is lost and the device is opened only once. Each
+    chunk is run through the voice activity detector as it arrives, and
+    the noise floor is tracked from the chunks without speech, which
+    replaces the blocking ``adjust_for_ambient_noise`` calibration.
+
+    Chunks are numbered from 0 as they are captured; ``listen`` and
+    ``read`` work with these positions.
+    """
+
+    def __init__(self, device_index: Optional[int] = None, sample_rate: int = 16000,
+                 chunk_size: int = 512, buffer_seconds: float = 30,
+                 vad: Optional[VoiceActivityDetector] = None, adapt_seconds: float = 2.0):
+        self.microphone = sr.Microphone(device_index=device_index, sample_rate=sample_rate,
+                                        chunk_size=chunk_size)
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.sample_width = 2  # sr.Microphone records 16-bit samples
+        self.chunk_seconds = chunk_size / sample_rate
+        # Two VAD frames per chunk
+        self.vad = vad or VoiceActivityDetector(frame_size=chunk_size // 2)
+        self.frame_seconds = self.vad.frame_size / sample_rate
+        # Fraction of the way the floor moves towards a quiet chunk's energy
+        self._adapt = min(self.chunk_seconds / adapt_seconds, 1.0)
+
+        self._chunks = collections.deque(maxlen=int(buffer_seconds / self.chunk_seconds))
+        self._speech = collections.deque(maxlen=self._chunks.maxlen)
+        self._captured = 0  # Number of chunks captured so far
+        self._condition = threading.Condition()
+        self.noise_floor = None
+        self.position = 0  # Where the next listen() starts reading
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+    @property
+    def energy_threshold(self) -> float:
+        """RMS energy above which a frame can count as speech"""
+        return self.vad.threshold(self.noise_floor)
+
+    @property
+    def closed(self) -> bool:
+        """True unless the stream is started and capturing"""
+        return self._thread is None or self._stop.is_set()
+
+    @property
+    def live_position(self) -> int:
+        """Position of the next chunk to be captured"""
+        with self._condition:
+            return self._captured
+
+    def start(self):
+        """Open the microphone and start capturing"""
+        if self._thread is None:
+            self.microphone.__enter__()
+            self._thread = threading.Thread(target=self._run, name="audio-capture", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        """Stop capturing and release the microphone"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self.microphone.__exit__(None, None, None)
+            self._thread = None
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                frames = self.microphone.stream.read(self.chunk_size)
+            except Exception as e:
+                self.error = e
+                print(f"Audio capture error: {e}")
+                time.sleep(0.1)
+                continue
+            speech, energy = self.vad.classify(np.frombuffer(frames, dtype=np.int16), self.noise_floor)
+            self._track_noise(float(energy.mean()) if energy.size else 0.0, bool(speech.any()))
+            with self._condition:
+                self._chunks.append(frames)
+                self._speech.append(speech)
+                self._captured += 1
+                self._condition.notify_all()
+
+    def _track_noise(self, energy: float, speech: bool):
+        """Follow the background level without letting speech drag it up"""
+        if self.noise_floor is None:
+            self.noise_floor = energy
+        elif energy < self.noise_floor:
+            # Falling noise is followed quickly
+            self.noise_floor += (energy - self.noise_floor) * min(self._adapt * 4, 1.0)
+        elif not speech:
+            self.noise_floor += (energy - self.noise_floor) * self._adapt
+
+    def read(self, position: int,
+             timeout: Optional[float] = None) -> Tuple[int, List[Tuple[bytes, np.ndarray]]]:
+        """Chunks captured from ``position`` on as ``(frames, speech_flags)``, waiting up to ``timeout`` for one.
+
+        Returns the position after the last chunk. Chunks that already
+        dropped out of the ring buffer are skipped.
+        """
+        with self._condition:
+            if position >= self._captured and not self._stop.is_set():
+                self._condition.wait(timeout)
+            oldest = self._captured - len(self._chunks)
+            start = max(position, oldest)
+            chunks = [(self._chunks[i - oldest], self._speech[i - oldest])
+                      for i in range(start, self._captured)]
+            return self._captured, chunks
+
+    def discard(self):
+        """Skip everything captured so far, e.g. the assistant's own voice"""
+        self.position = self.live_position
+
+    def listen(self, timeout: Optional[float] = None, max_seconds: Optional[float] = 30,
+               end_silence: float = 0.2, start: Optional[int] = None) -> sr.AudioData:
+        """Return the next phrase from the buffer, trimmed to the speech in it.
+
+        The phrase ends ``end_silence`` seconds after the VAD last heard
+        speech; ``max_seconds`` is only a safety cap. Reading starts at
+        ``start`` or where the previous call stopped. Raises
+        ``sr.WaitTimeoutError`` if no speech starts within ``timeout``
+        seconds of audio.
+        """
+        endpointer = Endpointer(self.frame_seconds, end_silence=end_silence)
+        pieces = utterance(capture(self, start), self.vad.frame_size * self.sample_width, endpointer,
+                           timeout, max_seconds)
+        return sr.AudioData(b"".join(pieces), self.sample_rate, self.sample_width)
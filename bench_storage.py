@@ -0,0 +1,106 @@
+"""Compare per-message write throughput of the storage layers.
+
+Usage: python bench_storage.py [--messages N] [--existing N]
+
+Runs in a temporary directory, so existing data files are never touched.
+"legacy" is the original whole-file rewrite of conversation_history.json
+and command_stats.json; "journal" is the current DatabaseManager with
+atomic JSON writes and file locking.
+"""
+import argparse
+import atexit
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class LegacyStore:
+    """The read-modify-rewrite implementation DatabaseManager used to have"""
+
+    def __init__(self):
+        self.history_file = "conversation_history.json"
+        self.stats_file = "command_stats.json"
+        for file in (self.history_file, self.stats_file):
+            with open(file, 'w') as f:
+                json.dump({}, f)
+
+    def _read_json(self, file):
+        try:
+            with open(file, 'r') as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def _write_json(self, file, data):
+        with open(file, 'w') as f:
+            json.dump(data, f, indent=4)
+
+    def log_message(self, speaker, text, conversation_id):
+        history = self._read_json(self.history_file)
+        history.setdefault(str(conversation_id), []).append({
+            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'speaker': speaker,
+            'message_text': text
+        })
+        self._write_json(self.history_file, history)
+
+    def log_command(self, command_type, command, success=True, error=None):
+        stats = self._read_json(self.stats_file)
+        counts = stats.setdefault(command_type, {'count': 0, 'successful': 0})
+        counts['count'] += 1
+        if success:
+            counts['successful'] += 1
+        self._write_json(self.stats_file, stats)
+
+    def close(self):
+        pass
+
+
+def run(store, messages, existing):
+    for i in range(existing):
+        store.log_message("USER", f"warm-up message {i}", 1)
+    started = time.perf_counter()
+    for i in range(messages):
+        store.log_message("USER", f"what is the weather like today {i}", 2)
+    message_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(messages):
+        store.log_command("weather", "what is the weather like today", success=i % 5 != 0)
+    command_seconds = time.perf_counter() - started
+    store.close()
+    return messages / message_seconds, messages / command_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500, help="timed writes of each kind")
+    parser.add_argument("--existing", type=int, default=5000, help="messages logged before timing")
+    args = parser.parse_args()
+
+    # Importing db_manager opens the default store in the working directory;
+    # cleanup is registered first so it runs after that store is closed
+    root = tempfile.mkdtemp(prefix="vassist-bench-")
+    atexit.register(shutil.rmtree, root, True)
+    os.chdir(root)
+    from db_manager import DatabaseManager
+
+    print(f"{args.messages} timed writes after {args.existing} existing messages")
+    print(f"{'store':<10}{'messages/s':>14}{'commands/s':>14}")
+    for name, factory in (("legacy", LegacyStore), ("journal", DatabaseManager)):
+        os.makedirs(os.path.join(root, name))
+        os.chdir(os.path.join(root, name))
+        try:
+            message_rate, command_rate = run(factory(), args.messages, args.existing)
+        finally:
+            os.chdir(root)
+        print(f"{name:<10}{message_rate:>14.0f}{command_rate:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import threading
+from typing import Dict, List, Optional
+
+from file_utils import atomic_write_json, read_json
+
+SYSTEM_PROMPT = ("You are a voice assistant. Your answers are spoken aloud, so keep them short "
+                 "and conversational, without lists or markdown.")
+SUMMARY_PROMPT = ("Summarize this conversation between a user and a voice assistant in at most "
+                  "{words} words. Keep names, facts, preferences and unanswered questions.")
+ROLES = {'USER': 'user', 'ASSISTANT': 'assistant'}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+class ChatContext:
+    """Builds the messages for an LLM question from the current conversation.
+
+    The prompt is the system prompt, a summary of older turns, and the
+    recent turns from the database, newest last. Once the recent turns
+    outgrow ``window_tokens``, the oldest half is folded into the summary
+    by the LLM in the background, so the prompt stays the same size
+    however long the session runs. Between folds every prompt starts
+    with the previous one, so Ollama can reuse its cached prefix.
+
+    Summaries are kept per conversation in ``summary_file``.
+    """
+
+    def __init__(self, db, llm, window_tokens: int = 1024, summary_tokens: int = 200,
+                 system_prompt: str = SYSTEM_PROMPT, summary_file: str = "chat_summaries.json",
+                 max_conversations: int = 20):
+        self.db = db
+        self.llm = llm
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.system_prompt = system_prompt
+        self.summary_file = summary_file
+        self.max_conversations = max_conversations
+        self._lock = threading.Lock()
+        self._folding = set()  # Conversations with a summary being written
+        self._folded: Dict[str, int] = {}  # Last message id left out of the window, per conversation
+        try:
+            self._summaries = read_json(summary_file)
+        except ValueError as e:
+            print(f"Ignoring chat summaries: {e}")
+            self._summaries = {}
+
+    def _recent_turns(self, conversation_id: int, after: int) -> List[Dict]:
+        """Turns newer than message ``after``, oldest first; reads back at most twice the window"""
+        turns, tokens, cursor = [], 0, None
+        while tokens < self.window_tokens * 2:
+            page, cursor = self.db.get_history_page(50, before=cursor, conversation_id=conversation_id)
+            for message in page:
+                if message['message_id'] <= after:
+                    cursor = None
+                    break
+                if message['speaker'] in ROLES:
+                    turns.append(message)
+                    tokens += estimate_tokens(message['message_text'])
+            if cursor is None:
+                break
+        turns.reverse()
+        # Spoken answers are logged a sentence at a time; join them back into turns
+        merged = []
+        for message in turns:
+            role = ROLES[message['speaker']]
+            if merged and merged[-1]['role'] == role:
+                merged[-1]['content'] += " " + message['message_text']
+                merged[-1]['message_id'] = message['message_id']
+            else:
+                merged.append({'role': role, 'content': message['message_text'],
+                               'message_id': message['message_id']})
+        return merged
+
+    def messages(self, query: str, conversation_id: Optional[int] = None) -> List[Dict]:
+        """Messages to send to the LLM for ``query``"""
+        messages = [{'role': 'system', 'content': self.system_prompt}]
+        if conversation_id is None:
+            return messages + [{'role': 'user', 'content': query}]
+        key = str(conversation_id)
+        with self._lock:
+            saved = self._summaries.get(key, {})
+            summary = saved.get('summary')
+            after = max(saved.get('through', -1), self._folded.get(key, -1))
+        try:
+            turns = self._recent_turns(conversation_id, after)
+        except Exception as e:
+            print(f"Could not read the conversation history: {e}")
+            turns = []
+        # The question itself may already be logged
+        if turns and turns[-1]['role'] == 'user' and turns[-1]['content'].strip().lower() == query.strip().lower():
+            turns.pop()
+
+        tokens = sum(estimate_tokens(turn['content']) for turn in turns)
+        if tokens + estimate_tokens(query) > self.window_tokens:
+            # Fold the oldest turns until the window is half full
+            cut = 0
+            while cut < len(turns) and tokens > self.window_tokens // 2:
+                tokens -= estimate_tokens(turns[cut]['content'])
+                cut += 1
+            folded, turns = turns[:cut], turns[cut:]
+            if folded:
+                self._fold(key, summary, folded)
+
+        if summary:
+            messages.append({'role': 'system', 'content': f"Earlier in this conversation: {summary}"})
+        messages.extend({'role': turn['role'], 'content': turn['content']} for turn in turns)
+        messages.append({'role': 'user', 'content': query})
+        return messages
+
+    def _fold(self, key: str, summary: Optional[str], turns: List[Dict]):
+        """Summarize ``turns`` into the conversation's summary in the background"""
+        with self._lock:
+            if key in self._folding:
+                # Summarized with the next fold; until then they stay in the window
+                return
+            # Left out of the window from now on, whether or not the summary is ready yet
+            self._folded[key] = turns[-1]['message_id']
+            self._folding.add(key)
+        threading.Thread(target=self._summarize, args=(key, summary, turns),
+                         name="chat-summary", daemon=True).start()
+
+    def _summarize(self, key: str, summary: Optional[str], turns: List[Dict]):
+        transcript = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        if summary:
+            transcript = f"Summary so far: {summary}\n{transcript}"
+        try:
+            text = self.llm.complete([
+                {'role': 'system', 'content': SUMMARY_PROMPT.format(words=self.summary_tokens * 3 // 4)},
+                {'role': 'user', 'content': transcript}
+            ], max_tokens=self.summary_tokens)
+            with self._lock:
+                self._summaries[key] = {'summary': text.strip(), 'through': turns[-1]['message_id']}
+                # Only the latest conversations are worth keeping
+                for old in sorted(self._summaries, key=int)[:-self.max_conversations]:
+                    del self._summaries[old]
+                atomic_write_json(self.summary_file, self._summaries)
+        except Exception as e:
+            print(f"Could not summarize the conversation: {e}")
+            with self._lock:
+                # Back into the window; the next question tries again
+                self._folded.pop(key, None)
+        finally:
+            with self._lock:
+                self._folding.discard(key)
@@ -0,0 +1,111 @@
+import datetime
+from typing import Dict, List, Optional
+
+# How long each bucket granularity is kept
+HOURLY_RETENTION = datetime.timedelta(days=7)
+DAILY_RETENTION = datetime.timedelta(days=400)
+
+
+def hour_bucket(moment: datetime.datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H")
+
+
+def day_bucket(moment: datetime.datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+def window_day_buckets(days: int, now: Optional[datetime.datetime] = None) -> List[str]:
+    """Daily bucket keys covering the last ``days`` days, today included"""
+    now = now or datetime.datetime.now()
+    return [day_bucket(now - datetime.timedelta(days=offset)) for offset in range(days)]
+
+
+def window_hour_buckets(hours: int, now: Optional[datetime.datetime] = None) -> List[str]:
+    """Hourly bucket keys covering the last ``hours`` hours, this hour included"""
+    now = now or datetime.datetime.now()
+    return [hour_bucket(now - datetime.timedelta(hours=offset)) for offset in range(hours)]
+
+
+class CommandRollups:
+    """Per-command counters pre-aggregated into hourly, daily and lifetime buckets.
+
+    Every bucket maps ``command_type -> [count, successful]``. Counters are
+    bumped at log time, so a window query only sums the buckets it covers.
+    """
+
+    def __init__(self, data: Optional[Dict] = None):
+        data = data or {}
+        if 'daily' not in data:
+            # Legacy command_stats.json: {type: {'count': n, 'successful': m}}
+            data = {'total': {cmd_type: [counts.get('count', 0), counts.get('successful', 0)]
+                              for cmd_type, counts in data.items()}}
+        self.total = data.get('total', {})
+        self.daily = data.get('daily', {})
+        self.hourly = data.get('hourly', {})
+        self.last_errors = data.get('last_errors', {})
+
+    def to_dict(self) -> Dict:
+        return {
+            'total': self.total,
+            'daily': self.daily,
+            'hourly': self.hourly,
+            'last_errors': self.last_errors
+        }
+
+    @staticmethod
+    def _bump(bucket: Dict, command_type: str, success: bool):
+        counts = bucket.setdefault(command_type, [0, 0])
+        counts[0] += 1
+        if success:
+            counts[1] += 1
+
+    def record(self, command_type: str, success: bool, error: Optional[str] = None,
+               moment: Optional[datetime.datetime] = None):
+        """Count one command execution in every granularity"""
+        moment = moment or datetime.datetime.now()
+        self._bump(self.total, command_type, success)
+        self._bump(self.daily.setdefault(day_bucket(moment), {}), command_type, success)
+        self._bump(self.hourly.setdefault(hour_bucket(moment), {}), command_type, success)
+        if error:
+            self.last_errors[command_type] = error
+
+    def prune(self, now: Optional[datetime.datetime] = None):
+        """Drop buckets that have aged out of their retention period"""
+        now = now or datetime.datetime.now()
+        oldest_hour = hour_bucket(now - HOURLY_RETENTION)
+        oldest_day = day_bucket(now - DAILY_RETENTION)
+        # Bucket keys sort chronologically, so a string compare is enough
+        self.hourly = {key: value for key, value in self.hourly.items() if key >= oldest_hour}
+        self.daily = {key: value for key, value in self.daily.items() if key >= oldest_day}
+
+    @staticmethod
+    def _sum(buckets: List[Dict]) -> Dict:
+        totals = {}
+        for bucket in buckets:
+            for cmd_type, (count, successful) in bucket.items():
+                entry = totals.setdefault(cmd_type, [0, 0])
+                entry[0] += count
+                entry[1] += successful
+        return totals
+
+    def window(self, days: Optional[int] = None, hours: Optional[int] = None) -> List[Dict]:
+        """Statistics for the last ``hours`` hours, the last ``days`` days, or all time"""
+        if hours is not None:
+            totals = self._sum([self.hourly[key] for key in window_hour_buckets(hours)
+                                if key in self.hourly])
+        elif days is not None:
+            totals = self._sum([self.daily[key] for key in window_day_buckets(days)
+                                if key in self.daily])
+        else:
+            totals = self.total
+
+        result = []
+        for cmd_type, (count, successful) in sorted(totals.items(), key=lambda item: -item[1][0]):
+            result.append({
+                'command_type': cmd_type,
+                'count': count,
+                'successful': successful,
+                'failed': count - successful,
+                'last_error': self.last_errors.get(cmd_type)
+            })
+        return result
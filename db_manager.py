@@ -1,115 +1,323 @@
+import atexit
 import datetime
-import json
 import os
-from typing import Dict, List, Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from command_stats import CommandRollups
+from file_utils import FileLock, atomic_write_json, file_signature, read_json
+from history_store import HistoryStore, JournalHistoryStore, migrate_json_history
+from journal import Journal
+from preferences import PreferenceCache
+from retention import ArchiveStore, RetentionPolicy
+
+# Rollups are rewritten at most this often outside batches; the command journal
+# syncs on the same schedule, so a crash loses the same window from both
+ROLLUP_SAVE_INTERVAL = 1.0
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, history_store: Optional[HistoryStore] = None):
         """Initialize database manager"""
         self.connection = True  # Simulated connection
         self.current_user_id = 1
         self.current_conversation_id = None
         self.preferences_file = "preferences.json"
-        self.history_file = "conversation_history.json"
-        self.stats_file = "command_stats.json"
+        self.history_file = "conversation_history.json"  # Legacy format, migrated on startup
+        self.stats_file = "command_stats.json"  # Rolled-up command counters
+        self.command_log_file = "command_log.journal"  # Every command execution
+        self.conversation_seq_file = "conversation_seq.json"  # Last allocated conversation id
+        self.conversations_file = "conversations.journal"  # Conversation start/end events
+        
+        # Writes may come from the GUI thread, the assistant thread and the write-behind queue
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._rollups_dirty = False
+        self._rollups_saved_at = time.monotonic()
+        # The CLI and the GUI may run side by side, so shared files also take a file lock
+        self._stats_lock = FileLock(self.stats_file + ".lock")
+        self._seq_lock = FileLock(self.conversation_seq_file + ".lock")
+        self._prefs_lock = FileLock(self.preferences_file + ".lock")
+        
+        # Conversation history lives in a pluggable storage engine
+        self.history = history_store or JournalHistoryStore()
         
         # Initialize files if they don't exist
         self._init_files()
+        
+        # Command events are journaled; the rollups are kept in memory and persisted on change
+        self.command_log = Journal(self.command_log_file)
+        self.conversations = Journal(self.conversations_file)
+        self.command_archive = ArchiveStore(os.path.join("archive", "commands-json"))
+        self.rollups = None
+        self._stats_signature = None
+        self._unsaved_commands = []  # Replayed onto the file if another process wrote it meanwhile
+        with self._stats_lock:
+            self._reload_rollups()
+        
+        # Preferences are read once and written back in the background
+        self.preferences = PreferenceCache(
+            load=lambda: self._read_json(self.preferences_file),
+            save=self._save_preferences)
     
     def _init_files(self):
         """Initialize JSON files if they don't exist"""
-        files = [self.preferences_file, self.history_file, self.stats_file]
+        files = [self.preferences_file, self.stats_file]
         for file in files:
             if not os.path.exists(file):
-                with open(file, 'w') as f:
-                    json.dump({}, f)
+                self._write_json(file, {})
+        
+        # Move any pre-journal history into the storage engine
+        migrated = migrate_json_history(self.history_file, self.history)
+        if migrated:
+            print(f"Migrated {migrated} messages from {self.history_file}")
     
     def _read_json(self, file: str) -> dict:
-        """Read JSON file"""
-        try:
-            with open(file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
+        """Read JSON file, recovering from its backup if damaged"""
+        return read_json(file)
     
     def _write_json(self, file: str, data: dict):
-        """Write JSON file"""
-        with open(file, 'w') as f:
-            json.dump(data, f, indent=4)
+        """Write JSON file atomically"""
+        atomic_write_json(file, data)
+    
+    @contextmanager
+    def batch(self):
+        """Group writes: rollups are persisted and journals synced once at the end"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._flush()
+    
+    def _reload_rollups(self):
+        """Re-read the rollups if another process wrote them; call with ``_stats_lock`` held"""
+        signature = file_signature(self.stats_file)
+        if self.rollups is not None and signature == self._stats_signature:
+            return
+        self.rollups = CommandRollups(self._read_json(self.stats_file))
+        for command_type, success, error, moment in self._unsaved_commands:
+            self.rollups.record(command_type, success, error, moment)
+        self._stats_signature = signature
+    
+    def _persist_rollups(self):
+        """Write the rollups back if they changed"""
+        if self._rollups_dirty:
+            with self._stats_lock:
+                self._reload_rollups()
+                self.rollups.prune()
+                self._write_json(self.stats_file, self.rollups.to_dict())
+                self._stats_signature = file_signature(self.stats_file)
+                self._unsaved_commands = []
+            self._rollups_dirty = False
+            self._rollups_saved_at = time.monotonic()
+    
+    def _flush(self):
+        """Persist dirty rollups and sync the journals"""
+        self._persist_rollups()
+        self.history.flush()
+        self.command_log.sync()
+        self.conversations.sync()
+    
+    def _allocate_conversation_id(self) -> int:
+        """Hand out the next conversation id from the persistent counter"""
+        with self._seq_lock:
+            last_id = self._read_json(self.conversation_seq_file).get('last_id')
+            if last_id is None:
+                # First run with the counter: continue after any existing history
+                last_id = self.history.last_conversation_id()
+            conversation_id = last_id + 1
+            self._write_json(self.conversation_seq_file, {'last_id': conversation_id})
+        return conversation_id
     
     def start_conversation(self) -> int:
         """Start a new conversation"""
-        history = self._read_json(self.history_file)
-        conversation_id = len(history) + 1
-        self.current_conversation_id = conversation_id
-        return conversation_id
+        with self._lock:
+            conversation_id = self._allocate_conversation_id()
+            self.conversations.append({
+                'event': 'start',
+                'conversation_id': conversation_id,
+                'user_id': self.current_user_id,
+                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            self.current_conversation_id = conversation_id
+            return conversation_id
     
     def end_conversation(self, conversation_id: int):
         """End a conversation"""
-        pass  # No need to do anything in file-based storage
+        with self._lock:
+            self.conversations.append({
+                'event': 'end',
+                'conversation_id': conversation_id,
+                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+            # Make sure the whole conversation is on disk
+            self._flush()
+    
+    def get_conversations(self, limit: int = 20) -> List[Dict]:
+        """Get the most recent conversations with their start and end times, newest first"""
+        result, end_times = [], {}
+        with self._lock:
+            self.conversations.refresh()
+            # End events always follow their start, so walking backwards sees them first
+            for _, event in self.conversations.iter_reverse():
+                if event['event'] == 'end':
+                    end_times.setdefault(event['conversation_id'], event['timestamp'])
+                    continue
+                result.append({
+                    'conversation_id': event['conversation_id'],
+                    'start_time': event['timestamp'],
+                    'end_time': end_times.get(event['conversation_id'])
+                })
+                if len(result) >= limit:
+                    break
+        return result
     
-    def log_message(self, speaker: str, text: str, conversation_id: int):
+    def log_message(self, speaker: str, text: str, conversation_id: int, timestamp: str = None):
         """Log a message to the conversation history"""
-        history = self._read_json(self.history_file)
-        if str(conversation_id) not in history:
-            history[str(conversation_id)] = []
-        
-        message = {
-            'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),  # Store as formatted string
-            'speaker': speaker,
-            'message_text': text
-        }
-        history[str(conversation_id)].append(message)
-        self._write_json(self.history_file, history)
-    
-    def log_command(self, command_type: str, command: str, success: bool = True, error: str = None):
+        timestamp = timestamp or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Store as formatted string
+        with self._lock:
+            self.history.append(conversation_id, timestamp, speaker, text)
+    
+    def log_command(self, command_type: str, command: str, success: bool = True, error: str = None,
+                    timestamp: str = None):
         """Log a command execution"""
-        stats = self._read_json(self.stats_file)
-        if command_type not in stats:
-            stats[command_type] = {'count': 0, 'successful': 0}
-        
-        stats[command_type]['count'] += 1
-        if success:
-            stats[command_type]['successful'] += 1
-        
-        self._write_json(self.stats_file, stats)
+        if timestamp:
+            now = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+        else:
+            now = datetime.datetime.now()
+        with self._lock:
+            self.command_log.append({
+                'timestamp': now.strftime("%Y-%m-%d %H:%M:%S"),
+                'command_type': command_type,
+                'command_text': command,
+                'success': success,
+                'error_message': error
+            })
+            
+            # Keep the pre-aggregated buckets current so window queries never scan the log
+            self.rollups.record(command_type, success, error, now)
+            self.rollups.prune(now)
+            self._unsaved_commands.append((command_type, success, error, now))
+            self._rollups_dirty = True
+            if (not self._batch_depth
+                    and time.monotonic() - self._rollups_saved_at >= ROLLUP_SAVE_INTERVAL):
+                self._persist_rollups()
     
     def get_conversation_history(self, limit: int = 50) -> List[Dict]:
-        """Get conversation history"""
-        history = self._read_json(self.history_file)
-        all_messages = []
-        
-        for conv_id, messages in history.items():
-            all_messages.extend(messages)
-        
-        # Sort by timestamp and limit
-        all_messages.sort(key=lambda x: x['timestamp'], reverse=True)
-        return all_messages[:limit]
-    
-    def get_command_statistics(self, days: int = 7) -> List[Dict]:
-        """Get command statistics"""
-        stats = self._read_json(self.stats_file)
-        result = []
-        
-        for cmd_type, data in stats.items():
-            result.append({
-                'command_type': cmd_type,
-                'count': data['count'],
-                'successful': data['successful']
-            })
-        
+        """Get conversation history, newest first"""
+        # The journal is already in time order, so only the tail is read
+        with self._lock:
+            return self.history.recent(limit)
+    
+    def get_history_page(self, limit: int = 50, before: Optional[int] = None,
+                         conversation_id: Optional[int] = None, speaker: Optional[str] = None,
+                         before_timestamp: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Get one page of history, newest first, plus the cursor for the next (older) page"""
+        with self._lock:
+            return self.history.page(limit, before, conversation_id, speaker, before_timestamp)
+    
+    def search_messages(self, query: str, limit: int = 20, speaker: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Full-text search over history; supports "quoted phrases", best match first"""
+        with self._lock:
+            return self.history.search(query, limit, speaker, since, until)
+    
+    def get_command_statistics(self, days: Optional[int] = 7, hours: Optional[int] = None) -> List[Dict]:
+        """Get command statistics for the last ``hours``/``days`` (all time if both are None)"""
+        with self._lock, self._stats_lock:
+            self._reload_rollups()
+            return self.rollups.window(days=days, hours=hours)
+    
+    def get_command_errors(self, limit: int = 20, command_type: str = None) -> List[Dict]:
+        """Get the most recent failed commands, newest first"""
+        errors = []
+        with self._lock:
+            self.command_log.refresh()
+            for _, event in self.command_log.iter_reverse():
+                if event['success'] or (command_type and event['command_type'] != command_type):
+                    continue
+                errors.append(event)
+                if len(errors) >= limit:
+                    break
+        return errors
+    
+    def compact(self, policy: Optional[RetentionPolicy] = None) -> Dict:
+        """Archive cold history and command events and apply the retention policy"""
+        policy = policy or RetentionPolicy()
+        now = datetime.datetime.now()
+        with self._lock:
+            self._flush()
+            result = self.history.compact(policy, now)
+            
+            # Command events only need archiving; the rollups already hold their counts
+            with self.command_log.lock:
+                self.command_log.refresh()
+                self.command_archive.reload()
+                events = list(self.command_log)
+                archive_cutoff = policy.archive_cutoff(now)
+                expiry_cutoff = policy.expiry_cutoff(now)
+                cut = 0
+                while archive_cutoff and cut < len(events) and events[cut]['timestamp'] < archive_cutoff:
+                    cut += 1
+                if cut:
+                    first_id = self.command_archive.next_id()
+                    archived = [dict(event, log_id=first_id + position)
+                                for position, event in enumerate(events[:cut])
+                                if not expiry_cutoff or event['timestamp'] >= expiry_cutoff]
+                    self.command_archive.write_segment(archived, id_key='log_id')
+                    self.command_archive.advance(first_id + cut)
+                    self.command_log.replace_contents(events[cut:])
+                self.command_archive.enforce(policy, now, hot_bytes=self.command_log.size)
+            result['archived_commands'] = cut
         return result
     
+    def _save_preferences(self, prefs: Dict, changed: set):
+        """Write only the changed keys, keeping what other processes saved"""
+        with self._prefs_lock:
+            on_disk = self._read_json(self.preferences_file)
+            on_disk.update({key: prefs[key] for key in changed})
+            self._write_json(self.preferences_file, on_disk)
+    
     def get_user_preference(self, key: str, default: str = None) -> str:
         """Get a user preference"""
-        prefs = self._read_json(self.preferences_file)
-        return prefs.get(key, default)
+        return self.preferences.get(key, default)
     
     def set_user_preference(self, key: str, value: str):
         """Set a user preference"""
-        prefs = self._read_json(self.preferences_file)
-        prefs[key] = value
-        self._write_json(self.preferences_file, prefs)
+        self.preferences.set(key, value)
+    
+    def subscribe_preferences(self, callback: Callable[[str, str], None],
+                              keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """Get notified when preferences change; returns an unsubscribe function"""
+        return self.preferences.subscribe(callback, keys)
+    
+    def close(self):
+        """Flush and close the storage engine"""
+        with self._lock:
+            if self.command_log.closed:
+                return
+            self.preferences.flush()
+            self._flush()
+            self.history.close()
+            self.command_log.close()
+            self.conversations.close()
+
+def create_database_manager(backend: str = None):
+    """Create the storage backend named by ``backend`` or $VASSIST_DB_BACKEND.
+
+    "json" (the default) keeps the file-based store; "sqlite" uses
+    SQLiteDatabaseManager with the schema from db_setup.py.
+    """
+    backend = (backend or os.environ.get("VASSIST_DB_BACKEND", "json")).lower()
+    if backend == "sqlite":
+        from sqlite_manager import SQLiteDatabaseManager
+        return SQLiteDatabaseManager(os.environ.get("VASSIST_DB_PATH", "voice_assistant.db"))
+    return DatabaseManager()
 
 # Create a global instance
-db = DatabaseManager()
\ No newline at end of file
+db = create_database_manager()
+atexit.register(db.close)
\ No newline at end of file
@@ -0,0 +1,233 @@
+import difflib
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Words that introduce a slot, longest phrases first so "with the subject" wins over "subject"
+SUBJECT_MARKERS = [("with", "the", "subject"), ("with", "subject"), ("and", "the", "subject"), ("the", "subject"),
+                   ("subject", "line"), ("subject",), ("titled",), ("called",), ("regarding",), ("about",)]
+BODY_MARKERS = [("and", "the", "message", "is"), ("with", "the", "message"), ("the", "message"), ("that", "says"),
+                ("which", "says"), ("and", "say"), ("and", "tell", "him"), ("and", "tell", "her"),
+                ("and", "tell", "them"), ("tell", "him"), ("tell", "her"), ("tell", "them"),
+                ("saying",), ("message",), ("body",)]
+# Words of the command itself, before the recipient: "send an email to ..."
+LEAD_WORDS = {"please", "send", "compose", "write", "draft", "an", "a", "new", "email", "e", "mail", "message",
+              "to"}
+# Filler between a marker and the value: "the subject is lunch"
+VALUE_FILLER = {"is", "should", "be", "to", "of"}
+# Left over before a marker the parser didn't know: "sachin and the ..."
+TRAILING_FILLER = {"the", "and", "with"}
+CANCEL_WORDS = {"cancel", "stop", "nevermind", "forget"}
+CONFIRM_WORDS = {"send", "yes", "yeah", "sure", "confirm"}
+NEGATIONS = {"no", "not", "dont", "nope"}
+SLOTS = ("recipient", "subject", "body")
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", word.lower())
+
+
+def soundex(word: str) -> str:
+    """Four-character sound code, so "sashin" and "sachin" come out the same"""
+    codes = {c: str(d) for d, letters in enumerate(["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"])
+             for c in letters}
+    word = _norm(word)
+    if not word:
+        return ""
+    result, last = word[0], codes.get(word[0])
+    for c in word[1:]:
+        code = codes.get(c)
+        if code and code != "0" and code != last:
+            result += code
+        if c not in "hw":
+            last = code
+    return (result + "000")[:4]
+
+
+class ContactIndex:
+    """Spoken forms of the contact names, built once, for fuzzy lookups.
+
+    A contact can be named in full, by any word of its name that no
+    other contact shares, with the words run together ("sar mad") or by
+    something that sounds or spells close enough (``cutoff`` is the
+    difflib similarity needed).
+    """
+
+    def __init__(self, contacts: Dict[str, str], cutoff: float = 0.75):
+        self.cutoff = cutoff
+        self.contacts: Dict[str, str] = {}
+        self._keys: Dict[str, Optional[str]] = {}  # Spoken form -> contact name, None if ambiguous
+        self._sounds: Dict[str, Optional[str]] = {}  # Soundex of a single word -> contact name
+        for name, address in contacts.items():
+            words = [_norm(word) for word in name.split() if _norm(word)]
+            if not words or "@" not in address:
+                continue
+            self.contacts[name] = address
+            forms = {" ".join(words), "".join(words)} | set(words)
+            for form in forms:
+                self._keys[form] = name if self._keys.get(form, name) == name else None
+            for word in words:
+                code = soundex(word)
+                self._sounds[code] = name if self._sounds.get(code, name) == name else None
+        self._forms = [form for form, name in self._keys.items() if name is not None]
+
+    def names(self) -> List[str]:
+        return list(self.contacts)
+
+    def match(self, text: str) -> Optional[str]:
+        """The contact named in ``text``, or None"""
+        words = [_norm(word) for word in text.split() if _norm(word)]
+        if not words:
+            return None
+        # Longest runs of words first, so "dante lizzar" beats "dante"
+        spans = [(start, start + size) for size in range(min(3, len(words)), 0, -1)
+                 for start in range(len(words) - size + 1)]
+        for start, end in spans:
+            for form in (" ".join(words[start:end]), "".join(words[start:end])):
+                if self._keys.get(form):
+                    return self._keys[form]
+        best, best_score = None, self.cutoff
+        for start, end in spans:
+            for form in (" ".join(words[start:end]), "".join(words[start:end])):
+                for candidate in difflib.get_close_matches(form, self._forms, n=1, cutoff=best_score):
+                    score = difflib.SequenceMatcher(None, form, candidate).ratio()
+                    if score >= best_score:
+                        best, best_score = self._keys[candidate], score
+        if best is not None:
+            return best
+        for word in words:
+            name = self._sounds.get(soundex(word))
+            if name is not None and len(word) > 2:
+                return name
+        return None
+
+
+def _find(norm: Sequence[str], markers, start: int = 0) -> Optional[Tuple[int, int]]:
+    """Earliest marker in ``norm`` at or after ``start``, as (start, end) word positions"""
+    for position in range(start, len(norm)):
+        for marker in markers:
+            if tuple(norm[position:position + len(marker)]) == marker:
+                return position, position + len(marker)
+    return None
+
+
+def _value(words: Sequence[str], norm: Sequence[str], start: int, end: int) -> str:
+    while start < end and norm[start] in VALUE_FILLER:
+        start += 1
+    if end < len(words):
+        # Cut short by the next marker; the body runs to the end and is kept as said
+        while end > start and norm[end - 1] in TRAILING_FILLER:
+            end -= 1
+    return " ".join(words[start:end]).strip(" ,.")
+
+
+def parse_email(text: str, first_slot: str = "recipient") -> Dict[str, str]:
+    """Slots spoken in ``text``: "email sachin subject lunch saying see you at noon" gives
+    recipient "sachin", subject "lunch" and body "see you at noon".
+
+    Words before any marker fill ``first_slot``, which is how replies to
+    a question are read. The body always runs to the end, so markers
+    inside it ("tell him about lunch") are kept as said.
+    """
+    if first_slot == "body":
+        return {'body': text.strip()} if text.strip() else {}
+    words = text.split()
+    norm = [_norm(word) for word in words]
+    slots = {}
+    lead = 0
+    if first_slot == "recipient":
+        while lead < len(norm) and (norm[lead] in LEAD_WORDS or not norm[lead]):
+            lead += 1
+    body = _find(norm, BODY_MARKERS, lead)
+    subject = _find(norm, SUBJECT_MARKERS, lead)
+    if subject is not None and body is not None and subject[0] > body[0]:
+        subject = None  # Said as part of the body
+    stop = len(words) if body is None else body[0]
+    if subject is not None:
+        slots['subject'] = _value(words, norm, subject[1], stop)
+        stop = min(stop, subject[0])
+    if not slots.get(first_slot):
+        # "the subject is lunch" names the slot it answers
+        slots[first_slot] = _value(words, norm, lead, stop)
+    if body is not None:
+        slots['body'] = _value(words, norm, body[1], len(words))
+    return {slot: value for slot, value in slots.items() if value}
+
+
+class EmailDialog:
+    """Fills in an email from what the user says, asking only for what is missing.
+
+    ``ask(question)`` speaks a question and returns the reply ("" if
+    nothing was understood); ``say(text)`` just speaks. Each question is
+    asked at most ``attempts`` times before the dialogue gives up.
+    """
+
+    QUESTIONS = {'subject': "What should the subject be?",
+                 'body': "What would you like the email to say?"}
+
+    def __init__(self, contacts: ContactIndex, ask: Callable[[str], str], say: Callable[[str], None],
+                 attempts: int = 3):
+        self.contacts = contacts
+        self.ask = ask
+        self.say = say
+        self.attempts = attempts
+
+    def run(self, command: str = "") -> Optional[Dict[str, str]]:
+        """The confirmed email as name, to, subject and body; None if the user cancelled or gave up"""
+        slots = {}
+        self._fill(slots, parse_email(command))
+        for slot in SLOTS:
+            question = self._question(slot)
+            tries = 0
+            while slot not in slots:
+                if tries == self.attempts:
+                    self.say("Sorry, I couldn't get that. Let's try the email again later.")
+                    return None
+                tries += 1
+                reply = self.ask(question)
+                if not reply:
+                    question = "I didn't catch that. " + self._question(slot)
+                    continue
+                if self._cancelled(reply):
+                    self.say("Email cancelled.")
+                    return None
+                # An answer may carry later slots too: "lunch, saying see you at noon"
+                self._fill(slots, parse_email(reply, first_slot=slot))
+                if slot == "recipient" and slot not in slots:
+                    question = "Please say one of your contacts: " + ", ".join(self.contacts.names())
+
+        name = slots['recipient']
+        question = (f"Ready to send to {name}. Subject: {slots['subject']}. Message: {slots['body']}. "
+                    "Say 'send' to confirm or 'cancel' to stop.")
+        for _ in range(self.attempts):
+            reply = {_norm(word) for word in self.ask(question).split()}
+            if reply & CONFIRM_WORDS and not reply & NEGATIONS:
+                return {'name': name, 'to': self.contacts.contacts[name],
+                        'subject': slots['subject'], 'body': slots['body']}
+            if reply:
+                break
+            question = "Should I send it? Say 'send' or 'cancel'."
+        self.say("Email cancelled.")
+        return None
+
+    def _question(self, slot: str) -> str:
+        if slot == "recipient":
+            return "Who would you like to email? Your contacts are: " + ", ".join(self.contacts.names())
+        return self.QUESTIONS[slot]
+
+    def _fill(self, slots: Dict[str, str], heard: Dict[str, str]):
+        """Take the slots in ``heard`` that are still missing; the recipient must be a contact"""
+        for slot, spoken in heard.items():
+            if slot in slots:
+                continue
+            if slot == "recipient":
+                name = self.contacts.match(spoken)
+                if name is None:
+                    self.say(f"I don't have {spoken} in your contacts.")
+                    continue
+                spoken = name
+            slots[slot] = spoken
+
+    @staticmethod
+    def _cancelled(reply: str) -> bool:
+        words = [_norm(word) for word in reply.split()]
+        return len(words) <= 3 and bool(set(words) & CANCEL_WORDS)
@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class CorruptFileError(ValueError):
+    """A JSON file and its backup are both unreadable"""
+
+
+def _checksum(data) -> int:
+    # Canonical encoding, so the checksum does not depend on key order or indentation
+    return zlib.crc32(json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+
+
+def fsync_directory(directory: str):
+    """Make a rename durable; not supported (or needed) on Windows"""
+    if fcntl is None:
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data, indent: int = 4, backup: bool = True):
+    """Write JSON to a temp file in the same directory, then rename it over ``path``.
+
+    Readers see either the old file or the new one, never a truncated mix.
+    The data is stored with a CRC32 so ``read_json`` can tell a damaged
+    file from a valid one, and the previous version is kept as
+    ``<path>.bak`` to recover from.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'crc32': _checksum(data), 'data': data}, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        if backup and os.path.exists(path):
+            # Hard-link the current version instead of copying it
+            try:
+                os.link(path, tmp_path + ".bak")
+                os.replace(tmp_path + ".bak", path + ".bak")
+            except OSError:
+                pass
+        os.replace(tmp_path, path)
+        fsync_directory(directory)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def file_signature(path: str):
+    """Changes whenever ``path`` is rewritten; None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _load_checked(path: str):
+    with open(path, 'r') as f:
+        content = json.load(f)
+    if isinstance(content, dict) and set(content) == {'crc32', 'data'}:
+        if _checksum(content['data']) != content['crc32']:
+            raise ValueError("checksum mismatch")
+        return content['data']
+    # Written before checksums were added
+    return content
+
+
+def read_json(path: str, default=None):
+    """Read a file written by ``atomic_write_json``.
+
+    A missing file gives ``default`` (``{}`` if None). A damaged file is
+    replaced by its ``.bak``; if that is unusable too, CorruptFileError is
+    raised rather than handing back an empty dict that would then be
+    written over the real data.
+    """
+    if not os.path.exists(path):
+        return {} if default is None else default
+    try:
+        return _load_checked(path)
+    except (OSError, ValueError) as e:
+        error = e
+    try:
+        data = _load_checked(path + ".bak")
+    except (OSError, ValueError):
+        raise CorruptFileError(f"{path} is damaged ({error}) and has no usable backup")
+    print(f"Recovered {path} from backup after: {error}")
+    os.replace(path, path + ".corrupt")
+    atomic_write_json(path, data, backup=False)
+    return data
+
+
+class FileLock:
+    """Advisory exclusive lock shared by every process using the same ``path``.
+
+    Re-entrant within a process, so a holder may call code that locks
+    again. The lock file itself holds no data.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._file is None:
+                    # Kept open between acquisitions, so locking costs one system call
+                    self._file = open(self.path, 'a+b')
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._file.seek(0)
+                    # LK_NBLCK fails at once while another process holds it; back off between tries
+                    delay = 0.001
+                    while True:
+                        try:
+                            msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                            break
+                        except OSError:
+                            time.sleep(delay)
+                            delay = min(delay * 2, 0.1)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
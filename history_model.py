@@ -0,0 +1,136 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """Conversation history that loads one keyset page at a time.
+
+    Views ask ``canFetchMore``/``fetchMore`` as the user scrolls towards
+    the bottom, so only the pages actually looked at are read from the
+    database. At most ``max_pages`` pages are held: going further drops
+    the page at the other end, and ``fetchPrevious`` reads it again by
+    its cursor when the user scrolls back up.
+    """
+
+    COLUMNS = ["Time", "Speaker", "Message"]
+    KEYS = ['timestamp', 'speaker', 'message_text']
+
+    def __init__(self, db, page_size=100, max_pages=10, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.filters = {}
+        self._reset()
+
+    def _reset(self):
+        self._rows = []
+        self._cursors = []  # The cursor each page was read from, for every page seen so far
+        self._sizes = []  # Rows of each loaded page
+        self._top = 0  # Number of the first loaded page
+        self._cursor = None
+        self._exhausted = False
+
+    def set_filters(self, conversation_id=None, speaker=None, before_timestamp=None):
+        """Restart from the newest message with new filters"""
+        self.filters = {
+            'conversation_id': conversation_id,
+            'speaker': speaker,
+            'before_timestamp': before_timestamp
+        }
+        self.refresh()
+
+    def refresh(self):
+        """Drop loaded pages and fetch the newest one"""
+        self.beginResetModel()
+        self._reset()
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def show_results(self, messages):
+        """Replace the paged history with a fixed list, e.g. search results"""
+        self.beginResetModel()
+        self._reset()
+        self._rows = list(messages)
+        self._exhausted = True
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        value = self._rows[index.row()].get(self.KEYS[index.column()])
+        if hasattr(value, 'strftime'):
+            value = value.strftime("%Y-%m-%d %H:%M:%S")
+        return str(value) if value is not None else ""
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def _read_page(self, cursor):
+        # Only the first page applies the timestamp filter; later pages follow the cursor
+        filters = dict(self.filters)
+        if cursor is not None:
+            filters.pop('before_timestamp', None)
+        return self.db.get_history_page(limit=self.page_size, before=cursor, **filters)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        number = self._top + len(self._sizes)
+        cursor = self._cursor
+        messages, self._cursor = self._read_page(cursor)
+        self._exhausted = self._cursor is None
+        if not messages:
+            return
+        if number == len(self._cursors):
+            # The newest page is kept by the bound it was first read at, so messages
+            # logged since then do not shift it when it is read again
+            self._cursors.append(cursor if cursor is not None else messages[0]['message_id'] + 1)
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(messages) - 1)
+        self._rows.extend(messages)
+        self._sizes.append(len(messages))
+        self.endInsertRows()
+        if len(self._sizes) > self.max_pages:
+            # Drop the newest page; fetchPrevious reads it again
+            size = self._sizes.pop(0)
+            self.beginRemoveRows(QModelIndex(), 0, size - 1)
+            del self._rows[:size]
+            self.endRemoveRows()
+            self._top += 1
+
+    def canFetchPrevious(self):
+        return self._top > 0
+
+    def fetchPrevious(self):
+        """Read back the page above the first loaded one; returns how many rows were added at the top"""
+        if not self._top:
+            return 0
+        messages, _ = self._read_page(self._cursors[self._top - 1])
+        self._top -= 1
+        if not messages:
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._rows[:0] = messages
+        self._sizes.insert(0, len(messages))
+        self.endInsertRows()
+        if len(self._sizes) > self.max_pages:
+            # Drop the oldest page; fetchMore reads it again from its cursor
+            size = self._sizes.pop()
+            first = len(self._rows) - size
+            self.beginRemoveRows(QModelIndex(), first, len(self._rows) - 1)
+            del self._rows[first:]
+            self.endRemoveRows()
+            self._cursor = self._cursors[self._top + len(self._sizes)]
+            self._exhausted = False
+        return len(messages)
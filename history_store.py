@@ -0,0 +1,323 @@
+import bisect
+import datetime
+import json
+import os
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from journal import Journal
+from retention import ArchiveStore, RetentionPolicy
+from search_index import InvertedIndex
+
+
+class HistoryStore:
+    """Storage engine interface used by DatabaseManager for conversation history"""
+
+    def append(self, conversation_id: int, timestamp: str, speaker: str, text: str):
+        """Persist one message"""
+        raise NotImplementedError
+
+    def recent(self, limit: int) -> List[Dict]:
+        """Return the newest ``limit`` messages, newest first"""
+        raise NotImplementedError
+
+    def page(self, limit: int, before: Optional[int] = None, conversation_id: Optional[int] = None,
+             speaker: Optional[str] = None,
+             before_timestamp: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Return up to ``limit`` messages older than cursor ``before``, newest first.
+
+        The second item is the cursor for the next (older) page, or None
+        when there is nothing left.
+        """
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int = 20, speaker: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Full-text search; best match first, each message carrying a ``score``"""
+        raise NotImplementedError
+
+    def compact(self, policy, now=None) -> Dict:
+        """Archive cold messages and apply ``policy``; returns what was done"""
+        raise NotImplementedError
+
+    def last_conversation_id(self) -> int:
+        """Highest conversation id seen so far (0 if none)"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Push buffered writes to stable storage"""
+
+    def close(self):
+        """Release any open files"""
+
+
+class JournalHistoryStore(HistoryStore):
+    """History kept in an append-only journal, one record per message.
+
+    Every record carries a ``message_id`` that keeps growing across
+    compactions. Messages moved out by ``compact`` live in an
+    ArchiveStore and are still returned by ``page``/``recent``.
+    """
+
+    def __init__(self, path: str = "conversation_history.journal",
+                 archive: Optional[ArchiveStore] = None, **journal_options):
+        self.journal = Journal(path, **journal_options)
+        self.archive = archive or ArchiveStore(os.path.join(os.path.dirname(path), "archive", "history-json"))
+        self._set_base()
+        # Message ids per conversation / per speaker, built on first use and kept in memory
+        # (16 bytes per hot message; compact() is what keeps the hot journal small)
+        self._by_conversation = None
+        self._by_speaker = None
+        self._max_conversation_id = 0
+        # Full-text index, loaded from its snapshot on first search
+        self.search_index_path = path + ".search"
+        self._search_index = None
+        self._search_dirty = False
+
+    def _set_base(self):
+        """Message id of the first record in the hot journal"""
+        if len(self.journal):
+            # Records written before compaction existed have no id and start at 0
+            self.base = self.journal.read(0).get('message_id', 0)
+        else:
+            self.base = self.archive.next_id()
+
+    @property
+    def end(self) -> int:
+        """The id the next message will get"""
+        return self.base + len(self.journal)
+
+    def _catch_up(self):
+        """Pick up messages another process wrote to the shared journal"""
+        previous_end = self.end
+        if self.journal.refresh():
+            # Compacted elsewhere: the base moved, so the indexes start over
+            self.archive.reload()
+            self._set_base()
+            self._by_conversation = self._by_speaker = None
+            self._search_index = None
+            self._search_dirty = False
+            return
+        if self.end == previous_end or (self._by_conversation is None and self._search_index is None):
+            return
+        for offset, record in enumerate(self.journal.read_range(previous_end - self.base,
+                                                                 len(self.journal))):
+            message_id = previous_end + offset
+            if self._by_conversation is not None:
+                self._index_record(message_id, record['conversation_id'], record['speaker'])
+            if self._search_index is not None:
+                self._search_index.add(message_id, record['message_text'], record['speaker'],
+                                       record['timestamp'])
+                self._search_dirty = True
+
+    def _read(self, message_id: int) -> Dict:
+        record = self.journal.read(message_id - self.base)
+        record['message_id'] = message_id
+        return record
+
+    def _build_indexes(self):
+        """Scan the journal once to build the secondary indexes"""
+        self._by_conversation, self._by_speaker = {}, {}
+        for offset, record in enumerate(self.journal):
+            self._index_record(self.base + offset, record['conversation_id'], record['speaker'])
+
+    def _index_record(self, message_id: int, conversation_id: int, speaker: str):
+        self._by_conversation.setdefault(conversation_id, array('q')).append(message_id)
+        self._by_speaker.setdefault(speaker, array('q')).append(message_id)
+        self._max_conversation_id = max(self._max_conversation_id, conversation_id)
+
+    def append(self, conversation_id: int, timestamp: str, speaker: str, text: str):
+        # Hold the journal lock so no other process takes the same id
+        with self.journal.lock:
+            self._catch_up()
+            message_id = self.end
+            self.journal.append({
+                'message_id': message_id,
+                'conversation_id': conversation_id,
+                'timestamp': timestamp,
+                'speaker': speaker,
+                'message_text': text
+            })
+        if self._by_conversation is not None:
+            self._index_record(message_id, conversation_id, speaker)
+        if self._search_index is not None:
+            self._search_index.add(message_id, text, speaker, timestamp)
+            self._search_dirty = True
+
+    def recent(self, limit: int) -> List[Dict]:
+        return self.page(limit)[0]
+
+    def _first_at_or_after(self, timestamp: str) -> int:
+        """Id of the first hot message logged at or after ``timestamp``"""
+        low, high = 0, len(self.journal)
+        while low < high:
+            mid = (low + high) // 2
+            if self.journal.read(mid)['timestamp'] < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return self.base + low
+
+    def page(self, limit: int, before: Optional[int] = None, conversation_id: Optional[int] = None,
+             speaker: Optional[str] = None,
+             before_timestamp: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+        self._catch_up()
+        # Message ids grow with time, so they double as the keyset cursor
+        bound = self.end if before is None else min(before, self.end)
+        if before_timestamp is not None:
+            bound = min(bound, self._first_at_or_after(before_timestamp))
+
+        messages = []
+        has_more = False
+        if bound > self.base:
+            if conversation_id is None and speaker is None:
+                # Unfiltered pages are one contiguous read
+                start = max(bound - limit, self.base)
+                records = self.journal.read_range(start - self.base, bound - self.base)
+                for offset, record in enumerate(records):
+                    record['message_id'] = start + offset
+                messages = records[::-1]
+                has_more = start > self.base
+            else:
+                if self._by_conversation is None:
+                    self._build_indexes()
+                # Walk the shorter posting list and check the other filter per record
+                candidates = []
+                if conversation_id is not None:
+                    candidates.append(self._by_conversation.get(conversation_id, array('q')))
+                if speaker is not None:
+                    candidates.append(self._by_speaker.get(speaker, array('q')))
+                postings = min(candidates, key=len)
+                end = bisect.bisect_left(postings, bound)
+                while end > 0 and len(messages) < limit:
+                    end -= 1
+                    record = self._read(postings[end])
+                    if ((conversation_id is None or record['conversation_id'] == conversation_id)
+                            and (speaker is None or record['speaker'] == speaker)):
+                        messages.append(record)
+                has_more = end > 0
+
+        # Read through to the archive once the hot journal runs out
+        if not has_more and self.archive.segments:
+            if len(messages) < limit:
+                archived, has_more = self.archive.page(limit - len(messages), min(bound, self.base),
+                                                       conversation_id, speaker, before_timestamp)
+                messages.extend(archived)
+            else:
+                # The next page starts in the archive
+                has_more = True
+
+        next_cursor = messages[-1]['message_id'] if messages and has_more else None
+        return messages, next_cursor
+
+    def _load_search_index(self) -> InvertedIndex:
+        """Load the index snapshot and index whatever was appended since"""
+        if self._search_index is None:
+            index = InvertedIndex.load(self.search_index_path)
+            if index is None or index.base != self.base or index.end > self.end:
+                index = InvertedIndex(self.base)
+            for number in range(index.end - self.base, len(self.journal), 1024):
+                for offset, record in enumerate(self.journal.read_range(number, number + 1024)):
+                    index.add(self.base + number + offset, record['message_text'], record['speaker'],
+                              record['timestamp'])
+                    self._search_dirty = True
+            self._search_index = index
+        return self._search_index
+
+    def search(self, query: str, limit: int = 20, speaker: Optional[str] = None,
+               since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        self._catch_up()
+        # Only the hot journal is indexed; archived messages are not searched
+        hits = self._load_search_index().search(
+            query, lambda message_id: self._read(message_id)['message_text'],
+            limit, speaker, since, until)
+        messages = []
+        for message_id, score in hits:
+            record = self._read(message_id)
+            record['score'] = score
+            messages.append(record)
+        return messages
+
+    def compact(self, policy: RetentionPolicy, now: Optional[datetime.datetime] = None) -> Dict:
+        """Move cold messages into an archive segment and apply retention limits"""
+        now = now or datetime.datetime.now()
+        # Other processes wait for the swap instead of appending to the old file
+        with self.journal.lock:
+            self._catch_up()
+            records = list(self.journal)
+            for offset, record in enumerate(records):
+                record['message_id'] = self.base + offset
+            cut, archived = policy.select(records, now)
+
+            if cut:
+                self.journal.sync()
+                self.archive.write_segment(archived)
+                # Ids of dropped messages are never handed out again
+                self.archive.advance(records[cut - 1]['message_id'] + 1)
+                self.journal.replace_contents(records[cut:])
+                self._set_base()
+                # Secondary and full-text indexes only cover the hot journal; rebuild lazily
+                self._by_conversation = self._by_speaker = None
+                self._search_index = None
+                self._search_dirty = False
+                if os.path.exists(self.search_index_path):
+                    os.remove(self.search_index_path)
+
+            removed_segments = self.archive.enforce(policy, now, hot_bytes=self.journal.size)
+        return {
+            'archived': len(archived),
+            'dropped': cut - len(archived),
+            'hot_messages': len(self.journal),
+            'hot_bytes': self.journal.size,
+            'archive_segments': len(self.archive.segments),
+            'archive_bytes': self.archive.size,
+            'removed_segments': removed_segments
+        }
+
+    def last_conversation_id(self) -> int:
+        # Migrated history is ordered by time, not id, so this needs the full index
+        self._catch_up()
+        if self._by_conversation is None:
+            self._build_indexes()
+        return self._max_conversation_id
+
+    def flush(self):
+        self.journal.sync()
+
+    def close(self):
+        if self._search_dirty:
+            # Another process may be saving its own snapshot of the same journal
+            with self.journal.lock:
+                self._search_index.save(self.search_index_path)
+            self._search_dirty = False
+        self.journal.close()
+
+
+def migrate_json_history(json_file: str, store: HistoryStore) -> int:
+    """Copy a legacy conversation_history.json into ``store`` and retire the file.
+
+    Messages are replayed in timestamp order so the journal stays sorted.
+    The old file is renamed to ``<name>.migrated`` rather than deleted.
+    Returns the number of messages migrated.
+    """
+    if not os.path.exists(json_file):
+        return 0
+    try:
+        with open(json_file, 'r') as f:
+            history = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not migrate {json_file}: {e}")
+        return 0
+
+    messages = []
+    for conv_id, conv_messages in history.items():
+        for message in conv_messages:
+            messages.append((int(conv_id), message))
+    messages.sort(key=lambda item: item[1]['timestamp'])
+
+    for conv_id, message in messages:
+        store.append(conv_id, message['timestamp'], message['speaker'], message['message_text'])
+    store.flush()
+
+    os.replace(json_file, json_file + ".migrated")
+    return len(messages)
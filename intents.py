@@ -0,0 +1,122 @@
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+SLOT = re.compile(r"^\{(\w+)\}$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case words of ``text``; "what's" becomes "whats" so both spellings match"""
+    return re.findall(r"[a-z0-9]+", text.lower().replace("'", ""))
+
+
+class Intent:
+    """Something the assistant can do, and the phrases that ask for it.
+
+    A pattern is a phrase matched on whole words anywhere in the command,
+    optionally with a ``{slot}`` before and/or after it that takes the
+    words on that side: "wikipedia {query}" on "wikipedia alan turing"
+    gives ``query="alan turing"``. The best match has the highest
+    ``priority``, then the longest phrase, then the earliest position.
+    ``complete`` marks intents whose phrase is the whole command, so they
+    can run before the user has finished speaking; ``whole`` intents only
+    match when the phrase is all that was said. ``background`` is False
+    for skills that talk with the user and so need the microphone.
+    """
+
+    def __init__(self, name: str, patterns: Sequence[str], handler: Callable,
+                 command_type: Optional[str] = None, priority: int = 0, complete: bool = False,
+                 whole: bool = False, background: bool = True):
+        self.name = name
+        self.patterns = list(patterns)
+        self.handler = handler
+        self.command_type = command_type or name
+        self.priority = priority
+        self.complete = complete
+        self.whole = whole
+        self.background = background
+
+
+class Match:
+    """An intent found in a command, with its slot values"""
+
+    def __init__(self, intent: Intent, command: str, slots: Dict[str, str], span: Tuple[int, int]):
+        self.intent = intent
+        self.command = command
+        self.slots = slots
+        self.span = span  # Matched words, as token positions [start, end)
+
+    def run(self, **context):
+        """Call the intent's handler with this match and ``context`` (e.g. conversation_id)"""
+        return self.intent.handler(self, **context)
+
+
+class IntentRegistry:
+    """Routes commands to intents through a word-level trie of all patterns.
+
+    Matching walks the trie from each word of the command, so its cost
+    depends on the command's length and the longest phrase, not on how
+    many intents are registered. Commands that match nothing go to
+    ``default``.
+    """
+
+    def __init__(self, intents: Sequence[Intent] = (), default: Optional[Intent] = None):
+        self.default = default
+        self.intents: List[Intent] = []
+        self._trie: Dict = {}
+        for intent in intents:
+            self.register(intent)
+
+    def register(self, intent: Intent):
+        """Add ``intent`` and compile its patterns into the trie"""
+        for pattern in intent.patterns:
+            words = pattern.split()
+            before = SLOT.match(words[0]).group(1) if words and SLOT.match(words[0]) else None
+            after = SLOT.match(words[-1]).group(1) if len(words) > 1 and SLOT.match(words[-1]) else None
+            literal = tokenize(" ".join(words[bool(before):len(words) - bool(after)]))
+            if not literal:
+                raise ValueError(f"pattern {pattern!r} of intent {intent.name} has no words")
+            node = self._trie
+            for word in literal:
+                node = node.setdefault(word, {})
+            node.setdefault(None, []).append((intent, before, after))
+        self.intents.append(intent)
+
+    def _candidates(self, tokens: List[str]):
+        for start in range(len(tokens)):
+            node = self._trie
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                for intent, before, after in node.get(None, ()):
+                    yield intent, before, after, start, end + 1
+
+    def match(self, command: str) -> Optional[Match]:
+        """The best intent for ``command``; None if it has no words"""
+        tokens = tokenize(command)
+        if not tokens:
+            return None
+        best, best_rank = None, None
+        for intent, before, after, start, end in self._candidates(tokens):
+            if intent.whole and (start, end) != (0, len(tokens)):
+                continue
+            rank = (intent.priority, end - start, -start)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (intent, before, after, start, end), rank
+        if best is None:
+            if self.default is None:
+                return None
+            return Match(self.default, command, {}, (0, 0))
+        intent, before, after, start, end = best
+        slots = {}
+        if before and start:
+            slots[before] = " ".join(tokens[:start])
+        if after and end < len(tokens):
+            slots[after] = " ".join(tokens[end:])
+        return Match(intent, command, slots, (start, end))
+
+    def is_complete(self, text: str) -> bool:
+        """True if ``text`` is exactly the phrase of a ``complete`` intent"""
+        match = self.match(text)
+        return (match is not None and match.intent.complete
+                and match.span == (0, len(tokenize(text))))
@@ -0,0 +1,222 @@
+import json
+import os
+import struct
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_utils import FileLock
+
+# Each index entry is the byte offset of one record in the data file
+_OFFSET = struct.Struct("<Q")
+
+
+class Journal:
+    """Append-only newline-delimited JSON records with a fixed-width offset index.
+
+    Record ``n`` starts at the offset stored in entry ``n`` of the ``.idx``
+    file, so appends, random reads and tail reads never parse the rest of
+    the journal. fsync is batched: the files are synced every
+    ``sync_every`` appends or ``sync_interval`` seconds, whichever comes
+    first, and always on ``sync()``/``close()``.
+
+    Several processes may share a journal: writers hold ``lock`` (an
+    advisory file lock) and first pick up whatever the others appended,
+    and readers call ``refresh()`` to do the same.
+    """
+
+    def __init__(self, path: str, sync_every: int = 32, sync_interval: float = 1.0):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.lock = FileLock(path + ".lock")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        with self.lock:
+            # Open both files for append and for random reads
+            for file in (self.path, self.index_path):
+                if not os.path.exists(file):
+                    open(file, 'ab').close()
+            self._open()
+            self._recover()
+
+    def _open(self):
+        self._data = open(self.path, 'r+b')
+        self._index = open(self.index_path, 'r+b')
+        # Compaction swaps in a new file, which other processes notice by its inode
+        self._inode = os.fstat(self._data.fileno()).st_ino
+
+    def _recover(self):
+        """Bring the index back in line with the data file after a crash"""
+        # Drop a torn trailing index entry
+        index_size = os.path.getsize(self.index_path)
+        if index_size % _OFFSET.size:
+            index_size -= index_size % _OFFSET.size
+            self._index.truncate(index_size)
+        self._count = index_size // _OFFSET.size
+
+        # Drop index entries whose record is missing or incomplete
+        offset = 0
+        while self._count:
+            self._data.seek(self._offset(self._count - 1))
+            if self._data.readline().endswith(b"\n"):
+                offset = self._data.tell()
+                break
+            self._count -= 1
+        self._index.truncate(self._count * _OFFSET.size)
+
+        # Index any complete records written after the last index entry
+        self._data.seek(offset)
+        self._index.seek(0, os.SEEK_END)
+        while True:
+            line = self._data.readline()
+            if not line.endswith(b"\n"):
+                break
+            self._index.write(_OFFSET.pack(offset))
+            self._count += 1
+            offset += len(line)
+
+        # Cut off a half-written final record
+        self._data.truncate(offset)
+        self._end = offset
+        self.sync()
+
+    def _offset(self, n: int) -> int:
+        """Byte offset of record ``n``"""
+        self._index.seek(n * _OFFSET.size)
+        return _OFFSET.unpack(self._index.read(_OFFSET.size))[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def refresh(self) -> bool:
+        """Catch up with records appended by other processes.
+
+        Returns True if another process replaced the journal (compaction),
+        in which case record numbers start over.
+        """
+        with self.lock:
+            if os.stat(self.path).st_ino != self._inode:
+                self._data.close()
+                self._index.close()
+                self._open()
+                self._recover()
+                return True
+            if (os.fstat(self._index.fileno()).st_size != self._count * _OFFSET.size
+                    or os.fstat(self._data.fileno()).st_size != self._end):
+                self._recover()
+            return False
+
+    def append(self, record: Dict) -> int:
+        """Append a record and return its record number"""
+        line = (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8')
+        with self.lock:
+            self.refresh()
+            self._data.seek(self._end)
+            self._data.write(line)
+            self._data.flush()
+            self._index.seek(self._count * _OFFSET.size)
+            self._index.write(_OFFSET.pack(self._end))
+            self._index.flush()
+
+            number = self._count
+            self._end += len(line)
+            self._count += 1
+        self._pending += 1
+        if (self._pending >= self.sync_every
+                or time.monotonic() - self._last_sync >= self.sync_interval):
+            self.sync()
+        return number
+
+    def sync(self):
+        """Flush pending appends to stable storage"""
+        self._data.flush()
+        self._index.flush()
+        os.fsync(self._data.fileno())
+        os.fsync(self._index.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def read(self, n: int) -> Dict:
+        """Read record ``n``"""
+        if n < 0:
+            n += self._count
+        if not 0 <= n < self._count:
+            raise IndexError("journal record out of range")
+        self._data.seek(self._offset(n))
+        return json.loads(self._data.readline())
+
+    def read_range(self, start: int, stop: int) -> List[Dict]:
+        """Read records ``start`` up to (not including) ``stop`` in one pass"""
+        start = max(start, 0)
+        stop = min(stop, self._count)
+        if start >= stop:
+            return []
+        begin = self._offset(start)
+        end = self._offset(stop) if stop < self._count else self._end
+        self._data.seek(begin)
+        chunk = self._data.read(end - begin)
+        return [json.loads(line) for line in chunk.splitlines()]
+
+    def tail(self, limit: int) -> List[Dict]:
+        """Return the last ``limit`` records, oldest first"""
+        return self.read_range(self._count - limit, self._count)
+
+    def iter_reverse(self, before: Optional[int] = None,
+                     batch: int = 256) -> Iterator[Tuple[int, Dict]]:
+        """Yield ``(number, record)`` newest first, starting below ``before``"""
+        stop = self._count if before is None else min(before, self._count)
+        while stop > 0:
+            start = max(stop - batch, 0)
+            records = self.read_range(start, stop)
+            for offset, record in enumerate(reversed(records)):
+                yield stop - 1 - offset, record
+            stop = start
+
+    def __iter__(self) -> Iterator[Dict]:
+        start = 0
+        while start < self._count:
+            yield from self.read_range(start, start + 256)
+            start += 256
+
+    def replace_contents(self, records: Iterable[Dict]):
+        """Atomically swap the journal for one holding only ``records``.
+
+        The index is removed before the data file is swapped, so a crash at
+        any point leaves either the old journal or a data file whose index
+        is rebuilt on the next open.
+        """
+        data_tmp, index_tmp = self.path + ".tmp", self.index_path + ".tmp"
+        with self.lock:
+            with open(data_tmp, 'wb') as data, open(index_tmp, 'wb') as index:
+                for record in records:
+                    index.write(_OFFSET.pack(data.tell()))
+                    data.write((json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8'))
+                for file in (data, index):
+                    file.flush()
+                    os.fsync(file.fileno())
+
+            self.close()
+            os.remove(self.index_path)
+            os.replace(data_tmp, self.path)
+            os.replace(index_tmp, self.index_path)
+            self._open()
+            self._recover()
+
+    @property
+    def size(self) -> int:
+        """Bytes used by the data file"""
+        return self._end
+
+    @property
+    def closed(self) -> bool:
+        return self._data.closed
+
+    def close(self):
+        """Sync and close the journal files"""
+        if self.closed:
+            return
+        self.sync()
+        self._data.close()
+        self._index.close()
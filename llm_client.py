@@ -0,0 +1,108 @@
+import os
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import ollama
+
+from tts import SENTENCE_BREAK
+
+
+def sentences(tokens: Iterable[str]) -> Iterator[str]:
+    """Join streamed tokens and yield each sentence as soon as it is complete"""
+    buffer = ""
+    for token in tokens:
+        buffer += token
+        parts = SENTENCE_BREAK.split(buffer)
+        for part in parts[:-1]:
+            if part.strip():
+                yield part.strip()
+        buffer = parts[-1]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class LLMClient:
+    """Long-lived Ollama session that keeps the model loaded and streams answers.
+
+    ``start`` checks for the model once in the background, pulls it only
+    if the server doesn't have it, and loads it so the first question
+    doesn't pay for that. Every request passes ``keep_alive``, so the
+    model stays in memory between questions. The server comes from
+    ``host`` or $OLLAMA_HOST (default http://localhost:11434), so a
+    local stub server can stand in for Ollama.
+    """
+
+    def __init__(self, model: str = os.environ.get("VASSIST_LLM_MODEL", "llama2"),
+                 host: Optional[str] = None, keep_alive: str = "30m", options: Optional[Dict] = None):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.options = options
+        self.client = ollama.Client(host=host)
+        self.ready = threading.Event()
+        self.error = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Prepare the model in the background"""
+        threading.Thread(target=self.warm_up, name="llm-warm-up", daemon=True).start()
+        return self
+
+    def warm_up(self):
+        """Make sure the model exists and is loaded; records the error instead of raising"""
+        with self._lock:
+            try:
+                try:
+                    self.client.show(self.model)
+                except ollama.ResponseError as e:
+                    if e.status_code != 404:
+                        raise
+                    print(f"Pulling the {self.model} model...")
+                    self.client.pull(self.model)
+                # A request without a prompt only loads the model
+                self.client.generate(model=self.model, keep_alive=self.keep_alive)
+                self.error = None
+            except Exception as e:
+                self.error = e
+                print(f"Could not prepare the {self.model} model: {e}")
+            finally:
+                self.ready.set()
+
+    def stream(self, messages: List[Dict]) -> Iterator[str]:
+        """Pieces of the answer to ``messages`` as the model produces them"""
+        self.ready.wait()
+        if self.error is not None:
+            # The server may have come up since startup
+            self.warm_up()
+        for part in self.client.chat(model=self.model, messages=messages, stream=True,
+                                     options=self.options, keep_alive=self.keep_alive):
+            content = part['message']['content']
+            if content:
+                yield content
+
+    def chat(self, messages: List[Dict], on_sentence: Optional[Callable[[str], Optional[bool]]] = None) -> str:
+        """The whole answer to ``messages``.
+
+        ``on_sentence`` gets each sentence as soon as it is complete, e.g.
+        to start speaking it; returning False stops generation there.
+        """
+        answer = []
+        generated = sentences(self.stream(messages))
+        try:
+            for sentence in generated:
+                if on_sentence is not None and on_sentence(sentence) is False:
+                    break
+                answer.append(sentence)
+        finally:
+            # Closing the request tells the server to stop generating
+            generated.close()
+        return " ".join(answer)
+
+    def complete(self, messages: List[Dict], max_tokens: Optional[int] = None) -> str:
+        """The whole answer to ``messages`` at once, at most ``max_tokens`` long"""
+        self.ready.wait()
+        options = dict(self.options or {})
+        if max_tokens:
+            options['num_predict'] = max_tokens
+        response = self.client.chat(model=self.model, messages=messages, options=options,
+                                    keep_alive=self.keep_alive)
+        return response['message']['content']
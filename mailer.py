@@ -0,0 +1,252 @@
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, List, Optional
+
+from file_utils import atomic_write_json, read_json
+
+
+class SMTPSession:
+    """One SMTP connection kept open between messages.
+
+    The connection (with STARTTLS and login) is opened on the first send
+    and reused after that. ``keepalive`` sends a NOOP once it has been
+    idle for ``noop_interval`` seconds and hangs up after
+    ``idle_timeout``, before the server would. A connection the server
+    dropped anyway is reopened and the message sent again.
+    """
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = True, timeout: float = 30,
+                 noop_interval: float = 60, idle_timeout: float = 240):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.noop_interval = noop_interval
+        self.idle_timeout = idle_timeout
+        self.connections = 0  # Opened so far, to see the reuse
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0  # Last command, NOOPs included
+        self._last_sent = 0.0  # Last message; the idle timeout counts from here
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._last_used = self._last_sent = time.monotonic()
+        self.connections += 1
+
+    def send(self, message):
+        """Send an ``email.message.Message``, reconnecting once if the connection went stale"""
+        if self._server is not None and time.monotonic() - self._last_used >= self.noop_interval:
+            # Cheaper to find out now than halfway through the message
+            self.keepalive()
+        for attempt in range(2):
+            if self._server is None:
+                self._connect()
+            try:
+                self._server.send_message(message)
+                self._last_used = self._last_sent = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.close()
+                if attempt:
+                    raise
+
+    def keepalive(self):
+        """NOOP an idle connection, or close it once it has been idle too long"""
+        if self._server is None:
+            return
+        now = time.monotonic()
+        if now - self._last_sent >= self.idle_timeout:
+            self.close()
+        elif now - self._last_used >= self.noop_interval:
+            try:
+                code, _ = self._server.noop()
+                if code != 250:
+                    raise smtplib.SMTPServerDisconnected(f"NOOP answered {code}")
+                self._last_used = time.monotonic()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+def is_permanent(error: Exception) -> bool:
+    """True for failures that retrying won't fix: rejected credentials, recipients or message"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    code = getattr(error, 'smtp_code', None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+class Mailer:
+    """Outbound email queue, saved on disk and sent by a background thread.
+
+    ``send_email`` writes the message to ``outbox_file`` and returns at
+    once; the sender thread delivers it over ``session`` and removes it.
+    Temporary failures (connection problems, 4xx replies) are retried
+    after ``retry_delay`` seconds, doubling up to ``max_retry_delay``, for
+    at most ``max_attempts`` tries. Messages that fail for good are kept
+    under ``failed`` in the outbox (the last 50). Whatever is still queued at exit is
+    sent on the next start. ``on_result(message, error)`` hears about
+    every message that was sent (``error`` None) or given up on.
+    """
+
+    def __init__(self, session: SMTPSession, sender: str, outbox_file: str = "email_outbox.json",
+                 max_attempts: int = 8, retry_delay: float = 30, max_retry_delay: float = 3600,
+                 on_result: Optional[Callable[[Dict, Optional[str]], None]] = None):
+        self.session = session
+        self.sender = sender
+        self.outbox_file = outbox_file
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+        try:
+            saved = read_json(outbox_file)
+        except ValueError as e:
+            print(f"Ignoring the email outbox: {e}")
+            saved = {}
+        self._queue: List[Dict] = saved.get('queue', [])
+        self._failed: List[Dict] = saved.get('failed', [])
+
+    def start(self):
+        """Start delivering in the background"""
+        self._thread = threading.Thread(target=self._run, name="mailer", daemon=True)
+        self._thread.start()
+        return self
+
+    def send_email(self, recipient: str, subject: str, body: str) -> str:
+        """Queue a message and return its id without waiting for the server"""
+        message = {'id': uuid.uuid4().hex, 'to': recipient, 'subject': subject, 'body': body,
+                   'created': time.time(), 'attempts': 0, 'next_attempt': 0, 'error': None}
+        with self._wake:
+            self._queue.append(message)
+            self._save()
+            self._wake.notify()
+        return message['id']
+
+    def pending(self) -> List[Dict]:
+        """Messages not sent yet, oldest first"""
+        with self._lock:
+            return [dict(message) for message in self._queue]
+
+    def failed(self) -> List[Dict]:
+        """Messages that were given up on"""
+        with self._lock:
+            return [dict(message) for message in self._failed]
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message was delivered or given up on; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._wake:
+            while self._queue:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wake.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stop the sender; messages still queued stay in the outbox for next time"""
+        with self._wake:
+            self._closed = True
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.session.close()
+
+    def _save(self):
+        try:
+            atomic_write_json(self.outbox_file, {'queue': self._queue, 'failed': self._failed})
+        except OSError as e:
+            print(f"Could not save the email outbox: {e}")
+
+    def _build(self, message: Dict) -> MIMEMultipart:
+        mime = MIMEMultipart()
+        mime['From'] = self.sender
+        mime['To'] = message['to']
+        mime['Subject'] = message['subject']
+        mime.attach(MIMEText(message['body'], 'plain'))
+        return mime
+
+    def _run(self):
+        while True:
+            with self._wake:
+                if self._closed:
+                    return
+                now = time.time()
+                due = next((message for message in self._queue if message['next_attempt'] <= now), None)
+                if due is None:
+                    waits = [message['next_attempt'] - now for message in self._queue]
+                    if self.session.connected:
+                        waits.append(self.session.noop_interval)
+                    self._wake.wait(min(waits) if waits else None)
+                    if self._closed:
+                        return
+            if due is None:
+                self.session.keepalive()
+            else:
+                self._deliver(due)
+
+    def _deliver(self, message: Dict):
+        error = None
+        try:
+            self.session.send(self._build(message))
+        except Exception as e:
+            error = e
+            if not isinstance(e, smtplib.SMTPResponseException):
+                # Don't trust a connection that failed in an unknown way
+                self.session.close()
+
+        with self._wake:
+            message['attempts'] += 1
+            finished = error is None or is_permanent(error) or message['attempts'] >= self.max_attempts
+            if error is not None:
+                message['error'] = str(error)
+                if finished:
+                    self._failed.append(message)
+                    del self._failed[:-50]
+                else:
+                    delay = min(self.retry_delay * 2 ** (message['attempts'] - 1), self.max_retry_delay)
+                    message['next_attempt'] = time.time() + delay
+                    print(f"Email to {message['to']} failed ({error}); retrying in {delay:.0f}s")
+            if finished:
+                self._queue.remove(message)
+            self._save()
+            self._wake.notify_all()
+
+        if finished and self.on_result is not None:
+            try:
+                self.on_result(message, None if error is None else str(error))
+            except Exception as e:
+                print(f"Error reporting email result: {e}")
@@ -0,0 +1,130 @@
+import collections
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+import speech_recognition as sr
+
+from vad import Endpointer
+
+
+class Hypothesis(NamedTuple):
+    """What the recognizer thinks was said so far"""
+    text: str
+    final: bool
+    early: bool = False  # Final because it matched a command, not because the phrase ended
+
+
+def capture(stream, start: Optional[int] = None, poll: float = 0.5) -> Iterator[Tuple[bytes, np.ndarray]]:
+    """Chunks of an ``AudioStream`` as ``(frames, speech_flags)``, as they are captured.
+
+    Starts at ``start`` or the stream's position, and moves the position
+    past every chunk handed out, so whatever the consumer doesn't take is
+    left for the next reader. Ends when the stream is closed.
+    """
+    if stream.closed:
+        raise RuntimeError("audio stream is not started")
+    position = stream.position if start is None else start
+    while not stream.closed:
+        end, chunks = stream.read(position, timeout=poll)
+        for offset, chunk in enumerate(chunks):
+            stream.position = end - len(chunks) + offset + 1
+            yield chunk
+        position = stream.position = end
+
+
+def utterance(chunks: Iterable[Tuple[bytes, np.ndarray]], frame_bytes: int, endpointer: Endpointer,
+              timeout: Optional[float] = None, max_seconds: Optional[float] = None) -> Iterator[bytes]:
+    """Audio of the next phrase, one piece per chunk once it has started.
+
+    Silence inside the phrase is held back until speech resumes, so the
+    pieces add up to the phrase with ``endpointer.margin`` of silence on
+    both sides. A piece may be empty; it still marks that time went by.
+    Raises ``sr.WaitTimeoutError`` if no speech starts within ``timeout``
+    seconds of audio.
+    """
+    pending = collections.deque()  # (frame number, frame) not passed on yet
+    for frames, speech in chunks:
+        ended = False
+        for index, flag in enumerate(speech):
+            pending.append((endpointer.frames, frames[index * frame_bytes:(index + 1) * frame_bytes]))
+            ended = endpointer.push(bool(flag)) or ended
+        if not endpointer.started:
+            # Only the frames the phrase could reach back into are kept
+            while len(pending) > endpointer.lookback_frames:
+                pending.popleft()
+            if timeout is not None and endpointer.frames * endpointer.frame_seconds >= timeout:
+                raise sr.WaitTimeoutError("listening timed out while waiting for phrase to start")
+            continue
+        while pending and pending[0][0] < endpointer.start:
+            pending.popleft()
+        limit = endpointer.last_speech + 1 + endpointer.margin_frames
+        piece = []
+        while pending and pending[0][0] < limit:
+            piece.append(pending.popleft()[1])
+        yield b"".join(piece)
+        too_long = (max_seconds is not None
+                    and (endpointer.frames - endpointer.start) * endpointer.frame_seconds >= max_seconds)
+        if ended or too_long:
+            return
+    if not endpointer.started:
+        raise sr.WaitTimeoutError("audio stream closed")
+
+
+def hypotheses(pieces: Iterable[bytes], session) -> Iterator[Hypothesis]:
+    """Feed the phrase to a recognizer session, yielding a partial hypothesis per piece and then the final one"""
+    text = None
+    for piece in pieces:
+        if piece:
+            text = session.feed(piece) or text
+        if text:
+            yield Hypothesis(text, False)
+    yield Hypothesis(session.finish(), True)
+
+
+def dispatch_early(hyps: Iterable[Hypothesis], is_complete: Callable[[str], bool],
+                   stable: int = 3) -> Iterator[Hypothesis]:
+    """Finish as soon as a partial is a complete command that held for ``stable`` pieces"""
+    last, count = None, 0
+    for hypothesis in hyps:
+        yield hypothesis
+        if hypothesis.final:
+            return
+        count = count + 1 if hypothesis.text == last else 1
+        last = hypothesis.text
+        if count >= stable and is_complete(hypothesis.text):
+            yield Hypothesis(hypothesis.text, True, early=True)
+            return
+
+
+def transcribe(stream, recognizer, timeout: Optional[float] = 5, max_seconds: Optional[float] = 30,
+               end_silence: float = 0.2, on_partial: Optional[Callable[[str], None]] = None,
+               is_complete: Optional[Callable[[str], bool]] = None,
+               stable_seconds: float = 0.15) -> str:
+    """Recognize the next phrase while it is being spoken.
+
+    Audio flows capture -> VAD endpointing -> recognizer session ->
+    command matcher. ``on_partial`` gets each new partial transcript
+    (only streaming backends such as Vosk produce them). A partial that
+    ``is_complete`` accepts, e.g. ``IntentRegistry.is_complete``, and
+    that stays the same for ``stable_seconds`` is returned without
+    waiting for the end of the phrase; the rest of the phrase stays in
+    the stream. Raises like ``AudioStream.listen`` and
+    ``RecognitionChain.recognize``.
+    """
+    endpointer = Endpointer(stream.frame_seconds, end_silence=end_silence)
+    pieces = utterance(capture(stream), stream.vad.frame_size * stream.sample_width, endpointer,
+                       timeout, max_seconds)
+    hyps = hypotheses(pieces, recognizer.open_stream(stream.sample_rate))
+    if is_complete is not None:
+        hyps = dispatch_early(hyps, is_complete, max(1, round(stable_seconds / stream.chunk_seconds)))
+    shown = None
+    try:
+        for hypothesis in hyps:
+            if hypothesis.final:
+                return hypothesis.text
+            if on_partial is not None and hypothesis.text != shown:
+                shown = hypothesis.text
+                on_partial(shown)
+    finally:
+        hyps.close()
+    raise sr.UnknownValueError()
@@ -0,0 +1,80 @@
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+
+class PreferenceCache:
+    """In-memory user preferences with coalesced write-back and change events.
+
+    ``load`` is called once and must return a dict. ``save`` receives the
+    full preference dict and the set of keys changed since the last save;
+    it runs at most once per ``write_delay`` seconds no matter how many
+    values were set. Subscribers are called as ``callback(key, value)``
+    on the thread that changed the value.
+    """
+
+    def __init__(self, load: Callable[[], Dict], save: Callable[[Dict, set], None],
+                 write_delay: float = 0.5):
+        self._save = save
+        self.write_delay = write_delay
+        self._lock = threading.RLock()
+        self._values = dict(load() or {})
+        self._dirty = set()
+        self._timer = None
+        self._subscribers = []
+
+    def get(self, key: str, default: str = None) -> str:
+        with self._lock:
+            return self._values.get(key, default)
+
+    def all(self) -> Dict:
+        with self._lock:
+            return dict(self._values)
+
+    def set(self, key: str, value: str):
+        """Update a value, notify subscribers and schedule a write"""
+        with self._lock:
+            if key in self._values and self._values[key] == value:
+                return
+            self._values[key] = value
+            self._dirty.add(key)
+            if self._timer is None:
+                self._timer = threading.Timer(self.write_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            subscribers = list(self._subscribers)
+
+        for callback, keys in subscribers:
+            if keys is None or key in keys:
+                try:
+                    callback(key, value)
+                except Exception as e:
+                    print(f"Preference listener error: {e}")
+
+    def subscribe(self, callback: Callable[[str, str], None],
+                  keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """Call ``callback`` when any of ``keys`` (or any key) changes; returns an unsubscribe function"""
+        entry = (callback, set(keys) if keys is not None else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def flush(self):
+        """Write pending changes now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            changed, self._dirty = self._dirty, set()
+            try:
+                self._save(dict(self._values), changed)
+            except Exception:
+                # Keep the keys dirty so the next flush retries them
+                self._dirty |= changed
+                raise
@@ -0,0 +1,332 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import speech_recognition as sr
+
+from file_utils import atomic_write_json, read_json
+
+
+class RecognizerBackend:
+    """One speech-to-text engine, called through ``sr.Recognizer``'s hooks.
+
+    ``transcribe`` returns the text or raises ``sr.UnknownValueError``
+    (nothing intelligible) or ``sr.RequestError`` (engine unusable).
+    """
+
+    name = "base"
+    offline = False
+
+    def __init__(self, recognizer: Optional[sr.Recognizer] = None):
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def available(self) -> bool:
+        """Whether the engine's package (and model) is installed"""
+        return True
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        raise NotImplementedError
+
+    def open_stream(self, sample_rate: int) -> Optional["StreamingSession"]:
+        """A session that transcribes audio as it arrives, or None if the engine can't"""
+        return None
+
+
+class StreamingSession:
+    """Incremental transcription of one phrase.
+
+    ``feed`` takes the next piece of 16-bit mono PCM and returns the best
+    hypothesis so far (or None); ``finish`` returns the final text and
+    raises like ``RecognizerBackend.transcribe``.
+    """
+
+    def feed(self, pcm: bytes) -> Optional[str]:
+        raise NotImplementedError
+
+    def finish(self) -> str:
+        raise NotImplementedError
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Web Speech API; needs a network connection"""
+
+    name = "google"
+
+    def __init__(self, recognizer: Optional[sr.Recognizer] = None, language: str = "en-US"):
+        super().__init__(recognizer)
+        self.language = language
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class VoskBackend(RecognizerBackend):
+    """Vosk (Kaldi) running locally; the model is loaded once and reused"""
+
+    name = "vosk"
+    offline = True
+
+    def __init__(self, recognizer: Optional[sr.Recognizer] = None,
+                 model_path: str = os.environ.get("VASSIST_VOSK_MODEL", "model")):
+        super().__init__(recognizer)
+        self.model_path = model_path
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("vosk") is not None and os.path.isdir(self.model_path)
+
+    def _load_model(self):
+        if not hasattr(self.recognizer, "vosk_model"):
+            if not self.available():
+                raise sr.RequestError(f"Vosk or its model ({self.model_path}) is not installed")
+            from vosk import Model
+            # recognize_vosk only loads ./model itself; giving it the model lets us choose the path
+            self.recognizer.vosk_model = Model(self.model_path)
+        return self.recognizer.vosk_model
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        self._load_model()
+        text = json.loads(self.recognizer.recognize_vosk(audio)).get("text", "")
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+    def open_stream(self, sample_rate: int) -> "VoskSession":
+        return VoskSession(self._load_model(), sample_rate)
+
+
+class VoskSession(StreamingSession):
+    """Vosk decodes while audio arrives, so the final text is ready right after the phrase"""
+
+    def __init__(self, model, sample_rate: int):
+        from vosk import KaldiRecognizer
+        self.recognizer = KaldiRecognizer(model, sample_rate)
+        self.sentences = []
+
+    def feed(self, pcm: bytes) -> Optional[str]:
+        if self.recognizer.AcceptWaveform(pcm):
+            # Vosk found a pause and settled on part of the phrase
+            self.sentences.append(json.loads(self.recognizer.Result()).get("text", ""))
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(part for part in self.sentences + [partial] if part) or None
+
+    def finish(self) -> str:
+        self.sentences.append(json.loads(self.recognizer.FinalResult()).get("text", ""))
+        text = " ".join(part for part in self.sentences if part)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class WhisperBackend(RecognizerBackend):
+    """OpenAI Whisper running locally on the CPU (or GPU if torch has one)"""
+
+    name = "whisper"
+    offline = True
+
+    def __init__(self, recognizer: Optional[sr.Recognizer] = None,
+                 model: str = os.environ.get("VASSIST_WHISPER_MODEL", "base.en")):
+        super().__init__(recognizer)
+        self.model = model
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("whisper") is not None
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        # speech_recognition caches the loaded model on the recognizer
+        text = self.recognizer.recognize_whisper(audio, model=self.model, language="english",
+                                                 fp16=False).strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class SphinxBackend(RecognizerBackend):
+    """CMU PocketSphinx running locally; fastest and least accurate"""
+
+    name = "sphinx"
+    offline = True
+
+    def available(self) -> bool:
+        return importlib.util.find_spec("pocketsphinx") is not None
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        return self.recognizer.recognize_sphinx(audio)
+
+
+BACKENDS = {backend.name: backend for backend in
+            (GoogleBackend, VoskBackend, WhisperBackend, SphinxBackend)}
+
+
+class RecognitionChain:
+    """Tries recognizer backends in order and keeps per-backend counters.
+
+    A backend that raises ``sr.RequestError`` (offline, not installed,
+    quota) is skipped for ``cooldown`` seconds, so later utterances don't
+    wait on it again, and the next backend is tried. ``sr.UnknownValueError``
+    is final unless ``retry_unknown`` is set, since another engine rarely
+    does better on audio with no speech in it.
+
+    Counters are kept in ``stats_file`` across runs; ``stats()`` reports
+    latency and how often each backend produced text.
+    """
+
+    def __init__(self, backends: List[RecognizerBackend], cooldown: float = 30.0,
+                 retry_unknown: bool = False, stats_file: Optional[str] = "recognizer_stats.json"):
+        self.backends = backends
+        self.cooldown = cooldown
+        self.retry_unknown = retry_unknown
+        self.stats_file = stats_file
+        self._lock = threading.Lock()
+        self._skip_until: Dict[str, float] = {}
+        self._counters: Dict[str, Dict] = {}
+        if stats_file:
+            try:
+                self._counters = read_json(stats_file)
+            except ValueError as e:
+                print(f"Ignoring recognizer statistics: {e}")
+
+    def _count(self, name: str, outcome: str, seconds: float, error: Optional[str] = None):
+        with self._lock:
+            counters = self._counters.setdefault(name, {
+                'attempts': 0, 'recognized': 0, 'unknown': 0, 'errors': 0,
+                'total_seconds': 0.0, 'last_error': None})
+            counters['attempts'] += 1
+            counters[outcome] += 1
+            counters['total_seconds'] += seconds
+            if error:
+                counters['last_error'] = error
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        """Text of ``audio`` from the first backend that can produce it"""
+        errors = []
+        unknown = False
+        now = time.monotonic()
+        # Backends cooling down after an error are still tried, but last
+        ordered = sorted(self.backends, key=lambda backend: self._skip_until.get(backend.name, 0) > now)
+        for backend in ordered:
+            started = time.monotonic()
+            try:
+                text = backend.transcribe(audio)
+            except sr.UnknownValueError:
+                self._count(backend.name, 'unknown', time.monotonic() - started)
+                unknown = True
+                if not self.retry_unknown:
+                    raise
+                continue
+            except (sr.RequestError, ImportError, OSError) as e:
+                self._count(backend.name, 'errors', time.monotonic() - started, str(e))
+                self._skip_until[backend.name] = time.monotonic() + self.cooldown
+                errors.append(f"{backend.name}: {e}")
+                continue
+            self._count(backend.name, 'recognized', time.monotonic() - started)
+            self._skip_until.pop(backend.name, None)
+            return text
+        if unknown:
+            raise sr.UnknownValueError()
+        raise sr.RequestError("; ".join(errors) or "no speech recognizer is available")
+
+    def open_stream(self, sample_rate: int = 16000) -> "ChainSession":
+        """Start transcribing a phrase as it is heard.
+
+        Partial results come from the first backend in the current order
+        if it can stream; otherwise the audio is collected and handed to
+        ``recognize`` at the end.
+        """
+        now = time.monotonic()
+        for backend in self.backends:
+            if self._skip_until.get(backend.name, 0) > now:
+                continue
+            try:
+                return ChainSession(self, sample_rate, backend, backend.open_stream(sample_rate))
+            except (sr.RequestError, ImportError, OSError) as e:
+                self._count(backend.name, 'errors', 0.0, str(e))
+                self._skip_until[backend.name] = time.monotonic() + self.cooldown
+            break
+        return ChainSession(self, sample_rate)
+
+    def stats(self) -> List[Dict]:
+        """Per-backend counters with average latency and recognition rate, fastest first"""
+        with self._lock:
+            result = []
+            for name, counters in self._counters.items():
+                attempts = counters['attempts'] or 1
+                result.append(dict(counters, backend=name,
+                                   average_ms=counters['total_seconds'] / attempts * 1000,
+                                   recognized_rate=counters['recognized'] / attempts))
+        return sorted(result, key=lambda row: row['average_ms'])
+
+    def close(self):
+        """Save the counters for the next run"""
+        if self.stats_file:
+            with self._lock:
+                atomic_write_json(self.stats_file, self._counters)
+
+
+def create_recognition_chain(names: Optional[str] = None, **options) -> RecognitionChain:
+    """Build a chain from a comma-separated list of backend names or $VASSIST_RECOGNIZERS.
+
+    The default tries Google first and falls back to whichever local
+    engines are installed; "vosk,google" would run offline first. Listed
+    backends that are not installed are left out.
+    """
+    names = names or os.environ.get("VASSIST_RECOGNIZERS", "google,vosk,whisper,sphinx")
+    recognizer = sr.Recognizer()
+    backends = []
+    for name in names.split(","):
+        name = name.strip().lower()
+        if name not in BACKENDS:
+            print(f"Unknown speech recognizer: {name}")
+            continue
+        backend = BACKENDS[name](recognizer)
+        if backend.available():
+            backends.append(backend)
+    return RecognitionChain(backends, **options)
+
+
+class ChainSession(StreamingSession):
+    """Streaming session of a RecognitionChain, falling back to the whole chain.
+
+    The audio is kept, so if the streaming backend fails the phrase is
+    still recognized by the other backends.
+    """
+
+    def __init__(self, chain: RecognitionChain, sample_rate: int,
+                 backend: Optional[RecognizerBackend] = None, session: Optional[StreamingSession] = None):
+        self.chain = chain
+        self.sample_rate = sample_rate
+        self.backend = backend if session is not None else None
+        self.session = session
+        self.pcm = []
+
+    def feed(self, pcm: bytes) -> Optional[str]:
+        self.pcm.append(pcm)
+        if self.session is None:
+            return None
+        try:
+            return self.session.feed(pcm)
+        except Exception as e:
+            print(f"Streaming recognition error ({self.backend.name}): {e}")
+            self.session = None
+            return None
+
+    def finish(self) -> str:
+        if self.session is not None:
+            # Only the time spent after the phrase ended counts as latency
+            started = time.monotonic()
+            try:
+                text = self.session.finish()
+            except sr.UnknownValueError:
+                self.chain._count(self.backend.name, 'unknown', time.monotonic() - started)
+                if not self.chain.retry_unknown:
+                    raise
+            except Exception as e:
+                self.chain._count(self.backend.name, 'errors', time.monotonic() - started, str(e))
+            else:
+                self.chain._count(self.backend.name, 'recognized', time.monotonic() - started)
+                return text
+        return self.chain.recognize(sr.AudioData(b"".join(self.pcm), self.sample_rate, 2))
@@ -0,0 +1,161 @@
+import collections
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from file_utils import atomic_write_json, read_json
+
+# Phrases that only introduce the question, stripped from its start: "tell me about einstein"
+FILLER_PHRASES = [tuple(phrase.split()) for phrase in [
+    "can you tell me about", "could you tell me about", "tell me about", "tell me", "search wikipedia for",
+    "search wikipedia", "search for", "look up", "please", "who is", "what is", "whats"]]
+# Words that never change what is being asked
+STOPWORDS = frozenset("a an the please".split())
+
+# Answers to these go stale within minutes
+TIME_SENSITIVE = frozenset("""
+today tonight tomorrow yesterday now current currently latest recent recently news
+weather forecast time date score scores price prices stock stocks live this week
+""".split())
+
+# A question leaning on earlier turns, or about the user, can't be answered from another conversation's reply
+REFERRING = frozenset("he she it they him her them his hers its their this that these those i me my".split())
+
+
+def _words(query: str) -> List[str]:
+    """Words of ``query`` without the filler phrases it starts with"""
+    words = re.findall(r"[a-z0-9]+", query.lower().replace("'", ""))
+    stripped = True
+    while stripped:
+        stripped = False
+        for phrase in FILLER_PHRASES:
+            if tuple(words[:len(phrase)]) == phrase:
+                words = words[len(phrase):]
+                stripped = True
+                break
+    return words
+
+
+def normalize(query: str) -> str:
+    """Cache key for ``query``: lower case, without punctuation, leading filler, articles or extra spaces.
+
+    Question words and pronouns stay: "when was einstein born" and
+    "where was einstein born" are different questions.
+    """
+    return " ".join(word for word in _words(query) if word not in STOPWORDS)
+
+
+def is_cacheable(query: str) -> bool:
+    """False for questions about the present, about the user or about something said earlier"""
+    words = set(_words(query))
+    return not (words & TIME_SENSITIVE or words & REFERRING)
+
+
+def context_digest(messages: List[Dict]) -> str:
+    """Short hash of the messages a question is asked after, for the ``context`` of a lookup"""
+    return hashlib.sha1(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class ResponseCache:
+    """Answers to questions, keyed on the normalized question within a namespace.
+
+    Entries expire after ``ttl`` seconds (``ttls`` overrides it per
+    namespace) and the least recently used are evicted beyond
+    ``max_entries``. An answer that depends on what came before is
+    stored under a ``context`` (see ``context_digest``) and only found
+    again after the same context. New answers are saved to
+    ``cache_file`` at most every ``save_delay`` seconds, and by
+    ``flush``/``close``. Time-sensitive and follow-up questions bypass
+    it; see ``is_cacheable``.
+    """
+
+    def __init__(self, cache_file: str = "response_cache.json", ttl: float = 24 * 3600,
+                 ttls: Optional[Dict[str, float]] = None, max_entries: int = 500, save_delay: float = 5.0):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self._lock = threading.Lock()
+        self._save_timer = None  # Pending save, if any
+        self._entries = collections.OrderedDict()  # "namespace:key" -> {'answer', 'expires'}
+        self._metrics = {'hits': 0, 'misses': 0, 'bypassed': 0, 'expired': 0, 'evicted': 0}
+        try:
+            saved = read_json(cache_file)
+        except ValueError as e:
+            print(f"Ignoring response cache: {e}")
+            saved = {}
+        now = time.time()
+        # Saved least recently used first
+        for key, entry in saved.get('entries', []):
+            if entry['expires'] > now:
+                self._entries[key] = entry
+
+    @staticmethod
+    def _key(namespace: str, query: str, context: Optional[str]) -> str:
+        key = f"{namespace}:{normalize(query)}"
+        return f"{key}#{context}" if context else key
+
+    def get(self, namespace: str, query: str, context: Optional[str] = None) -> Optional[str]:
+        """The cached answer to ``query`` asked after ``context``, or None"""
+        if not is_cacheable(query):
+            with self._lock:
+                self._metrics['bypassed'] += 1
+            return None
+        key = self._key(namespace, query, context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] <= time.time():
+                del self._entries[key]
+                self._metrics['expired'] += 1
+                entry = None
+            if entry is None:
+                self._metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._metrics['hits'] += 1
+            return entry['answer']
+
+    def put(self, namespace: str, query: str, answer: str, context: Optional[str] = None):
+        """Remember ``answer`` for ``query`` asked after ``context`` unless it is not cacheable"""
+        if not answer or not is_cacheable(query) or not normalize(query):
+            return
+        key = self._key(namespace, query, context)
+        with self._lock:
+            self._entries[key] = {'answer': answer,
+                                  'expires': time.time() + self.ttls.get(namespace, self.ttl)}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics['evicted'] += 1
+            if self._save_timer is None:
+                # Answers that arrive meanwhile go out with the same write
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """Save new answers now instead of waiting for the pending save"""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            if timer is None:
+                return
+            timer.cancel()
+            try:
+                atomic_write_json(self.cache_file, {'entries': list(self._entries.items())})
+            except OSError as e:
+                print(f"Could not save the response cache: {e}")
+
+    def close(self):
+        self.flush()
+
+    def metrics(self) -> Dict:
+        """Hit/miss counters since startup, with the hit rate of cacheable lookups"""
+        with self._lock:
+            metrics = dict(self._metrics, entries=len(self._entries))
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+        return metrics
@@ -0,0 +1,269 @@
+import datetime
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from file_utils import FileLock, atomic_write_json, file_signature, fsync_directory, read_json
+
+
+class RetentionPolicy:
+    """How long assistant logs are kept and when they leave the hot files.
+
+    - ``archive_after_days``: messages older than this move to compressed archive segments
+    - ``max_hot_bytes``: archive more aggressively if the hot file grows past this
+    - ``max_age_days``: messages older than this are deleted, archived or not
+    - ``max_messages_per_conversation``: older messages beyond this are dropped when archiving
+    - ``max_total_bytes``: oldest archive segments are deleted to stay under this (hot + archive)
+
+    ``None`` disables a limit.
+    """
+
+    def __init__(self, archive_after_days: Optional[float] = 7,
+                 max_hot_bytes: Optional[int] = 8 * 1024 * 1024,
+                 max_age_days: Optional[float] = None,
+                 max_messages_per_conversation: Optional[int] = None,
+                 max_total_bytes: Optional[int] = None):
+        self.archive_after_days = archive_after_days
+        self.max_hot_bytes = max_hot_bytes
+        self.max_age_days = max_age_days
+        self.max_messages_per_conversation = max_messages_per_conversation
+        self.max_total_bytes = max_total_bytes
+
+    @staticmethod
+    def _cutoff(days: Optional[float], now: datetime.datetime) -> Optional[str]:
+        if days is None:
+            return None
+        return (now - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def archive_cutoff(self, now: datetime.datetime) -> Optional[str]:
+        return self._cutoff(self.archive_after_days, now)
+
+    def expiry_cutoff(self, now: datetime.datetime) -> Optional[str]:
+        return self._cutoff(self.max_age_days, now)
+
+    def select(self, records: List[Dict], now: datetime.datetime) -> Tuple[int, List[Dict]]:
+        """Split time-ordered ``records`` into a cold prefix and the hot rest.
+
+        Returns ``(cut, archived)``: ``records[cut:]`` stay hot and
+        ``archived`` is the part of the cold prefix that survives
+        ``max_age_days`` and ``max_messages_per_conversation``.
+        """
+        cut = 0
+        archive_cutoff = self.archive_cutoff(now)
+        if archive_cutoff is not None:
+            while cut < len(records) and records[cut]['timestamp'] < archive_cutoff:
+                cut += 1
+        if self.max_hot_bytes is not None:
+            hot_bytes = sum(len(json.dumps(record)) + 1 for record in records[cut:])
+            while cut < len(records) and hot_bytes > self.max_hot_bytes:
+                hot_bytes -= len(json.dumps(records[cut])) + 1
+                cut += 1
+
+        # Count messages per conversation newest first, so the cap keeps the latest ones
+        keep = [True] * cut
+        if self.max_messages_per_conversation is not None:
+            seen = {}
+            for position in range(len(records) - 1, -1, -1):
+                conv_id = records[position]['conversation_id']
+                seen[conv_id] = seen.get(conv_id, 0) + 1
+                if position < cut and seen[conv_id] > self.max_messages_per_conversation:
+                    keep[position] = False
+        expiry_cutoff = self.expiry_cutoff(now)
+        archived = [record for position, record in enumerate(records[:cut])
+                    if keep[position] and (expiry_cutoff is None or record['timestamp'] >= expiry_cutoff)]
+        return cut, archived
+
+
+class ArchiveStore:
+    """Gzip-compressed, read-only segments of archived records.
+
+    Each compaction writes one segment holding a contiguous, time-ordered
+    run of records, and ``index.json`` lists every segment with its id
+    range, time range and conversation ids, so reads only open the
+    segments that can match. Writers hold ``lock`` and re-read the index
+    first, so processes sharing the directory never reuse a segment
+    number.
+    """
+
+    def __init__(self, directory: str = "archive", cache_segments: int = 4):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        self.lock = FileLock(os.path.join(directory, "index.lock"))
+        self._cache = OrderedDict()
+        self._cache_segments = cache_segments
+        self._lock = threading.Lock()
+        self._signature = False
+        self.reload()
+
+    def reload(self):
+        """Re-read the segment list if another process changed it"""
+        signature = file_signature(self.index_file)
+        if signature == self._signature:
+            return
+        self._signature = signature
+        index = read_json(self.index_file)
+        self.segments = index.get('segments', [])
+        self._next_id = index.get('next_id', 0)
+        self._next_number = index.get('next_number', 1)
+
+    def _save_index(self):
+        atomic_write_json(self.index_file, {
+            'segments': self.segments,
+            'next_id': self._next_id,
+            'next_number': self._next_number
+        })
+        self._signature = file_signature(self.index_file)
+
+    @property
+    def size(self) -> int:
+        return sum(segment['bytes'] for segment in self.segments)
+
+    def next_id(self) -> int:
+        """The id after the last record ever archived (0 if nothing was)"""
+        return self._next_id
+
+    def advance(self, next_id: int):
+        """Record that ids below ``next_id`` are taken, even if nothing was archived"""
+        with self.lock:
+            self.reload()
+            if next_id > self._next_id:
+                self._next_id = next_id
+                self._save_index()
+
+    def write_segment(self, records: List[Dict], id_key: str = 'message_id'):
+        """Compress ``records`` into a new segment"""
+        if not records:
+            return
+        with self.lock:
+            self.reload()
+            self._write_segment(records, id_key)
+
+    def _write_segment(self, records: List[Dict], id_key: str):
+        number = self._next_number
+        name = f"segment-{number:06d}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for record in records:
+                    f.write((json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8'))
+            # The index will point at this segment, so it must be on disk before the rename
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(path + ".tmp", path)
+        fsync_directory(self.directory)
+
+        self.segments.append({
+            'number': number,
+            'file': name,
+            'first_id': records[0][id_key],
+            'last_id': records[-1][id_key],
+            'first_timestamp': records[0]['timestamp'],
+            'last_timestamp': records[-1]['timestamp'],
+            'conversations': sorted({record['conversation_id'] for record in records
+                                     if 'conversation_id' in record}),
+            'count': len(records),
+            'bytes': os.path.getsize(path)
+        })
+        self._next_id = max(self._next_id, records[-1][id_key] + 1)
+        self._next_number = number + 1
+        self._save_index()
+
+    def read_segment(self, segment: Dict) -> List[Dict]:
+        """Decompress a segment, keeping the most recently used ones in memory"""
+        with self._lock:
+            if segment['file'] in self._cache:
+                self._cache.move_to_end(segment['file'])
+                return self._cache[segment['file']]
+        with gzip.open(os.path.join(self.directory, segment['file']), 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        with self._lock:
+            self._cache[segment['file']] = records
+            while len(self._cache) > self._cache_segments:
+                self._cache.popitem(last=False)
+        return records
+
+    def page(self, limit: int, before: int, conversation_id: Optional[int] = None,
+             speaker: Optional[str] = None,
+             before_timestamp: Optional[str] = None) -> Tuple[List[Dict], bool]:
+        """Archived records with id below ``before``, newest first; second item tells if more exist"""
+        self.reload()
+        result = []
+        for position in range(len(self.segments) - 1, -1, -1):
+            segment = self.segments[position]
+            if segment['first_id'] >= before:
+                continue
+            if before_timestamp is not None and segment['first_timestamp'] >= before_timestamp:
+                continue
+            if conversation_id is not None and conversation_id not in segment['conversations']:
+                continue
+            for record in reversed(self.read_segment(segment)):
+                if record['message_id'] >= before:
+                    continue
+                if before_timestamp is not None and record['timestamp'] >= before_timestamp:
+                    continue
+                if conversation_id is not None and record['conversation_id'] != conversation_id:
+                    continue
+                if speaker is not None and record['speaker'] != speaker:
+                    continue
+                if len(result) == limit:
+                    return result, True
+                result.append(record)
+        return result, False
+
+    def enforce(self, policy: RetentionPolicy, now: datetime.datetime, hot_bytes: int = 0) -> int:
+        """Delete segments past ``max_age_days`` or over ``max_total_bytes``; returns how many"""
+        with self.lock:
+            self.reload()
+            return self._enforce(policy, now, hot_bytes)
+
+    def _enforce(self, policy: RetentionPolicy, now: datetime.datetime, hot_bytes: int) -> int:
+        expiry_cutoff = policy.expiry_cutoff(now)
+        removed = 0
+        while self.segments:
+            oldest = self.segments[0]
+            expired = expiry_cutoff is not None and oldest['last_timestamp'] < expiry_cutoff
+            too_big = (policy.max_total_bytes is not None
+                       and self.size + hot_bytes > policy.max_total_bytes)
+            if not (expired or too_big):
+                break
+            os.remove(os.path.join(self.directory, oldest['file']))
+            self._cache.pop(oldest['file'], None)
+            self.segments.pop(0)
+            removed += 1
+        if removed:
+            self._save_index()
+        return removed
+
+
+class Compactor:
+    """Background thread that applies a retention policy every ``interval`` seconds"""
+
+    def __init__(self, db, policy: Optional[RetentionPolicy] = None, interval: float = 3600):
+        self.db = db
+        self.policy = policy or RetentionPolicy()
+        self.interval = interval
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-compactor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _run(self):
+        # Compact once shortly after startup, then on every interval
+        while not self._stop.wait(min(self.interval, 30) if self.last_result is None else self.interval):
+            try:
+                self.last_result = self.db.compact(self.policy)
+            except Exception as e:
+                self.last_result = {'error': str(e)}
+                print(f"Compaction error: {e}")
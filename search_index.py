@@ -0,0 +1,195 @@
+import heapq
+import json
+import math
+import os
+import re
+import sys
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_PHRASE = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 tuning constants
+K1 = 1.2
+B = 0.75
+
+INDEX_VERSION = 4
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(query: str) -> List[List[str]]:
+    """Split a query into phrases; quoted text is one phrase, every other word its own"""
+    phrases = []
+    for quoted, word in _PHRASE.findall(query):
+        tokens = tokenize(quoted if quoted else word)
+        if tokens:
+            if quoted:
+                phrases.append(tokens)
+            else:
+                phrases.extend([token] for token in tokens)
+    return phrases
+
+
+class InvertedIndex:
+    """Inverted index over messages, ranked with BM25.
+
+    Documents are numbered densely from ``base`` in the order they are
+    added, which matches message ids in the hot journal. Each term maps to parallel
+    arrays of document ids and term frequencies, which keeps snapshots
+    small and fast to load. Phrases are checked against the message text
+    of the remaining candidates only. Each document also keeps its
+    speaker and timestamp so filters never need to read the record.
+    """
+
+    def __init__(self, base: int = 0):
+        self.base = base
+        self.doc_ids: Dict[str, array] = {}
+        self.term_counts: Dict[str, array] = {}
+        self.lengths = array('q')
+        self.speakers: List[str] = []
+        self.timestamps: List[str] = []
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def end(self) -> int:
+        """The id the next document must have"""
+        return self.base + len(self.lengths)
+
+    def add(self, doc_id: int, text: str, speaker: str, timestamp: str):
+        """Index one message; ``doc_id`` must be the next document number"""
+        if doc_id != self.end:
+            raise ValueError(f"expected document {self.end}, got {doc_id}")
+        tokens = tokenize(text)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            if token not in self.doc_ids:
+                self.doc_ids[token] = array('q')
+                self.term_counts[token] = array('q')
+            self.doc_ids[token].append(doc_id)
+            self.term_counts[token].append(count)
+        self.lengths.append(len(tokens))
+        self.speakers.append(speaker)
+        self.timestamps.append(timestamp)
+        self.total_length += len(tokens)
+
+    @staticmethod
+    def _count_phrase(tokens: List[str], phrase: List[str]) -> int:
+        size = len(phrase)
+        return sum(1 for start in range(len(tokens) - size + 1) if tokens[start:start + size] == phrase)
+
+    def search(self, query: str, fetch_text: Callable[[int], str], limit: int = 20,
+               speaker: Optional[str] = None, since: Optional[str] = None,
+               until: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Return ``(doc_id, score)`` for the best matches of every phrase in ``query``.
+
+        ``fetch_text(doc_id)`` is used to verify multi-word phrases.
+        """
+        phrases = parse_query(query)
+        tokens = {token for phrase in phrases for token in phrase}
+        if not phrases or not self.lengths or not all(token in self.doc_ids for token in tokens):
+            return []
+
+        # Intersect rarest first so the candidate set shrinks quickly
+        candidates = None
+        for token in sorted(tokens, key=lambda token: len(self.doc_ids[token])):
+            docs = self.doc_ids[token]
+            candidates = set(docs) if candidates is None else candidates.intersection(docs)
+            if not candidates:
+                return []
+
+        if speaker is not None:
+            candidates = {doc for doc in candidates if self.speakers[doc - self.base] == speaker}
+        if since is not None:
+            candidates = {doc for doc in candidates if self.timestamps[doc - self.base] >= since}
+        if until is not None:
+            candidates = {doc for doc in candidates if self.timestamps[doc - self.base] < until}
+
+        # Term frequencies of single words come from the index, phrases from the text
+        frequencies = []
+        for phrase in phrases:
+            if len(phrase) == 1:
+                docs, counts = self.doc_ids[phrase[0]], self.term_counts[phrase[0]]
+                frequencies.append((len(docs), {doc: count for doc, count in zip(docs, counts)
+                                                if doc in candidates}))
+        multi_word = [phrase for phrase in phrases if len(phrase) > 1]
+        if multi_word:
+            phrase_counts = [{} for _ in multi_word]
+            for doc in list(candidates):
+                doc_tokens = tokenize(fetch_text(doc))
+                counts = [self._count_phrase(doc_tokens, phrase) for phrase in multi_word]
+                if not all(counts):
+                    candidates.discard(doc)
+                    continue
+                for found, count in zip(phrase_counts, counts):
+                    found[doc] = count
+            for found in phrase_counts:
+                frequencies.append((len(found), found))
+
+        total_docs = len(self.lengths)
+        average_length = self.total_length / total_docs or 1
+        scores = {}
+        for doc_frequency, found in frequencies:
+            idf = math.log(1 + (total_docs - doc_frequency + 0.5) / (doc_frequency + 0.5))
+            for doc in candidates:
+                tf = found[doc]
+                norm = K1 * (1 - B + B * self.lengths[doc - self.base] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        # Ties go to the newer message
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+    def save(self, path: str):
+        """Snapshot the index so the next start only indexes new messages.
+
+        The file is one line of JSON (version, terms with their posting
+        lengths, per-document speaker and timestamp) followed by the
+        posting and length arrays as raw 64-bit integers.
+        """
+        terms = list(self.doc_ids)
+        header = {'version': INDEX_VERSION, 'byteorder': sys.byteorder, 'base': self.base,
+                  'total_length': self.total_length, 'terms': [[term, len(self.doc_ids[term])] for term in terms],
+                  'speakers': self.speakers, 'timestamps': self.timestamps}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            for term in terms:
+                f.write(self.doc_ids[term].tobytes())
+            for term in terms:
+                f.write(self.term_counts[term].tobytes())
+            f.write(self.lengths.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["InvertedIndex"]:
+        """Load a snapshot written by ``save``; None if missing, unreadable or from another version"""
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                values = array('q')
+                values.frombytes(f.read())
+            if header['version'] != INDEX_VERSION or header['byteorder'] != sys.byteorder:
+                return None
+            index = cls(header['base'])
+            index.total_length = header['total_length']
+            index.speakers = header['speakers']
+            index.timestamps = header['timestamps']
+            postings = sum(size for _, size in header['terms'])
+            if len(values) != 2 * postings + len(index.speakers) or len(index.timestamps) != len(index.speakers):
+                return None
+            position = 0
+            for term, size in header['terms']:
+                index.doc_ids[term] = values[position:position + size]
+                index.term_counts[term] = values[postings + position:postings + position + size]
+                position += size
+            index.lengths = values[2 * postings:]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return index
@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+_local = threading.local()
+
+
+class SkillCancelled(Exception):
+    """Raised inside a skill that was cancelled or ran out of time"""
+
+
+class SkillBusy(Exception):
+    """The skill is already running as many times as it may"""
+
+
+def current_task() -> Optional["SkillTask"]:
+    """The task running on this thread, if any"""
+    return getattr(_local, 'task', None)
+
+
+def cancelled() -> bool:
+    """True inside a skill that should stop; skills check it between steps"""
+    task = current_task()
+    return task is not None and task.cancelled
+
+
+def check_cancelled():
+    """Raise ``SkillCancelled`` inside a skill that should stop"""
+    task = current_task()
+    if task is not None and task.cancelled:
+        raise SkillCancelled(task.reason)
+
+
+class SkillTask:
+    """One command being carried out by a skill"""
+
+    def __init__(self, match, context: Dict, timeout: Optional[float],
+                 on_done: Optional[Callable[["SkillTask"], None]] = None):
+        self.match = match
+        self.context = context
+        self.timeout = timeout
+        self.on_done = on_done
+        self.result = None
+        self.error: Optional[str] = None
+        self.reason: Optional[str] = None  # "cancelled" or "timed out"
+        self.started: Optional[float] = None
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+
+    @property
+    def name(self) -> str:
+        return self.match.intent.name
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Ask the skill to stop; False if it already finished or was cancelled"""
+        if self.done.is_set() or self._cancel.is_set():
+            return False
+        self.reason = reason
+        self._cancel.set()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the skill to finish; False on timeout"""
+        return self.done.wait(timeout)
+
+
+class SkillExecutor:
+    """Runs commands on worker threads so the listener never waits for them.
+
+    Each skill (intent name) has its own timeout and its own limit on how
+    many copies may run at once; ``submit`` raises ``SkillBusy`` past it.
+    Threads can't be killed, so cancelling is cooperative: the task is
+    marked, ``on_cancel`` runs (e.g. to stop speech), and the skill stops
+    at its next ``check_cancelled``. A task that is still waiting for a
+    worker never starts. ``on_done`` of a task runs on the worker thread
+    once it is finished, with ``task.error`` set if it failed, timed out
+    or was cancelled.
+    """
+
+    def __init__(self, max_workers: int = 4, timeouts: Optional[Dict[str, float]] = None,
+                 limits: Optional[Dict[str, int]] = None, default_timeout: Optional[float] = 60.0,
+                 default_limit: int = 1, on_cancel: Optional[Callable[[SkillTask], None]] = None):
+        self.timeouts = timeouts or {}
+        self.limits = limits or {}
+        self.default_timeout = default_timeout
+        self.default_limit = default_limit
+        self.on_cancel = on_cancel
+        self._lock = threading.Lock()
+        self._tasks: List[SkillTask] = []  # Queued or running
+        self._queue = queue.Queue()
+        # Daemon threads, so a skill stuck on the network can't hold up exit
+        self._workers = [threading.Thread(target=self._run, name=f"skill-{i}", daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, match, on_done: Optional[Callable[[SkillTask], None]] = None, **context) -> SkillTask:
+        """Carry out ``match`` in the background with ``context`` (e.g. conversation_id)"""
+        name = match.intent.name
+        task = SkillTask(match, context, self.timeouts.get(name, self.default_timeout), on_done)
+        with self._lock:
+            active = sum(1 for other in self._tasks if other.name == name and not other.cancelled)
+            if active >= self.limits.get(name, self.default_limit):
+                raise SkillBusy(name)
+            self._tasks.append(task)
+        self._queue.put(task)
+        return task
+
+    def running(self) -> List[SkillTask]:
+        """Tasks that are queued or running and not cancelled"""
+        with self._lock:
+            return [task for task in self._tasks if not task.cancelled]
+
+    def cancel(self, task: SkillTask, reason: str = "cancelled") -> bool:
+        if not task.cancel(reason):
+            return False
+        if self.on_cancel is not None:
+            try:
+                self.on_cancel(task)
+            except Exception as e:
+                print(f"Error while cancelling {task.name}: {e}")
+        return True
+
+    def cancel_all(self, reason: str = "cancelled") -> int:
+        """Cancel every task; returns how many were still going"""
+        return sum(self.cancel(task, reason) for task in self.running())
+
+    def close(self):
+        """Cancel everything and let the workers exit"""
+        self.cancel_all()
+        for _ in self._workers:
+            self._queue.put(None)
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            if not task.cancelled:
+                self._execute(task)
+            else:
+                task.error = task.reason
+            with self._lock:
+                self._tasks.remove(task)
+            task.done.set()
+            if task.on_done is not None:
+                try:
+                    task.on_done(task)
+                except Exception as e:
+                    print(f"Error reporting {task.name}: {e}")
+
+    def _execute(self, task: SkillTask):
+        task.started = time.time()
+        watchdog = None
+        if task.timeout:
+            watchdog = threading.Timer(task.timeout, self.cancel, (task, "timed out"))
+            watchdog.daemon = True
+            watchdog.start()
+        _local.task = task
+        try:
+            task.result = task.match.run(**task.context)
+            if task.cancelled:
+                task.error = task.reason
+        except SkillCancelled:
+            task.error = task.reason
+        except Exception as e:
+            task.error = task.reason if task.cancelled else str(e)
+        finally:
+            _local.task = None
+            if watchdog is not None:
+                watchdog.cancel()
@@ -0,0 +1,403 @@
+import datetime
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from command_stats import (DAILY_RETENTION, HOURLY_RETENTION, day_bucket, hour_bucket,
+                           window_day_buckets, window_hour_buckets)
+from preferences import PreferenceCache
+from retention import ArchiveStore, RetentionPolicy
+from search_index import parse_query
+
+# Schema mirrors db_setup.py, translated to SQLite
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(user_id),
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NULL
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id INTEGER REFERENCES conversations(conversation_id),
+    speaker TEXT NOT NULL CHECK (speaker IN ('USER', 'ASSISTANT', 'SYSTEM')),
+    message_text TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS command_logs (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(user_id),
+    command_type VARCHAR(50) NOT NULL,
+    command_text TEXT NOT NULL,
+    success BOOLEAN DEFAULT 1,
+    error_message TEXT,
+    timestamp TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_preferences (
+    preference_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(user_id),
+    preference_key VARCHAR(50) NOT NULL,
+    preference_value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, preference_key)
+);
+
+-- Pre-aggregated command counters, bumped in the same transaction as command_logs
+CREATE TABLE IF NOT EXISTS command_rollups (
+    granularity TEXT NOT NULL CHECK (granularity IN ('hour', 'day', 'all')),
+    bucket TEXT NOT NULL,
+    command_type VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    PRIMARY KEY (granularity, bucket, command_type)
+) WITHOUT ROWID;
+
+-- Full-text index over messages, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    message_text, content='messages', content_rowid='message_id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, message_text) VALUES (new.message_id, new.message_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, message_text)
+    VALUES ('delete', old.message_id, old.message_text);
+END;
+
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id);
+CREATE INDEX IF NOT EXISTS idx_messages_speaker ON messages(speaker);
+CREATE INDEX IF NOT EXISTS idx_command_logs_type_time ON command_logs(command_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_command_logs_failed ON command_logs(timestamp) WHERE success = 0;
+"""
+
+# Statements are kept as constants so sqlite3's statement cache reuses them
+INSERT_CONVERSATION = "INSERT INTO conversations (user_id, start_time) VALUES (?, ?)"
+END_CONVERSATION = "UPDATE conversations SET end_time = ? WHERE conversation_id = ?"
+SELECT_CONVERSATIONS = ("SELECT conversation_id, start_time, end_time FROM conversations "
+                        "ORDER BY conversation_id DESC LIMIT ?")
+INSERT_MESSAGE = ("INSERT INTO messages (conversation_id, speaker, message_text, timestamp) "
+                  "VALUES (?, ?, ?, ?)")
+INSERT_COMMAND = ("INSERT INTO command_logs "
+                  "(user_id, command_type, command_text, success, error_message, timestamp) "
+                  "VALUES (?, ?, ?, ?, ?, ?)")
+FIRST_MESSAGE_AT = "SELECT MIN(message_id) FROM messages WHERE timestamp >= ?"
+# Keyset pagination on message_id (insertion order), one statement per filter combination
+SELECT_PAGE = {
+    (False, False): ("SELECT message_id, timestamp, speaker, message_text, conversation_id "
+                     "FROM messages WHERE message_id < ? "
+                     "ORDER BY message_id DESC LIMIT ?"),
+    (True, False): ("SELECT message_id, timestamp, speaker, message_text, conversation_id "
+                    "FROM messages WHERE conversation_id = ? AND message_id < ? "
+                    "ORDER BY message_id DESC LIMIT ?"),
+    (False, True): ("SELECT message_id, timestamp, speaker, message_text, conversation_id "
+                    "FROM messages WHERE speaker = ? AND message_id < ? "
+                    "ORDER BY message_id DESC LIMIT ?"),
+    (True, True): ("SELECT message_id, timestamp, speaker, message_text, conversation_id "
+                   "FROM messages WHERE conversation_id = ? AND speaker = ? AND message_id < ? "
+                   "ORDER BY message_id DESC LIMIT ?"),
+}
+SEARCH_MESSAGES = ("SELECT m.message_id, m.timestamp, m.speaker, m.message_text, m.conversation_id, "
+                   "-bm25(messages_fts) AS score "
+                   "FROM messages_fts JOIN messages m ON m.message_id = messages_fts.rowid "
+                   "WHERE messages_fts MATCH ? "
+                   "AND (? IS NULL OR m.speaker = ?) "
+                   "AND (? IS NULL OR m.timestamp >= ?) "
+                   "AND (? IS NULL OR m.timestamp < ?) "
+                   "ORDER BY bm25(messages_fts), m.message_id DESC LIMIT ?")
+# Cold rows, dropping the oldest beyond the per-conversation cap (NULL cap keeps all)
+SELECT_COLD_MESSAGES = ("SELECT message_id, conversation_id, timestamp, speaker, message_text FROM ("
+                        "  SELECT *, ROW_NUMBER() OVER ("
+                        "    PARTITION BY conversation_id ORDER BY message_id DESC) AS newest_rank "
+                        "  FROM messages) "
+                        "WHERE timestamp < ? AND (? IS NULL OR timestamp >= ?) "
+                        "AND (? IS NULL OR newest_rank <= ?) ORDER BY message_id")
+DELETE_COLD_MESSAGES = "DELETE FROM messages WHERE timestamp < ?"
+SELECT_COLD_COMMANDS = ("SELECT log_id, command_type, command_text, success, error_message, timestamp "
+                        "FROM command_logs WHERE timestamp < ? AND (? IS NULL OR timestamp >= ?) "
+                        "ORDER BY log_id")
+DELETE_COLD_COMMANDS = "DELETE FROM command_logs WHERE timestamp < ?"
+UPSERT_ROLLUP = ("INSERT INTO command_rollups "
+                 "(granularity, bucket, command_type, count, successful, last_error) "
+                 "VALUES (?, ?, ?, 1, ?, ?) "
+                 "ON CONFLICT (granularity, bucket, command_type) DO UPDATE SET "
+                 "count = count + 1, successful = successful + excluded.successful, "
+                 "last_error = COALESCE(excluded.last_error, last_error)")
+PRUNE_ROLLUPS = "DELETE FROM command_rollups WHERE granularity = ? AND bucket < ?"
+SELECT_WINDOW_STATS = ("SELECT command_type, SUM(count) AS count, SUM(successful) AS successful "
+                       "FROM command_rollups WHERE granularity = ? AND bucket >= ? "
+                       "GROUP BY command_type ORDER BY count DESC")
+SELECT_LAST_ERRORS = "SELECT command_type, last_error FROM command_rollups WHERE granularity = 'all'"
+SELECT_FAILED_COMMANDS = ("SELECT timestamp, command_type, command_text, success, error_message "
+                          "FROM command_logs WHERE success = 0 "
+                          "AND (? IS NULL OR command_type = ?) "
+                          "ORDER BY timestamp DESC, log_id DESC LIMIT ?")
+SELECT_PREFERENCES = ("SELECT preference_key, preference_value FROM user_preferences "
+                      "WHERE user_id = ?")
+UPSERT_PREFERENCE = ("INSERT INTO user_preferences (user_id, preference_key, preference_value, updated_at) "
+                     "VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT (user_id, preference_key) DO UPDATE SET "
+                     "preference_value = excluded.preference_value, updated_at = excluded.updated_at")
+
+
+def _now() -> str:
+    """Current time in the format used throughout the history"""
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class SQLiteDatabaseManager:
+    def __init__(self, path: str = "voice_assistant.db"):
+        """Open (and if needed create) the SQLite database"""
+        self.path = path
+        self.current_user_id = 1
+        self.current_conversation_id = None
+
+        # The GUI logs from both the Qt thread and the assistant thread
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False,
+                                          cached_statements=256)
+        self.connection.row_factory = sqlite3.Row
+        self._init_schema()
+
+        # Compacted rows live in gzip segments next to the database, apart from the JSON backend's
+        archive_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "archive")
+        self.archive = ArchiveStore(os.path.join(archive_dir, "history-sqlite"))
+        self.command_archive = ArchiveStore(os.path.join(archive_dir, "commands-sqlite"))
+
+        # Preferences are read once and written back in the background
+        self.preferences = PreferenceCache(load=self._load_preferences, save=self._save_preferences)
+
+    def _init_schema(self):
+        """Create tables and indexes, enable WAL"""
+        with self._lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("PRAGMA foreign_keys=ON")
+            self.connection.executescript(SCHEMA)
+            # Index messages written before the full-text table existed
+            indexed = self.connection.execute("SELECT COUNT(*) FROM messages_fts_docsize").fetchone()[0]
+            if not indexed and self.connection.execute("SELECT 1 FROM messages LIMIT 1").fetchone():
+                self.connection.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            self.connection.execute(
+                "INSERT OR IGNORE INTO users (user_id, username) VALUES (?, 'default_user')",
+                (self.current_user_id,))
+            self.connection.commit()
+
+    @contextmanager
+    def _transaction(self):
+        """Commit on exit unless an enclosing batch() will do it"""
+        with self._lock:
+            if self._batch_depth:
+                yield
+            else:
+                with self.connection:
+                    yield
+
+    @contextmanager
+    def batch(self):
+        """Run several writes in a single transaction; a nested batch joins the outer one"""
+        with self._transaction():
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Run a single write statement in its own transaction"""
+        with self._transaction():
+            return self.connection.execute(sql, params)
+
+    def start_conversation(self) -> int:
+        """Start a new conversation"""
+        cursor = self._execute(INSERT_CONVERSATION, (self.current_user_id, _now()))
+        self.current_conversation_id = cursor.lastrowid
+        return cursor.lastrowid
+
+    def end_conversation(self, conversation_id: int):
+        """End a conversation"""
+        self._execute(END_CONVERSATION, (_now(), conversation_id))
+
+    def get_conversations(self, limit: int = 20) -> List[Dict]:
+        """Get the most recent conversations with their start and end times, newest first"""
+        with self._lock:
+            rows = self.connection.execute(SELECT_CONVERSATIONS, (limit,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def log_message(self, speaker: str, text: str, conversation_id: int, timestamp: str = None):
+        """Log a message to the conversation history"""
+        self._execute(INSERT_MESSAGE, (conversation_id, speaker, text, timestamp or _now()))
+
+    def log_command(self, command_type: str, command: str, success: bool = True, error: str = None,
+                    timestamp: str = None):
+        """Log a command execution"""
+        if timestamp:
+            now = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+        else:
+            now = datetime.datetime.now()
+            timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        with self._transaction():
+            self.connection.execute(INSERT_COMMAND, (self.current_user_id, command_type, command,
+                                                     int(success), error, timestamp))
+            for granularity, bucket in (('hour', hour_bucket(now)), ('day', day_bucket(now)), ('all', '')):
+                self.connection.execute(UPSERT_ROLLUP, (granularity, bucket, command_type,
+                                                        int(success), error))
+            # Age out old buckets; both deletes walk the primary key
+            self.connection.execute(PRUNE_ROLLUPS, ('hour', hour_bucket(now - HOURLY_RETENTION)))
+            self.connection.execute(PRUNE_ROLLUPS, ('day', day_bucket(now - DAILY_RETENTION)))
+
+    def get_conversation_history(self, limit: int = 50) -> List[Dict]:
+        """Get conversation history, newest first, archived messages included"""
+        return self.get_history_page(limit)[0]
+
+    def get_history_page(self, limit: int = 50, before: Optional[int] = None,
+                         conversation_id: Optional[int] = None, speaker: Optional[str] = None,
+                         before_timestamp: Optional[str] = None) -> Tuple[List[Dict], Optional[int]]:
+        """Get one page of history, newest first, plus the cursor for the next (older) page"""
+        # message_id is the rowid, so every variant below is an index range scan
+        bound = before if before is not None else 2 ** 63 - 1
+        with self._lock:
+            if before_timestamp is not None:
+                first = self.connection.execute(FIRST_MESSAGE_AT, (before_timestamp,)).fetchone()[0]
+                if first is not None:
+                    bound = min(bound, first)
+            params = [value for value in (conversation_id, speaker) if value is not None]
+            sql = SELECT_PAGE[(conversation_id is not None, speaker is not None)]
+            # Fetch one extra row to learn whether another page exists
+            rows = self.connection.execute(sql, (*params, bound, limit + 1)).fetchall()
+        messages = [dict(row) for row in rows[:limit]]
+        has_more = len(rows) > limit
+
+        # Read through to archived messages once the table runs out
+        if not has_more and self.archive.segments:
+            if len(messages) < limit:
+                archived, has_more = self.archive.page(limit - len(messages), bound, conversation_id,
+                                                       speaker, before_timestamp)
+                messages.extend(archived)
+            else:
+                has_more = True
+        next_cursor = messages[-1]['message_id'] if messages and has_more else None
+        return messages, next_cursor
+
+    def search_messages(self, query: str, limit: int = 20, speaker: Optional[str] = None,
+                        since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Full-text search over history; supports "quoted phrases", best match first"""
+        # Quote every phrase so user input is never parsed as FTS5 syntax
+        phrases = parse_query(query)
+        if not phrases:
+            return []
+        match = " ".join('"' + " ".join(phrase) + '"' for phrase in phrases)
+        with self._lock:
+            rows = self.connection.execute(SEARCH_MESSAGES, (match, speaker, speaker, since, since,
+                                                             until, until, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def compact(self, policy: Optional[RetentionPolicy] = None) -> Dict:
+        """Archive cold messages and command logs and apply the retention policy.
+
+        ``max_hot_bytes`` does not apply here; SQLite reuses the freed pages.
+        """
+        policy = policy or RetentionPolicy()
+        now = datetime.datetime.now()
+        archive_cutoff = policy.archive_cutoff(now)
+        expiry_cutoff = policy.expiry_cutoff(now)
+        cap = policy.max_messages_per_conversation
+        result = {'archived': 0, 'dropped': 0, 'archived_commands': 0}
+        if archive_cutoff is None:
+            return result
+
+        with self._lock:
+            with self.connection:
+                messages = [dict(row) for row in self.connection.execute(
+                    SELECT_COLD_MESSAGES, (archive_cutoff, expiry_cutoff, expiry_cutoff, cap, cap))]
+                self.archive.write_segment(messages)
+                deleted = self.connection.execute(DELETE_COLD_MESSAGES, (archive_cutoff,)).rowcount
+                result['archived'] = len(messages)
+                result['dropped'] = deleted - len(messages)
+
+                commands = [dict(row) for row in self.connection.execute(
+                    SELECT_COLD_COMMANDS, (archive_cutoff, expiry_cutoff, expiry_cutoff))]
+                self.command_archive.write_segment(commands, id_key='log_id')
+                result['archived_commands'] = self.connection.execute(
+                    DELETE_COLD_COMMANDS, (archive_cutoff,)).rowcount
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        db_bytes = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        result['removed_segments'] = self.archive.enforce(policy, now, hot_bytes=db_bytes)
+        self.command_archive.enforce(policy, now)
+        result['archive_segments'] = len(self.archive.segments)
+        result['archive_bytes'] = self.archive.size
+        return result
+
+    def get_command_statistics(self, days: Optional[int] = 7, hours: Optional[int] = None) -> List[Dict]:
+        """Get command statistics for the last ``hours``/``days`` (all time if both are None)"""
+        with self._lock:
+            if hours is not None:
+                rows = self.connection.execute(
+                    SELECT_WINDOW_STATS, ('hour', window_hour_buckets(hours)[-1])).fetchall()
+            elif days is not None:
+                rows = self.connection.execute(
+                    SELECT_WINDOW_STATS, ('day', window_day_buckets(days)[-1])).fetchall()
+            else:
+                rows = self.connection.execute(SELECT_WINDOW_STATS, ('all', '')).fetchall()
+            last_errors = dict(self.connection.execute(SELECT_LAST_ERRORS).fetchall())
+
+        result = []
+        for row in rows:
+            stat = dict(row)
+            stat['failed'] = stat['count'] - stat['successful']
+            stat['last_error'] = last_errors.get(stat['command_type'])
+            result.append(stat)
+        return result
+
+    def get_command_errors(self, limit: int = 20, command_type: str = None) -> List[Dict]:
+        """Get the most recent failed commands, newest first"""
+        with self._lock:
+            rows = self.connection.execute(SELECT_FAILED_COMMANDS,
+                                           (command_type, command_type, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _load_preferences(self) -> Dict:
+        with self._lock:
+            return dict(self.connection.execute(SELECT_PREFERENCES, (self.current_user_id,)).fetchall())
+
+    def _save_preferences(self, prefs: Dict, changed: set):
+        now = _now()
+        with self._transaction():
+            self.connection.executemany(UPSERT_PREFERENCE, [
+                (self.current_user_id, key, prefs[key], now) for key in changed])
+
+    def get_user_preference(self, key: str, default: str = None) -> str:
+        """Get a user preference"""
+        return self.preferences.get(key, default)
+
+    def set_user_preference(self, key: str, value: str):
+        """Set a user preference"""
+        self.preferences.set(key, value)
+
+    def subscribe_preferences(self, callback: Callable[[str, str], None],
+                              keys: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """Get notified when preferences change; returns an unsubscribe function"""
+        return self.preferences.subscribe(callback, keys)
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            try:
+                self.preferences.flush()
+            except sqlite3.ProgrammingError:
+                pass  # Already closed
+            self.connection.close()
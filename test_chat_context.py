@@ -0,0 +1,94 @@
+import threading
+import time
+
+from chat_context import ChatContext, estimate_tokens
+from file_utils import read_json
+from history_store import JournalHistoryStore
+
+
+class _History:
+    """The part of DatabaseManager that ChatContext reads"""
+
+    def __init__(self, tmp_path):
+        self.store = JournalHistoryStore(str(tmp_path / "history.journal"))
+
+    def say(self, speaker, text, conversation_id=1):
+        self.store.append(conversation_id, "2024-01-01T12:00:00", speaker, text)
+
+    def get_history_page(self, limit=50, before=None, conversation_id=None):
+        return self.store.page(limit, before, conversation_id)
+
+
+class _LLM:
+    def __init__(self):
+        self.calls = []
+        self.done = threading.Event()
+
+    def complete(self, messages, max_tokens=None):
+        self.calls.append(messages[-1]['content'])
+        self.done.set()
+        return f"summary {len(self.calls)}"
+
+
+def _context(tmp_path, window_tokens=1024):
+    return ChatContext(_History(tmp_path), _LLM(), window_tokens=window_tokens,
+                       summary_file=str(tmp_path / "summaries.json"))
+
+
+def _settle(context, timeout=5.0):
+    """Wait for background summaries to be written"""
+    deadline = time.monotonic() + timeout
+    while context._folding and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _turn_tokens(messages):
+    return sum(estimate_tokens(m['content']) for m in messages if m['role'] != 'system')
+
+
+def test_recent_turns_come_back_in_order(tmp_path):
+    context = _context(tmp_path)
+    context.db.say("USER", "who wrote dune")
+    context.db.say("ASSISTANT", "Frank Herbert.")
+    context.db.say("ASSISTANT", "In 1965.")
+    context.db.say("SYSTEM", "Listening...")
+    context.db.say("USER", "other conversation", conversation_id=2)
+    context.db.say("USER", "when did he die")
+    assert context.messages("When did he die", conversation_id=1)[1:] == [
+        {'role': 'user', 'content': "who wrote dune"},
+        {'role': 'assistant', 'content': "Frank Herbert. In 1965."},
+        {'role': 'user', 'content': "When did he die"},
+    ]
+    assert context.messages("hello") == [{'role': 'system', 'content': context.system_prompt},
+                                         {'role': 'user', 'content': "hello"}]
+
+
+def test_old_turns_are_folded_into_the_summary(tmp_path):
+    context = _context(tmp_path, window_tokens=100)
+    for i in range(10):
+        context.db.say("USER", f"question number {i} " + "x" * 40)
+        context.db.say("ASSISTANT", f"answer number {i} " + "y" * 40)
+    messages = context.messages("next question", conversation_id=1)
+    assert context.llm.done.wait(5)
+    assert "question number 0" in context.llm.calls[0]
+    assert all("question number 0" not in m['content'] for m in messages)
+    assert messages[-2]['content'].startswith("answer number 9")
+
+    _settle(context)
+    assert read_json(str(tmp_path / "summaries.json"))['1']['summary'] == "summary 1"
+    messages = context.messages("next question", conversation_id=1)
+    assert messages[1] == {'role': 'system', 'content': "Earlier in this conversation: summary 1"}
+
+
+def test_prompt_stays_within_the_window(tmp_path):
+    context = _context(tmp_path, window_tokens=200)
+    for i in range(60):
+        context.db.say("USER", f"question {i} " + "x" * 60)
+        context.db.say("ASSISTANT", f"answer {i} " + "y" * 60)
+        messages = context.messages("and then?", conversation_id=1)
+        assert _turn_tokens(messages) <= context.window_tokens
+        assert messages[-2]['content'].startswith(f"answer {i}")
+        _settle(context)
+    assert len(context.llm.calls) > 1
+    # Each fold builds on the summary before it
+    assert "Summary so far: summary" in context.llm.calls[-1]
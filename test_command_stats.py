@@ -0,0 +1,56 @@
+import datetime
+
+from command_stats import CommandRollups, day_bucket, hour_bucket, window_day_buckets, window_hour_buckets
+
+
+def _counts(rows):
+    return {row['command_type']: (row['count'], row['successful']) for row in rows}
+
+
+def _rollups(now):
+    rollups = CommandRollups()
+    rollups.record("time", True, moment=now)
+    rollups.record("time", False, "no clock", moment=now)
+    rollups.record("email", True, moment=now - datetime.timedelta(hours=2))
+    rollups.record("wikipedia", True, moment=now - datetime.timedelta(days=3))
+    rollups.record("youtube", True, moment=now - datetime.timedelta(days=40))
+    return rollups
+
+
+def test_window_buckets_count_back_from_now():
+    now = datetime.datetime(2024, 3, 1, 0, 30)
+    assert window_hour_buckets(2, now) == ["2024-03-01 00", "2024-02-29 23"]
+    assert window_day_buckets(2, now) == ["2024-03-01", "2024-02-29"]
+
+
+def test_windows_sum_only_the_buckets_they_cover():
+    rollups = _rollups(datetime.datetime.now())
+    assert _counts(rollups.window(hours=1)) == {'time': (2, 1)}
+    assert _counts(rollups.window(hours=3)) == {'time': (2, 1), 'email': (1, 1)}
+    assert _counts(rollups.window(days=7)) == {'time': (2, 1), 'email': (1, 1), 'wikipedia': (1, 1)}
+    assert _counts(rollups.window()) == {'time': (2, 1), 'email': (1, 1), 'wikipedia': (1, 1),
+                                         'youtube': (1, 1)}
+
+
+def test_window_rows_carry_failures_and_the_last_error():
+    rows = CommandRollups(_rollups(datetime.datetime.now()).to_dict()).window(hours=1)
+    assert rows == [{'command_type': "time", 'count': 2, 'successful': 1, 'failed': 1,
+                     'last_error': "no clock"}]
+
+
+def test_prune_keeps_lifetime_totals():
+    now = datetime.datetime.now()
+    rollups = _rollups(now)
+    rollups.record("email", True, moment=now - datetime.timedelta(days=500))
+    rollups.prune(now)
+    assert min(rollups.hourly) >= hour_bucket(now - datetime.timedelta(days=7))
+    kept = [datetime.timedelta(0), datetime.timedelta(hours=2), datetime.timedelta(days=3),
+            datetime.timedelta(days=40)]
+    assert set(rollups.daily) == {day_bucket(now - offset) for offset in kept}
+    assert rollups.total['email'] == [2, 2]
+
+
+def test_legacy_stats_become_lifetime_totals():
+    rollups = CommandRollups({'time': {'count': 4, 'successful': 3}})
+    assert _counts(rollups.window()) == {'time': (4, 3)}
+    assert rollups.window(days=1) == []
@@ -0,0 +1,57 @@
+import importlib
+import json
+
+import pytest
+
+from history_store import JournalHistoryStore
+from retention import RetentionPolicy
+
+# Everything logged so far counts as cold
+ARCHIVE_ALL = RetentionPolicy(archive_after_days=-1, max_hot_bytes=None)
+
+
+@pytest.fixture
+def manager_class(tmp_path, monkeypatch):
+    # DatabaseManager keeps its files in the working directory
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("db_manager").DatabaseManager
+
+
+def test_conversation_ids_continue_after_legacy_history(tmp_path, manager_class):
+    legacy = {'3': [{'timestamp': "2024-01-01 00:00:00", 'speaker': "USER", 'message_text': "hi"}],
+              '7': [{'timestamp': "2024-01-02 00:00:00", 'speaker': "USER", 'message_text': "hello"}]}
+    (tmp_path / "conversation_history.json").write_text(json.dumps(legacy))
+    db = manager_class()
+    assert db.start_conversation() == 8
+    db.close()
+
+
+def test_conversation_ids_keep_increasing_across_restart_and_compaction(manager_class):
+    db = manager_class()
+    first = db.start_conversation()
+    db.log_message("USER", "hello", first, timestamp="2024-01-01 00:00:00")
+    second = db.start_conversation()
+    assert second > first
+    db.close()
+
+    db = manager_class()
+    third = db.start_conversation()
+    assert third > second
+    db.log_message("USER", "again", third, timestamp="2024-01-01 00:01:00")
+    assert db.compact(ARCHIVE_ALL)['archived'] == 2
+    fourth = db.start_conversation()
+    assert fourth > third
+    db.close()
+
+    db = manager_class()
+    assert db.start_conversation() > fourth
+    db.close()
+
+
+def test_conversation_ids_continue_after_history_logged_before_the_counter(manager_class):
+    store = JournalHistoryStore()
+    store.append(12, "2024-01-01 00:00:00", "USER", "hello")
+    store.close()
+    db = manager_class()
+    assert db.start_conversation() == 13
+    db.close()
@@ -0,0 +1,88 @@
+import pytest
+
+from email_dialog import ContactIndex, EmailDialog, parse_email
+
+CONTACTS = {'sachin': "sachin@example.com", 'dante lizzar': "dante@example.com", 'diana': "diana@example.com"}
+
+
+@pytest.mark.parametrize("utterance, slots", [
+    ("write to sachin the subject is lunch and the message is hi",
+     {'recipient': "sachin", 'subject': "lunch", 'body': "hi"}),
+    ("email sachin subject lunch saying see you at noon",
+     {'recipient': "sachin", 'subject': "lunch", 'body': "see you at noon"}),
+    ("send an email to dante with the subject meeting and tell him about lunch",
+     {'recipient': "dante", 'subject': "meeting", 'body': "about lunch"}),
+    ("write to sachin and the subject is lunch", {'recipient': "sachin", 'subject': "lunch"}),
+    ("send a message to diana the message is running late", {'recipient': "diana", 'body': "running late"}),
+    ("email diana about the trip", {'recipient': "diana", 'subject': "the trip"}),
+    ("send an email", {}),
+])
+def test_slots_spoken_in_one_utterance(utterance, slots):
+    assert parse_email(utterance) == slots
+
+
+def test_reply_fills_the_slot_that_was_asked_for():
+    assert parse_email("lunch, saying see you at noon", first_slot="subject") == \
+        {'subject': "lunch", 'body': "see you at noon"}
+    assert parse_email("tell him about lunch", first_slot="body") == {'body': "tell him about lunch"}
+
+
+def test_contacts_match_by_part_run_together_or_sound():
+    contacts = ContactIndex(CONTACTS)
+    assert contacts.match("dante") == "dante lizzar"
+    assert contacts.match("dantelizzar") == "dante lizzar"
+    assert contacts.match("sashin") == "sachin"
+    assert contacts.match("somebody else") is None
+
+
+class Script:
+    """Replies to the dialogue's questions in order, recording what it said"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.asked = []
+        self.said = []
+
+    def ask(self, question):
+        self.asked.append(question)
+        return self.replies.pop(0) if self.replies else ""
+
+    def say(self, text):
+        self.said.append(text)
+
+
+def _run(command, *replies):
+    script = Script(*replies)
+    return EmailDialog(ContactIndex(CONTACTS), script.ask, script.say).run(command), script
+
+
+def test_only_missing_slots_are_asked_for():
+    email, script = _run("email sachin about lunch", "see you at noon", "send")
+    assert email == {'name': "sachin", 'to': "sachin@example.com", 'subject': "lunch", 'body': "see you at noon"}
+    assert script.asked[0] == "What would you like the email to say?"
+    assert len(script.asked) == 2
+
+
+@pytest.mark.parametrize("reply, sent", [
+    ("send", True),
+    ("yes send it", True),
+    ("don't send", False),
+    ("do not send it", False),
+    ("no", False),
+    ("cancel", False),
+])
+def test_confirmation(reply, sent):
+    email, script = _run("write to sachin the subject is lunch and the message is hi", reply)
+    assert (email is not None) == sent
+    if not sent:
+        assert script.said[-1] == "Email cancelled."
+
+
+def test_cancel_while_filling_in():
+    email, script = _run("send an email", "cancel")
+    assert email is None and script.said == ["Email cancelled."]
+
+
+def test_gives_up_after_unanswered_questions():
+    email, script = _run("email sachin about lunch", "", "", "")
+    assert email is None and len(script.asked) == 3
@@ -0,0 +1,75 @@
+import json
+import threading
+
+import pytest
+
+from file_utils import CorruptFileError, FileLock, atomic_write_json, read_json
+
+
+def _damage(path):
+    """Change the data without updating its checksum"""
+    with open(path) as f:
+        content = json.load(f)
+    content['data']['name'] = "garbled"
+    with open(path, 'w') as f:
+        json.dump(content, f)
+
+
+def test_round_trip_keeps_the_previous_version_as_backup(tmp_path):
+    path = str(tmp_path / "prefs.json")
+    assert read_json(path) == {}
+    atomic_write_json(path, {'name': "first"})
+    atomic_write_json(path, {'name': "second"})
+    assert read_json(path) == {'name': "second"}
+    assert read_json(path + ".bak") == {'name': "first"}
+
+
+def test_checksum_mismatch_recovers_from_backup(tmp_path):
+    path = str(tmp_path / "prefs.json")
+    atomic_write_json(path, {'name': "first"})
+    atomic_write_json(path, {'name': "second"})
+    _damage(path)
+    assert read_json(path) == {'name': "first"}
+    # The damaged copy is set aside and the recovered data written back
+    assert (tmp_path / "prefs.json.corrupt").exists()
+    assert read_json(path) == {'name': "first"}
+
+
+def test_both_copies_damaged_is_an_error(tmp_path):
+    path = str(tmp_path / "prefs.json")
+    atomic_write_json(path, {'name': "first"})
+    atomic_write_json(path, {'name': "second"})
+    _damage(path)
+    (tmp_path / "prefs.json.bak").write_text("{ truncated")
+    with pytest.raises(CorruptFileError):
+        read_json(path)
+    # Nothing was overwritten
+    assert "garbled" in (tmp_path / "prefs.json").read_text()
+
+
+def test_damaged_file_without_backup_is_an_error(tmp_path):
+    path = str(tmp_path / "prefs.json")
+    atomic_write_json(path, {'name': "only"})
+    _damage(path)
+    with pytest.raises(CorruptFileError):
+        read_json(path)
+
+
+def test_lock_excludes_other_holders(tmp_path):
+    path = str(tmp_path / "prefs.lock")
+    holder = FileLock(path)
+    acquired = threading.Event()
+
+    def contender():
+        with FileLock(path):
+            acquired.set()
+
+    with holder:
+        # Re-entrant for the holder
+        with holder:
+            pass
+        thread = threading.Thread(target=contender)
+        thread.start()
+        assert not acquired.wait(0.2)
+    assert acquired.wait(5)
+    thread.join(5)
@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from history_model import HistoryTableModel
+from history_store import JournalHistoryStore
+
+
+class _History:
+    """The part of DatabaseManager the model reads"""
+
+    def __init__(self, tmp_path):
+        self.store = JournalHistoryStore(str(tmp_path / "history.journal"))
+
+    def get_history_page(self, limit=50, before=None, conversation_id=None, speaker=None,
+                         before_timestamp=None):
+        return self.store.page(limit, before, conversation_id, speaker, before_timestamp)
+
+
+def _texts(model):
+    return [model.data(model.index(row, 2)) for row in range(model.rowCount())]
+
+
+def _fill(history, count):
+    for i in range(count):
+        speaker = "USER" if i % 2 == 0 else "ASSISTANT"
+        history.store.append(1 + i // 10, f"2024-01-01 00:{i:02d}:00", speaker, f"message {i}")
+
+
+def test_pages_dropped_at_either_end_are_read_back_by_cursor(tmp_path):
+    history = _History(tmp_path)
+    _fill(history, 10)
+    model = HistoryTableModel(history, page_size=3, max_pages=2)
+    model.refresh()
+    newest = _texts(model)
+    assert newest == ["message 9", "message 8", "message 7"]
+
+    while model.canFetchMore():
+        model.fetchMore()
+    assert _texts(model) == ["message 3", "message 2", "message 1", "message 0"]
+    # Logged while the user looks at old messages; scrolling back up must not shift the pages
+    history.store.append(2, "2024-01-01 00:10:00", "USER", "message 10")
+    while model.canFetchPrevious():
+        model.fetchPrevious()
+    assert _texts(model) == newest + ["message 6", "message 5", "message 4"]
+
+    model.fetchMore()
+    assert _texts(model) == ["message 6", "message 5", "message 4", "message 3", "message 2", "message 1"]
+    model.refresh()
+    assert _texts(model)[0] == "message 10"
+
+
+def test_filters_apply_to_every_page(tmp_path):
+    history = _History(tmp_path)
+    _fill(history, 20)
+    model = HistoryTableModel(history, page_size=1, max_pages=2)
+    model.set_filters(conversation_id=1, speaker="USER", before_timestamp="2024-01-01 00:07:00")
+    while model.canFetchMore():
+        model.fetchMore()
+    assert _texts(model) == ["message 2", "message 0"]
+    while model.canFetchPrevious():
+        model.fetchPrevious()
+    assert _texts(model) == ["message 6", "message 4"]
+
+    model.set_filters(speaker="ASSISTANT")
+    model.fetchMore()
+    assert _texts(model) == ["message 19", "message 17"]
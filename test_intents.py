@@ -0,0 +1,69 @@
+import pytest
+
+import vassist
+from intents import Intent, IntentRegistry
+
+
+@pytest.fixture
+def registry():
+    return vassist.intents
+
+
+@pytest.mark.parametrize("command, intent", [
+    ("time please", "time_word"),
+    ("what's the time now", "time"),
+    ("what time is it", "time"),
+    ("time", "time_word"),
+    ("time to leave", "time_word"),
+    ("open youtube", "youtube"),
+    ("open google please", "google"),
+    ("search wikipedia for alan turing", "wikipedia"),
+    ("send an email to sachin", "email"),
+    ("email about the time of the meeting", "email"),
+    ("stop", "stop"),
+    ("please stop", "stop"),
+    ("stop the rain in the story", "general"),
+    ("goodbye", "exit"),
+    ("tell me a joke", "general"),
+])
+def test_commands_route_as_before(registry, command, intent):
+    assert registry.match(command).intent.name == intent
+
+
+def test_wikipedia_topic_comes_from_the_slots(registry):
+    match = registry.match("what does wikipedia say about alan turing")
+    assert match.slots == {'before': "what does", 'after': "say about alan turing"}
+
+
+def test_complete_commands_can_run_early(registry):
+    assert registry.is_complete("open youtube")
+    assert registry.is_complete("what time is it")
+    assert not registry.is_complete("open youtube and")
+    assert not registry.is_complete("tell me")
+    # May still become "time zone in tokyo"
+    assert not registry.is_complete("time")
+
+
+def _noop(match, **context):
+    return match.command
+
+
+def test_priority_then_length_then_position():
+    registry = IntentRegistry([Intent("low", ["alan turing"], _noop, priority=1),
+                               Intent("high", ["turing"], _noop, priority=2),
+                               Intent("short", ["alan"], _noop, priority=1)])
+    assert registry.match("alan turing").intent.name == "high"
+    registry = IntentRegistry([Intent("a", ["alan"], _noop), Intent("b", ["alan turing"], _noop)])
+    assert registry.match("who was alan turing").intent.name == "b"
+    assert registry.match("who was alan turing").span == (2, 4)
+
+
+def test_unmatched_commands_go_to_the_default():
+    registry = IntentRegistry([Intent("time", ["time"], _noop)], default=Intent("general", [], _noop))
+    assert registry.match("hello there").intent.name == "general"
+    assert registry.match("...") is None
+
+
+def test_pattern_needs_a_word():
+    with pytest.raises(ValueError):
+        IntentRegistry([Intent("empty", ["{query}"], _noop)])
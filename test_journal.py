@@ -0,0 +1,97 @@
+import os
+
+from journal import Journal
+
+
+def _journal(tmp_path, count=3):
+    path = str(tmp_path / "test.journal")
+    journal = Journal(path)
+    for i in range(count):
+        journal.append({'n': i})
+    journal.close()
+    return path
+
+
+def _records(path):
+    journal = Journal(path)
+    try:
+        return [record['n'] for record in journal]
+    finally:
+        journal.close()
+
+
+def test_records_survive_reopening(tmp_path):
+    path = _journal(tmp_path)
+    journal = Journal(path)
+    assert len(journal) == 3
+    assert journal.read(1) == {'n': 1} and journal.read(-1) == {'n': 2}
+    assert journal.tail(2) == [{'n': 1}, {'n': 2}]
+    assert [number for number, _ in journal.iter_reverse(before=2)] == [1, 0]
+    journal.close()
+
+
+def test_half_written_record_is_cut_off(tmp_path):
+    path = _journal(tmp_path)
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'{"n":')
+    assert _records(path) == [0, 1, 2]
+    assert os.path.getsize(path) == size
+
+    journal = Journal(path)
+    assert journal.append({'n': 3}) == 3
+    journal.close()
+    assert _records(path) == [0, 1, 2, 3]
+
+
+def test_torn_index_entry_is_dropped(tmp_path):
+    path = _journal(tmp_path)
+    with open(path + ".idx", 'ab') as f:
+        f.write(b"\x01\x02\x03")
+    assert _records(path) == [0, 1, 2]
+    assert os.path.getsize(path + ".idx") == 3 * 8
+
+
+def test_index_entry_for_a_lost_record_is_dropped(tmp_path):
+    path = _journal(tmp_path)
+    # The index made it to disk, the end of the last record did not
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 3)
+    assert _records(path) == [0, 1]
+
+
+def test_records_missing_from_the_index_are_indexed(tmp_path):
+    path = _journal(tmp_path)
+    with open(path, 'ab') as f:
+        f.write(b'{"n":3}\n{"n":4}\n')
+    assert _records(path) == [0, 1, 2, 3, 4]
+
+    os.remove(path + ".idx")
+    assert _records(path) == [0, 1, 2, 3, 4]
+
+
+def test_replace_contents_swaps_the_records(tmp_path):
+    path = _journal(tmp_path, count=5)
+    journal = Journal(path)
+    journal.replace_contents([{'n': 3}, {'n': 4}])
+    assert len(journal) == 2 and journal.read(0) == {'n': 3}
+    journal.append({'n': 5})
+    journal.close()
+    assert _records(path) == [3, 4, 5]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_other_writers_are_picked_up_on_refresh(tmp_path):
+    path = _journal(tmp_path)
+    reader, writer = Journal(path), Journal(path)
+    writer.append({'n': 3})
+    assert len(reader) == 3
+    assert reader.refresh() is False
+    assert len(reader) == 4 and reader.read(3) == {'n': 3}
+
+    writer.replace_contents([{'n': 9}])
+    # Record numbers start over after another process compacted
+    assert reader.refresh() is True
+    assert [record['n'] for record in reader] == [9]
+    reader.close()
+    writer.close()
@@ -0,0 +1,140 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import LLMClient, sentences
+
+
+class StubOllama(ThreadingHTTPServer):
+    """Just enough of the Ollama HTTP API to drive LLMClient"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.requests = []  # (path, body) in arrival order
+        self.models = set()
+        self.failing = False
+        self.tokens = ["Hello", " there.", " How", " are", " you?", " Fine"]
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def paths(self):
+        return [path for path, _ in self.requests]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server.requests.append((self.path, body))
+        if server.failing:
+            return self._reply(500, {'error': "server starting"})
+        if self.path == "/api/show":
+            if body.get('model') not in server.models:
+                return self._reply(404, {'error': "model not found"})
+            return self._reply(200, {'modelfile': "", 'model_info': {}})
+        if self.path == "/api/pull":
+            server.models.add(body['model'])
+            return self._reply(200, {'status': "success"})
+        if self.path == "/api/generate":
+            return self._reply(200, {'model': body['model'], 'response': "", 'done': True})
+        if self.path == "/api/chat":
+            if not body.get('stream'):
+                return self._reply(200, {'model': body['model'], 'done': True,
+                                         'message': {'role': "assistant", 'content': "".join(server.tokens)}})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for token in server.tokens:
+                line = {'model': body['model'], 'done': False, 'message': {'role': "assistant", 'content': token}}
+                self.wfile.write(json.dumps(line).encode() + b"\n")
+                self.wfile.flush()
+            self.wfile.write(json.dumps({'model': body['model'], 'done': True,
+                                         'message': {'role': "assistant", 'content': ""}}).encode() + b"\n")
+            return
+        self._reply(404, {'error': "unknown path"})
+
+
+@pytest.fixture
+def stub():
+    server = StubOllama()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_sentences_are_split_as_tokens_arrive():
+    assert list(sentences(["Hi", " there.", " Bye", "!"])) == ["Hi there.", "Bye!"]
+
+
+def test_warm_up_pulls_a_missing_model_and_loads_it(stub):
+    client = LLMClient(model="tiny", host=stub.url, keep_alive="5m")
+    client.warm_up()
+    assert client.error is None and client.ready.is_set()
+    assert stub.paths() == ["/api/show", "/api/pull", "/api/generate"]
+    assert stub.requests[-1][1]['keep_alive'] == "5m"
+
+    stub.requests.clear()
+    client.warm_up()
+    # Already on the server: no second pull
+    assert stub.paths() == ["/api/show", "/api/generate"]
+
+
+def test_chat_hands_over_each_sentence_as_it_completes(stub):
+    stub.models.add("tiny")
+    client = LLMClient(model="tiny", host=stub.url).start()
+    heard = []
+    answer = client.chat([{'role': "user", 'content': "hi"}], on_sentence=heard.append)
+    assert heard == ["Hello there.", "How are you?", "Fine"]
+    assert answer == "Hello there. How are you? Fine"
+    assert stub.requests[-1][1]['stream'] is True
+
+
+def test_chat_stops_when_the_listener_says_so(stub):
+    stub.models.add("tiny")
+    client = LLMClient(model="tiny", host=stub.url).start()
+    answer = client.chat([{'role': "user", 'content': "hi"}], on_sentence=lambda sentence: False)
+    assert answer == ""
+
+
+def test_failed_warm_up_is_retried_on_the_next_question(stub):
+    stub.models.add("tiny")
+    stub.failing = True
+    client = LLMClient(model="tiny", host=stub.url)
+    client.warm_up()
+    assert client.error is not None
+
+    stub.failing = False
+    assert client.chat([{'role': "user", 'content': "hi"}]) == "Hello there. How are you? Fine"
+    assert client.error is None
+    assert stub.paths()[-3:] == ["/api/show", "/api/generate", "/api/chat"]
+
+
+def test_unavailable_server_raises_from_chat():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # Nothing listens on ``port`` any more
+    client = LLMClient(model="tiny", host="http://127.0.0.1:%d" % port)
+    client.warm_up()
+    assert client.error is not None
+    with pytest.raises(Exception):
+        client.chat([{'role': "user", 'content': "hi"}])
@@ -0,0 +1,152 @@
+import email
+import email.message
+import socketserver
+import threading
+import time
+
+import pytest
+
+from mailer import Mailer, SMTPSession
+
+
+class StubSMTP(socketserver.ThreadingTCPServer):
+    """Plain SMTP server that records what it gets and answers as told"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubSMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.noops = 0
+        self.data_replies = []  # Answers to the next DATA commands, then "250 ok"
+        self.hang_up_after = None  # Drop each connection when it starts its n-th message
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        sent = 0
+        self._reply("220 stub ready")
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 stub")
+            elif command.startswith("MAIL"):
+                if server.hang_up_after is not None and sent >= server.hang_up_after:
+                    return
+                self._reply("250 ok")
+            elif command.startswith("RCPT") or command == "RSET":
+                self._reply("250 ok")
+            elif command == "NOOP":
+                server.noops += 1
+                self._reply("250 ok")
+            elif command == "DATA":
+                self._reply("354 go ahead")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                reply = server.data_replies.pop(0) if server.data_replies else "250 ok"
+                if reply.startswith("250"):
+                    server.messages.append(email.message_from_bytes(data))
+                    sent += 1
+                self._reply(reply)
+            elif command == "QUIT":
+                self._reply("221 bye")
+                return
+            else:
+                self._reply("500 unknown command")
+
+
+@pytest.fixture
+def stub():
+    server = StubSMTP()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _session(stub, **options):
+    return SMTPSession("127.0.0.1", stub.port, starttls=False, timeout=5, **options)
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def _message(subject):
+    message = email.message.EmailMessage()
+    message['From'], message['To'], message['Subject'] = "me@example.com", "you@example.com", subject
+    message.set_content("hello")
+    return message
+
+
+def test_connection_is_reused_between_messages(stub):
+    session = _session(stub)
+    session.send(_message("one"))
+    session.send(_message("two"))
+    session.close()
+    assert [message['Subject'] for message in stub.messages] == ["one", "two"]
+    assert stub.connections == session.connections == 1
+
+
+def test_dropped_connection_is_reopened_once(stub):
+    stub.hang_up_after = 1
+    session = _session(stub)
+    session.send(_message("one"))
+    # The server hangs up on the second message; it goes out over a new connection
+    session.send(_message("two"))
+    assert [message['Subject'] for message in stub.messages] == ["one", "two"]
+    assert session.connections == 2
+    session.close()
+
+
+def test_keepalive_sends_noop_then_hangs_up_when_idle(stub):
+    session = _session(stub, noop_interval=0, idle_timeout=60)
+    session.send(_message("one"))
+    session.keepalive()
+    assert stub.noops == 1 and session.connected
+
+    session.idle_timeout = 0
+    session.keepalive()
+    assert not session.connected
+
+
+def test_permanent_failure_leaves_the_outbox(stub, tmp_path):
+    stub.data_replies = ["554 message rejected"]
+    results = []
+    mailer = Mailer(_session(stub), "me@example.com", outbox_file=str(tmp_path / "outbox.json"),
+                    retry_delay=0.01, on_result=lambda message, error: results.append((message['subject'], error)))
+    mailer.start()
+    mailer.send_email("you@example.com", "lunch", "hi")
+    assert mailer.flush(timeout=5)
+    mailer.close()
+
+    assert mailer.pending() == []
+    assert [(message['subject'], message['attempts']) for message in mailer.failed()] == [("lunch", 1)]
+    assert results[0][0] == "lunch" and "554" in results[0][1]
+    # Not retried after a restart either
+    assert Mailer(_session(stub), "me@example.com", outbox_file=str(tmp_path / "outbox.json")).pending() == []
+
+
+def test_temporary_failure_is_retried(stub, tmp_path):
+    stub.data_replies = ["451 try again later"]
+    mailer = Mailer(_session(stub), "me@example.com", outbox_file=str(tmp_path / "outbox.json"),
+                    retry_delay=0.01)
+    mailer.start()
+    mailer.send_email("you@example.com", "lunch", "hi")
+    assert mailer.flush(timeout=5)
+    mailer.close()
+    assert _wait(lambda: [message['Subject'] for message in stub.messages] == ["lunch"])
+    assert mailer.failed() == []
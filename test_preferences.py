@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from preferences import PreferenceCache
+
+
+def _cache(saves, write_delay=60, values=None):
+    return PreferenceCache(lambda: dict(values or {}), lambda data, changed: saves.append((data, changed)),
+                           write_delay=write_delay)
+
+
+def test_many_changes_are_saved_once():
+    saves = []
+    cache = _cache(saves, values={'voice_gender': "female"})
+    cache.set('voice_speed', "1.0")
+    cache.set('voice_speed', "1.5")
+    cache.set('wake_word', "computer")
+    cache.set('voice_gender', "female")
+    assert saves == []
+    assert cache.get('voice_speed') == "1.5"
+    cache.flush()
+    assert saves == [({'voice_gender': "female", 'voice_speed': "1.5", 'wake_word': "computer"},
+                      {'voice_speed', 'wake_word'})]
+    cache.flush()
+    assert len(saves) == 1
+
+
+def test_changes_are_saved_after_the_delay():
+    saves = []
+    cache = _cache(saves, write_delay=0.05)
+    cache.set('voice_speed', "1.5")
+    cache.set('wake_word', "computer")
+    deadline = time.monotonic() + 5
+    while not saves and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert saves == [({'voice_speed': "1.5", 'wake_word': "computer"}, {'voice_speed', 'wake_word'})]
+
+
+def test_failed_save_is_retried():
+    attempts = []
+
+    def save(data, changed):
+        attempts.append(set(changed))
+        if len(attempts) == 1:
+            raise OSError("disk full")
+
+    cache = PreferenceCache(dict, save, write_delay=60)
+    cache.set('wake_word', "computer")
+    with pytest.raises(OSError):
+        cache.flush()
+    cache.set('voice_speed', "1.5")
+    cache.flush()
+    assert attempts == [{'wake_word'}, {'wake_word', 'voice_speed'}]
+
+
+def test_subscribers_hear_changes_until_they_unsubscribe():
+    cache = _cache([])
+    everything, wake_words = [], []
+    cache.subscribe(lambda key, value: everything.append((key, value)))
+    unsubscribe = cache.subscribe(lambda key, value: wake_words.append(value), keys=["wake_word"])
+    cache.subscribe(lambda key, value: 1 / 0)  # A broken listener does not stop the others
+    cache.set('wake_word', "computer")
+    cache.set('voice_speed', "1.5")
+    cache.set('voice_speed', "1.5")
+    unsubscribe()
+    unsubscribe()
+    cache.set('wake_word', "jarvis")
+    assert wake_words == ["computer"]
+    assert everything == [('wake_word', "computer"), ('voice_speed', "1.5"), ('wake_word', "jarvis")]
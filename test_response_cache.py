@@ -0,0 +1,52 @@
+import os
+import time
+
+from response_cache import ResponseCache, context_digest, is_cacheable, normalize
+
+
+def test_question_words_keep_questions_apart():
+    assert normalize("When was Einstein born?") != normalize("where was einstein born")
+    assert normalize("how do planes fly") != normalize("why do planes fly")
+
+
+def test_leading_filler_is_ignored():
+    assert normalize("Tell me about the Moon") == normalize("moon") == "moon"
+    assert normalize("search wikipedia for Alan Turing") == normalize("who is alan turing")
+
+
+def test_personal_and_follow_up_questions_skip_the_cache(tmp_path):
+    assert not is_cacheable("what is my name")
+    assert not is_cacheable("do you remember what i said")
+    assert not is_cacheable("who directed it")
+    assert is_cacheable("tell me about einstein")
+    cache = ResponseCache(str(tmp_path / "cache.json"))
+    cache.put('llm', "what is my name", "Sam.")
+    assert cache.get('llm', "what is my name") is None
+
+
+def test_answer_is_only_reused_after_the_same_context(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.json"))
+    first = context_digest([{'role': "system", 'content': "prompt"}])
+    later = context_digest([{'role': "system", 'content': "prompt"},
+                            {'role': "user", 'content': "I mean the band"}])
+    cache.put('llm', "Who is Queen?", "A monarch.", first)
+    assert cache.get('llm', "who is queen", first) == "A monarch."
+    assert cache.get('llm', "who is queen", later) is None
+    assert cache.get('llm', "who is queen") is None
+
+
+def test_saves_are_batched_until_the_delay_or_flush(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path, save_delay=60)
+    cache.put('llm', "capital of france", "Paris.")
+    cache.put('llm', "capital of spain", "Madrid.")
+    assert not os.path.exists(path)
+    cache.close()
+    assert ResponseCache(path).get('llm', "capital of spain") == "Madrid."
+
+    cache = ResponseCache(path, save_delay=0.05)
+    cache.put('llm', "capital of italy", "Rome.")
+    deadline = time.monotonic() + 5
+    while ResponseCache(path).get('llm', "capital of italy") is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert ResponseCache(path).get('llm', "capital of italy") == "Rome."
@@ -0,0 +1,75 @@
+import datetime
+import os
+
+from history_store import JournalHistoryStore
+from retention import ArchiveStore, RetentionPolicy
+from sqlite_manager import SQLiteDatabaseManager
+
+# Everything logged so far counts as cold
+ARCHIVE_ALL = RetentionPolicy(archive_after_days=-1, max_hot_bytes=None)
+
+
+def _texts(messages):
+    return [message['message_text'] for message in messages]
+
+
+def test_json_compact_reads_through_archive(tmp_path):
+    store = JournalHistoryStore(str(tmp_path / "history.journal"))
+    for i in range(5):
+        store.append(1, f"2024-01-01 00:00:0{i}", "USER", f"old {i}")
+    result = store.compact(ARCHIVE_ALL, now=datetime.datetime(2024, 1, 1, 1))
+    assert result['archived'] == 5 and result['hot_messages'] == 0
+    store.append(1, "2024-01-01 02:00:00", "USER", "new")
+
+    assert _texts(store.recent(10)) == ["new", "old 4", "old 3", "old 2", "old 1", "old 0"]
+    page, cursor = store.page(3)
+    assert _texts(page) == ["new", "old 4", "old 3"]
+    assert _texts(store.page(3, before=cursor)[0]) == ["old 2", "old 1", "old 0"]
+    store.close()
+
+
+def test_sqlite_compact_reads_through_archive(tmp_path):
+    db = SQLiteDatabaseManager(str(tmp_path / "assistant.db"))
+    conversation_id = db.start_conversation()
+    for i in range(5):
+        db.log_message("USER", f"old {i}", conversation_id, timestamp=f"2024-01-01 00:00:0{i}")
+    assert db.compact(ARCHIVE_ALL)['archived'] == 5
+    db.log_message("USER", "new", conversation_id)
+
+    assert _texts(db.get_conversation_history(10)) == ["new", "old 4", "old 3", "old 2", "old 1", "old 0"]
+    page, cursor = db.get_history_page(3)
+    assert _texts(page) == ["new", "old 4", "old 3"]
+    assert _texts(db.get_history_page(3, before=cursor)[0]) == ["old 2", "old 1", "old 0"]
+    db.close()
+
+
+def test_backends_side_by_side_keep_separate_archives(tmp_path):
+    store = JournalHistoryStore(str(tmp_path / "history.journal"))
+    db = SQLiteDatabaseManager(str(tmp_path / "assistant.db"))
+    conversation_id = db.start_conversation()
+    store.append(1, "2024-01-01 00:00:00", "USER", "from json")
+    db.log_message("USER", "from sqlite", conversation_id, timestamp="2024-01-01 00:00:00")
+    store.compact(ARCHIVE_ALL, now=datetime.datetime(2024, 1, 1, 1))
+    db.compact(ARCHIVE_ALL)
+
+    assert store.archive.directory != db.archive.directory
+    assert _texts(store.recent(10)) == ["from json"]
+    assert _texts(db.get_conversation_history(10)) == ["from sqlite"]
+    store.close()
+    db.close()
+
+
+def test_archive_writers_never_reuse_a_segment_number(tmp_path):
+    first = ArchiveStore(str(tmp_path / "archive"))
+    second = ArchiveStore(str(tmp_path / "archive"))
+    record = {'message_id': 0, 'conversation_id': 1, 'timestamp': "2024-01-01 00:00:00",
+              'speaker': "USER", 'message_text': "a"}
+    first.write_segment([record])
+    # ``second`` still holds the index from before the first write
+    second.write_segment([dict(record, message_id=1, message_text="b")])
+
+    first.reload()
+    assert [segment['file'] for segment in first.segments] == ["segment-000001.jsonl.gz",
+                                                               "segment-000002.jsonl.gz"]
+    assert [r['message_text'] for s in first.segments for r in first.read_segment(s)] == ["a", "b"]
+    assert not [name for name in os.listdir(tmp_path / "archive") if name.endswith(".tmp")]
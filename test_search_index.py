@@ -0,0 +1,79 @@
+import json
+
+from history_store import JournalHistoryStore
+from search_index import InvertedIndex, parse_query
+
+MESSAGES = ["tell me about alan turing", "turing machines and alan kay", "alan turing alan turing",
+            "who was turing", "the weather today"]
+
+
+def _index(messages=MESSAGES):
+    index = InvertedIndex()
+    for doc_id, text in enumerate(messages):
+        index.add(doc_id, text, "USER" if doc_id % 2 == 0 else "ASSISTANT", f"2024-01-0{doc_id + 1} 00:00:00")
+    return index
+
+
+def _search(index, query, **filters):
+    return [doc for doc, _ in index.search(query, lambda doc: MESSAGES[doc], **filters)]
+
+
+def test_parse_query_keeps_quoted_phrases_together():
+    assert parse_query('"Alan Turing" machines') == [["alan", "turing"], ["machines"]]
+
+
+def test_phrase_search_needs_the_words_in_order():
+    index = _index()
+    # "turing machines and alan kay" has both words, but not as a phrase
+    assert sorted(_search(index, '"alan turing"')) == [0, 2]
+    assert sorted(_search(index, "alan turing")) == [0, 1, 2]
+
+
+def test_bm25_ranks_repeated_phrase_first():
+    assert _search(_index(), '"alan turing"')[0] == 2
+
+
+def test_filters_apply_to_speaker_and_time():
+    index = _index()
+    assert _search(index, "turing", speaker="ASSISTANT") == [3, 1]
+    assert sorted(_search(index, "turing", since="2024-01-03 00:00:00")) == [2, 3]
+    assert _search(index, "missing") == []
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "index.search")
+    index = _index()
+    index.save(path)
+    loaded = InvertedIndex.load(path)
+    assert loaded.end == index.end
+    assert _search(loaded, '"alan turing"') == _search(index, '"alan turing"')
+    loaded.add(loaded.end, "alan turing again", "USER", "2024-01-09 00:00:00")
+    assert loaded.end == index.end + 1
+
+
+def test_snapshot_from_another_version_is_ignored(tmp_path):
+    path = tmp_path / "index.search"
+    _index().save(str(path))
+    header, _, rest = path.read_bytes().partition(b"\n")
+    state = json.loads(header)
+    state['version'] -= 1
+    path.write_bytes(json.dumps(state).encode() + b"\n" + rest)
+    assert InvertedIndex.load(str(path)) is None
+
+    path.write_bytes(b"\x80\x04garbage")
+    assert InvertedIndex.load(str(path)) is None
+
+
+def test_store_rebuilds_index_from_unreadable_snapshot(tmp_path):
+    path = str(tmp_path / "history.journal")
+    store = JournalHistoryStore(path)
+    for i, text in enumerate(MESSAGES):
+        store.append(1, f"2024-01-0{i + 1} 00:00:00", "USER", text)
+    assert [m['message_text'] for m in store.search('"alan turing"')][0] == "alan turing alan turing"
+    store.close()
+
+    with open(path + ".search", 'wb') as f:
+        f.write(b"not an index")
+    store = JournalHistoryStore(path)
+    assert len(store.search('"alan turing"')) == 2
+    store.close()
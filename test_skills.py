@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+import skills
+from intents import Intent, Match
+from skills import SkillBusy, SkillExecutor
+
+
+def _match(name, handler):
+    return Match(Intent(name, [name], handler), name, {}, (0, 1))
+
+
+def _sleeper(match, seconds=5, **context):
+    """Waits like a skill stuck on the network, checking for cancellation"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        skills.check_cancelled()
+        time.sleep(0.01)
+    return "slept"
+
+
+@pytest.fixture
+def executor():
+    executor = SkillExecutor(max_workers=2, timeouts={'slow': 0.1}, limits={'wiki': 2})
+    yield executor
+    executor.close()
+
+
+def test_result_and_context_reach_the_caller(executor):
+    finished = []
+    task = executor.submit(_match("echo", lambda match, **context: context['conversation_id']),
+                           on_done=finished.append, conversation_id=7)
+    assert task.wait(5)
+    assert task.result == 7 and task.error is None
+    assert finished == [task]
+    assert executor.running() == []
+
+
+def test_watchdog_cancels_a_skill_that_runs_too_long(executor):
+    cancelled = []
+    executor.on_cancel = cancelled.append
+    task = executor.submit(_match("slow", _sleeper))
+    assert task.wait(5)
+    assert task.error == "timed out" and task.result is None
+    assert cancelled == [task]
+
+
+def test_cancel_stops_a_skill_at_its_next_check(executor):
+    started = threading.Event()
+
+    def skill(match, **context):
+        started.set()
+        return _sleeper(match)
+
+    task = executor.submit(_match("long", skill))
+    assert started.wait(5)
+    assert executor.cancel_all() == 1
+    assert task.wait(5)
+    assert task.error == "cancelled"
+    # Already finished: nothing left to cancel
+    assert not executor.cancel(task)
+
+
+def test_skill_errors_are_reported_not_raised(executor):
+    def skill(match, **context):
+        raise RuntimeError("no network")
+
+    task = executor.submit(_match("broken", skill))
+    assert task.wait(5)
+    assert task.error == "no network"
+
+
+def test_each_skill_runs_at_most_its_limit_at_once(executor):
+    release = threading.Event()
+
+    def skill(match, **context):
+        release.wait(5)
+
+    first = executor.submit(_match("echo", skill))
+    with pytest.raises(SkillBusy):
+        executor.submit(_match("echo", skill))
+    # Other skills have their own limit, and "wiki" allows two
+    wiki = [executor.submit(_match("wiki", skill)) for _ in range(2)]
+    with pytest.raises(SkillBusy):
+        executor.submit(_match("wiki", skill))
+    release.set()
+    assert all(task.wait(5) for task in [first] + wiki)
+    executor.submit(_match("echo", skill)).wait(5)
+
+
+def test_cancelled_task_waiting_for_a_worker_never_starts():
+    executor = SkillExecutor(max_workers=1, default_limit=2)
+    release = threading.Event()
+    ran = []
+
+    def skill(match, **context):
+        ran.append(match.command)
+        release.wait(5)
+
+    executor.submit(_match("busy", skill))
+    queued = executor.submit(_match("queued", skill))
+    executor.cancel(queued)
+    release.set()
+    assert queued.wait(5)
+    assert queued.error == "cancelled" and ran == ["busy"]
+    executor.close()
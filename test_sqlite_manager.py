@@ -0,0 +1,72 @@
+import importlib
+import inspect
+import sqlite3
+
+import pytest
+
+from sqlite_manager import SQLiteDatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteDatabaseManager(str(tmp_path / "assistant.db"))
+    yield db
+    db.close()
+
+
+def _public_methods(cls):
+    return {name: list(inspect.signature(member).parameters)
+            for name, member in inspect.getmembers(cls, inspect.isfunction) if not name.startswith('_')}
+
+
+def test_public_api_matches_the_json_backend(tmp_path, monkeypatch):
+    # Importing db_manager creates its global instance in the working directory
+    monkeypatch.chdir(tmp_path)
+    DatabaseManager = importlib.import_module("db_manager").DatabaseManager
+    assert _public_methods(SQLiteDatabaseManager) == _public_methods(DatabaseManager)
+
+
+def _texts(messages):
+    return sorted(message['message_text'] for message in messages)
+
+
+@pytest.mark.parametrize("query, found", [
+    ('"send the email"', ["please send the email now"]),
+    ('"email the"', []),
+    ('e-mail', ["my e-mail address"]),
+    ('-email', ["please send the email now"]),
+    ('sen*', []),
+    ('send*', ["please send the email now"]),
+    ('NOT much', ["not much"]),
+    ('email OR much', []),
+    ('don"t "open', []),
+    ('"', []),
+])
+def test_search_input_is_never_fts_syntax(db, query, found):
+    conversation_id = db.start_conversation()
+    for text in ("please send the email now", "my e-mail address", "not much"):
+        db.log_message("USER", text, conversation_id)
+    assert _texts(db.search_messages(query)) == found
+
+
+def test_nested_batch_commits_once_at_the_outside(db, tmp_path):
+    other = sqlite3.connect(str(tmp_path / "assistant.db"))
+
+    def stored():
+        return other.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    conversation_id = db.start_conversation()
+    with db.batch():
+        db.log_message("USER", "outer", conversation_id)
+        with db.batch():
+            db.log_message("USER", "inner", conversation_id)
+        assert stored() == 0
+    assert stored() == 2
+
+    with pytest.raises(RuntimeError):
+        with db.batch():
+            db.log_message("USER", "rolled back", conversation_id)
+            with db.batch():
+                raise RuntimeError("failed")
+    assert stored() == 2
+    other.close()
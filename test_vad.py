@@ -0,0 +1,63 @@
+import numpy as np
+
+from vad import Endpointer, VoiceActivityDetector
+
+RATE = 16000
+
+
+def _noise(seconds, rng):
+    return rng.normal(0, 30, int(seconds * RATE))
+
+
+def _voice(seconds):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return 3000 * np.sin(2 * np.pi * 180 * t) + 1000 * np.sin(2 * np.pi * 360 * t)
+
+
+def _signal(*parts):
+    return np.concatenate(parts).astype(np.int16)
+
+
+def _endpoint(samples, vad, **options):
+    """Seconds at which the endpointer reports the end, and the phrase start, in seconds"""
+    frame_seconds = vad.frame_size / RATE
+    endpointer = Endpointer(frame_seconds, **options)
+    speech, _ = vad.classify(samples, noise_floor=30)
+    for frame, is_speech in enumerate(speech):
+        if endpointer.push(bool(is_speech)):
+            return (frame + 1) * frame_seconds, endpointer.start * frame_seconds
+    return None, endpointer.start
+
+
+def test_voice_and_noise_are_told_apart():
+    rng = np.random.default_rng(0)
+    vad = VoiceActivityDetector()
+    speech, _ = vad.classify(_signal(_noise(0.5, rng), _voice(0.5)), noise_floor=30)
+    half = len(speech) // 2
+    assert not speech[:half - 1].any()
+    assert speech[half + 1:].all()
+
+
+def test_phrase_ends_about_200ms_after_speech():
+    rng = np.random.default_rng(1)
+    vad = VoiceActivityDetector()
+    samples = _signal(_noise(0.5, rng), _voice(0.8), _noise(1.0, rng))
+    end, start = _endpoint(samples, vad, end_silence=0.2, margin=0.05)
+    frame = vad.frame_size / RATE
+    assert abs(end - (1.3 + 0.2)) <= 2 * frame
+    assert abs(start - (0.5 - 0.05)) <= 2 * frame
+
+
+def test_short_pause_does_not_split_the_phrase():
+    rng = np.random.default_rng(2)
+    vad = VoiceActivityDetector()
+    samples = _signal(_noise(0.3, rng), _voice(0.4), _noise(0.12, rng), _voice(0.4), _noise(1.0, rng))
+    end, _ = _endpoint(samples, vad, end_silence=0.2)
+    assert end > 0.3 + 0.4 + 0.12 + 0.4
+
+
+def test_click_does_not_start_a_phrase():
+    rng = np.random.default_rng(3)
+    vad = VoiceActivityDetector()
+    samples = _signal(_noise(0.3, rng), _voice(0.02), _noise(1.0, rng))
+    assert _endpoint(samples, vad, min_speech=0.06) == (None, None)
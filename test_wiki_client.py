@@ -0,0 +1,141 @@
+import json
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from response_cache import ResponseCache
+from wiki_client import WikipediaClient, WikipediaError
+
+PAGES = {
+    "Alan Turing": {'type': "standard", 'extract': "Alan Turing was a mathematician."},
+    "Mercury": {'type': "disambiguation", 'extract': "Mercury may refer to:"},
+    "Mercury (planet)": {'type': "standard", 'extract': "Mercury is the smallest planet."},
+    "Mercury (element)": {'type': "standard", 'extract': "Mercury is a chemical element."},
+    "Freddie Mercury": {'type': "standard", 'extract': "Freddie Mercury was a singer."},
+}
+SEARCH = {"mercury": ["Mercury", "Mercury (planet)", "Mercury (element)", "Freddie Mercury"],
+          "turing machine inventor": ["Turing machine", "Alan Turing"]}
+
+
+class StubWikipedia(ThreadingHTTPServer):
+    """The two Wikipedia endpoints WikipediaClient uses, with a little latency"""
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.05):
+        super().__init__(("127.0.0.1", 0), StubWikipediaHandler)
+        self.delay = delay
+        self.paths = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.failing = False
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def summaries(self):
+        return [urllib.parse.unquote(path.split("/")[-1].split("?")[0]).replace("_", " ")
+                for path in self.paths if "/page/summary/" in path]
+
+
+class StubWikipediaHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.paths.append(self.path)
+            server.in_flight += 1
+            server.most_in_flight = max(server.most_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            self._answer(server)
+        finally:
+            with server._lock:
+                server.in_flight -= 1
+
+    def _answer(self, server):
+        if server.failing:
+            return self._reply(503, {'error': "unavailable"})
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.startswith("/api/rest_v1/page/summary/"):
+            asked = urllib.parse.unquote(url.path.rsplit("/", 1)[1]).replace("_", " ")
+            # Other capitalizations redirect to the page
+            title = next((title for title in PAGES if title.lower() == asked.lower()), None)
+            if title is None:
+                return self._reply(404, {'type': "not_found"})
+            return self._reply(200, dict(PAGES[title], title=title))
+        if url.path == "/w/api.php":
+            query = urllib.parse.parse_qs(url.query)['srsearch'][0]
+            titles = SEARCH.get(query.lower(), [])
+            return self._reply(200, {'query': {'search': [{'title': title} for title in titles]}})
+        self._reply(404, {})
+
+
+@pytest.fixture
+def stub():
+    server = StubWikipedia()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(url, tmp_path, **options):
+    return WikipediaClient(url, cache=ResponseCache(str(tmp_path / "wiki.json")), **options)
+
+
+def test_page_named_by_the_query_takes_one_request(stub, tmp_path):
+    article = _client(stub.url, tmp_path).lookup("alan turing")
+    assert article.title == "Alan Turing"
+    assert article.summary == "Alan Turing was a mathematician."
+    assert article.url == stub.url + "/wiki/Alan_Turing"
+    assert len(stub.paths) == 1
+
+
+def test_disambiguation_falls_back_to_search_candidates_in_parallel(stub, tmp_path):
+    stub.delay = 0.2
+    article = _client(stub.url, tmp_path, candidates=3).lookup("mercury")
+    # First real article in search order, the disambiguation page skipped
+    assert article.title == "Mercury (planet)"
+    assert sorted(stub.summaries()[1:]) == ["Freddie Mercury", "Mercury (element)", "Mercury (planet)"]
+    assert stub.most_in_flight == 3
+
+
+def test_search_is_used_when_no_page_has_the_name(stub, tmp_path):
+    assert _client(stub.url, tmp_path).lookup("turing machine inventor").title == "Alan Turing"
+    assert _client(stub.url, tmp_path).lookup("no such thing") is None
+
+
+def test_cached_article_needs_no_network(stub, tmp_path):
+    client = _client(stub.url, tmp_path)
+    client.lookup("alan turing")
+    client.cache.close()
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        closed = "http://127.0.0.1:%d" % sock.getsockname()[1]
+    # Nothing listens at ``closed``; the answer comes from the cache file
+    article = _client(closed, tmp_path).lookup("Alan Turing")
+    assert article.summary == "Alan Turing was a mathematician."
+
+
+def test_server_errors_are_reported(stub, tmp_path):
+    stub.failing = True
+    with pytest.raises(WikipediaError):
+        _client(stub.url, tmp_path).lookup("alan turing")
@@ -0,0 +1,116 @@
+import contextlib
+import threading
+import time
+
+import pytest
+
+from write_behind import WriteBehindQueue
+
+
+class FakeDB:
+    """Records each batch the queue writes; ``gate`` can hold the writer up"""
+
+    def __init__(self):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    @contextlib.contextmanager
+    def batch(self):
+        self.gate.wait(5)
+        self.batches.append([])
+        yield
+
+    def log_message(self, speaker, text, conversation_id, timestamp):
+        if text == "boom":
+            raise ValueError("bad message")
+        self.batches[-1].append(('message', text))
+
+    def log_command(self, command_type, command, success, error, timestamp):
+        self.batches[-1].append(('command', command))
+
+    def set_user_preference(self, key, value):
+        self.batches[-1].append(('preference', key, value))
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_writes_are_grouped_into_batches():
+    db = FakeDB()
+    writer = WriteBehindQueue(db, batch_size=3, flush_interval=10)
+    for i in range(7):
+        writer.log_message("USER", str(i), 1)
+    assert writer.flush(timeout=5)
+    assert [len(batch) for batch in db.batches] == [3, 3, 1]
+    assert [text for batch in db.batches for _, text in batch] == [str(i) for i in range(7)]
+    metrics = writer.metrics()
+    assert metrics['written'] == 7 and metrics['batches'] == 3 and metrics['largest_batch'] == 3
+    writer.close()
+
+
+def test_partial_batch_is_written_after_the_interval():
+    db = FakeDB()
+    writer = WriteBehindQueue(db, batch_size=100, flush_interval=0.05)
+    writer.log_message("USER", "hello", 1)
+    writer.log_command("time", "what time is it")
+    assert _wait(lambda: writer.metrics()['written'] == 2)
+    assert db.batches == [[('message', "hello"), ('command', "what time is it")]]
+    writer.close()
+
+
+def test_only_the_last_value_of_a_preference_is_written():
+    db = FakeDB()
+    writer = WriteBehindQueue(db, batch_size=100, flush_interval=10)
+    for speed in ("1.0", "1.25", "1.5"):
+        writer.set_user_preference("voice_speed", speed)
+    writer.set_user_preference("wake_word", "computer")
+    writer.flush(timeout=5)
+    assert db.batches == [[('preference', "voice_speed", "1.5"), ('preference', "wake_word", "computer")]]
+    writer.close()
+
+
+def test_failed_write_does_not_lose_the_rest_of_the_batch():
+    db = FakeDB()
+    writer = WriteBehindQueue(db, flush_interval=10)
+    for text in ("one", "boom", "two"):
+        writer.log_message("USER", text, 1)
+    writer.flush(timeout=5)
+    assert db.batches == [[('message', "one"), ('message', "two")]]
+    assert writer.metrics()['errors'] == 1 and writer.metrics()['written'] == 2
+    writer.close()
+
+
+def test_full_queue_makes_the_caller_wait():
+    db = FakeDB()
+    db.gate.clear()
+    writer = WriteBehindQueue(db, max_pending=2, batch_size=1, flush_interval=10)
+    writer.log_message("USER", "taken by the writer", 1)
+    assert _wait(lambda: writer.metrics()['pending'] == 0)
+    writer.log_message("USER", "a", 1)
+    writer.log_message("USER", "b", 1)
+    blocked = threading.Thread(target=writer.log_message, args=("USER", "c", 1))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+
+    db.gate.set()
+    blocked.join(5)
+    assert writer.flush(timeout=5)
+    metrics = writer.metrics()
+    assert metrics['backpressure_waits'] == 1 and metrics['written'] == 4
+    writer.close()
+
+
+def test_no_writes_after_close():
+    db = FakeDB()
+    writer = WriteBehindQueue(db)
+    writer.log_message("USER", "last", 1)
+    writer.close()
+    assert db.batches == [[('message', "last")]]
+    with pytest.raises(RuntimeError):
+        writer.log_message("USER", "too late", 1)
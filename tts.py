@@ -0,0 +1,391 @@
+import collections
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+from tts_cache import AudioCache
+
+
+SENTENCE_BREAK = re.compile(r'(?<=[.!?;:])\s+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split ``text`` after sentence punctuation, so the first sentence can play while the rest waits"""
+    return [sentence for sentence in SENTENCE_BREAK.split(text.strip()) if sentence]
+
+
+class SayDriver:
+    """macOS ``say``; one process per sentence, stopped by terminating it"""
+
+    VOICES = {'male': "Alex", 'female': "Samantha"}
+
+    def __init__(self):
+        self.voice = "Alex"
+        self.rate = None
+        self._process = None
+
+    def configure(self, rate: Optional[int] = None, gender: Optional[str] = None):
+        if rate:
+            self.rate = rate
+        if gender:
+            self.voice = self.VOICES.get(gender.lower(), self.voice)
+
+    def say(self, text: str):
+        command = ["say", "-v", self.voice]
+        if self.rate:
+            command += ["-r", str(self.rate)]
+        self._process = subprocess.Popen(command + [text])
+        self._process.wait()
+
+    @property
+    def settings(self):
+        return self.voice, self.rate
+
+    def render(self, text: str, path: str):
+        command = ["say", "-v", self.voice, "-o", path, "--file-format=WAVE", "--data-format=LEI16@22050"]
+        if self.rate:
+            command += ["-r", str(self.rate)]
+        subprocess.run(command + [text], check=True)
+
+    def stop(self):
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+
+
+class Pyttsx3Driver:
+    """pyttsx3 (SAPI5 on Windows, eSpeak on Linux); must live on the thread that speaks"""
+
+    def __init__(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+
+    def configure(self, rate: Optional[int] = None, gender: Optional[str] = None):
+        if rate:
+            self.engine.setProperty('rate', rate)
+        if gender:
+            for voice in self.engine.getProperty('voices'):
+                # This is a simplistic approach - voice selection varies by platform
+                if gender.lower() in voice.name.lower():
+                    self.engine.setProperty('voice', voice.id)
+                    break
+
+    def say(self, text: str):
+        self.engine.say(text)
+        self.engine.runAndWait()
+
+    @property
+    def settings(self):
+        return self.engine.getProperty('voice'), self.engine.getProperty('rate')
+
+    def render(self, text: str, path: str):
+        self.engine.save_to_file(text, path)
+        self.engine.runAndWait()
+
+    def stop(self):
+        self.engine.stop()
+
+
+def detect_driver():
+    """The speech driver class for this platform, chosen once"""
+    if sys.platform == "darwin" and shutil.which("say"):
+        return SayDriver
+    return Pyttsx3Driver
+
+
+class WavPlayer:
+    """Plays WAV files through PyAudio in small blocks, so ``stop`` takes effect at once"""
+
+    def __init__(self, block_frames: int = 1024):
+        self.block_frames = block_frames
+        self._audio = None
+        self._stop = threading.Event()
+
+    def play(self, path: str):
+        import pyaudio
+        if self._audio is None:
+            self._audio = pyaudio.PyAudio()
+        self._stop.clear()
+        with wave.open(path, 'rb') as wav:
+            stream = self._audio.open(format=self._audio.get_format_from_width(wav.getsampwidth()),
+                                      channels=wav.getnchannels(), rate=wav.getframerate(), output=True)
+            try:
+                data = wav.readframes(self.block_frames)
+                while data and not self._stop.is_set():
+                    stream.write(data)
+                    data = wav.readframes(self.block_frames)
+            finally:
+                stream.stop_stream()
+                stream.close()
+
+    def stop(self):
+        self._stop.set()
+
+    def close(self):
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+
+class Utterance:
+    """One ``TTSWorker.say`` call; ``wait()`` blocks until it was spoken or cut off"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.sentences = split_sentences(text)
+        self.interrupted = False
+        self.done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """True if the whole text was spoken"""
+        self.done.wait(timeout)
+        return self.done.is_set() and not self.interrupted
+
+
+_WARM = object()  # Queued by prewarm() to wake the worker
+
+
+class TTSWorker:
+    """Speaks queued text on its own thread.
+
+    ``say`` returns at once; sentences are spoken one at a time, so long
+    answers start playing after the first sentence and can be cut off
+    between or during sentences. With ``barge_in``, the microphone
+    stream returned by ``get_stream`` is watched while speaking, and
+    loud enough speech stops playback and drops the queue. Afterwards
+    the stream is moved past the assistant's own voice, or back to where
+    the user started talking, so the next ``listen`` hears them.
+
+    With a ``cache``, sentences that keep coming up are rendered to WAV
+    once per voice setting and played from disk; ``prewarm`` renders
+    known phrases while the worker is idle.
+
+    ``subscribe`` registers ``on_start(text)`` and
+    ``on_end(text, interrupted)`` callbacks, called on the worker thread.
+    """
+
+    def __init__(self, get_stream: Optional[Callable] = None, barge_in: bool = True,
+                 barge_in_ratio: float = 3.0, barge_in_seconds: float = 0.25,
+                 cache: Optional[AudioCache] = None):
+        self.get_stream = get_stream
+        self.cache = cache
+        self.player = WavPlayer()
+        self._warm_phrases: List[str] = []
+        self._warm = collections.deque()  # Sentences still to render
+        self.barge_in = barge_in
+        # The assistant's own voice reaches the microphone too, so barge-in needs
+        # speech this many times louder than the normal VAD threshold
+        self.barge_in_ratio = barge_in_ratio
+        self.barge_in_seconds = barge_in_seconds
+        self._driver_class = detect_driver()
+        self.driver = None
+        self._settings = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._current = None
+        self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+        self._thread.start()
+
+    def subscribe(self, on_start: Optional[Callable[[str], None]] = None,
+                  on_end: Optional[Callable[[str, bool], None]] = None):
+        """Register callbacks; returns a token for ``unsubscribe``"""
+        token = (on_start, on_end)
+        with self._lock:
+            self._callbacks.append(token)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            if token in self._callbacks:
+                self._callbacks.remove(token)
+
+    def configure(self, rate: Optional[int] = None, gender: Optional[str] = None):
+        """Change the voice; applied before the next utterance"""
+        with self._lock:
+            self._settings.update({key: value for key, value in
+                                   (('rate', rate), ('gender', gender)) if value})
+
+    def prewarm(self, phrases: Iterable[str]):
+        """Render ``phrases`` into the cache in the background, now and after voice changes"""
+        if self.cache is None:
+            return
+        with self._lock:
+            for phrase in phrases:
+                for sentence in split_sentences(phrase):
+                    self._warm_phrases.append(sentence)
+                    self._warm.append(sentence)
+        # Wakes the worker if it is waiting for text
+        self._queue.put(_WARM)
+
+    def say(self, text: str) -> Utterance:
+        """Queue ``text`` for speaking"""
+        utterance = Utterance(text)
+        self._queue.put(utterance)
+        return utterance
+
+    @property
+    def speaking(self) -> bool:
+        return self._current is not None or not self._queue.empty()
+
+    def interrupt(self):
+        """Stop speaking and drop everything queued"""
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # Keep the shutdown request
+                self._queue.put(None)
+                break
+            if pending is _WARM:
+                continue
+            pending.interrupted = True
+            pending.done.set()
+        current = self._current
+        if current is not None:
+            current.interrupted = True
+            self.player.stop()
+            if self.driver is not None:
+                self.driver.stop()
+
+    def close(self):
+        """Finish what is queued and stop the thread"""
+        self._queue.put(None)
+        self._thread.join(10)
+        self.player.close()
+
+    def _notify(self, index: int, *args):
+        with self._lock:
+            callbacks = [callback[index] for callback in self._callbacks if callback[index]]
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in speech callback: {e}")
+
+    def _run(self):
+        try:
+            self.driver = self._driver_class()
+        except Exception as e:
+            print(f"Error in speech synthesis: {e}")
+        while True:
+            self._apply_settings()
+            if self._warm and self._queue.empty() and self.driver is not None:
+                self._warm_one()
+                continue
+            utterance = self._queue.get()
+            if utterance is None:
+                break
+            if utterance is _WARM:
+                continue
+            self._apply_settings()
+            self._speak(utterance)
+
+    def _apply_settings(self):
+        with self._lock:
+            settings, self._settings = self._settings, {}
+        if settings and self.driver is not None:
+            try:
+                self.driver.configure(**settings)
+                # Cached audio is per voice, so the phrases are rendered again
+                with self._lock:
+                    self._warm.extend(self._warm_phrases)
+            except Exception as e:
+                print(f"Error applying voice settings: {e}")
+
+    def _render(self, sentence: str, key: str) -> Optional[str]:
+        rendered = self.cache.path(key) + ".tmp"
+        try:
+            self.driver.render(sentence, rendered)
+            return self.cache.add(key, rendered)
+        except Exception as e:
+            print(f"Error caching speech: {e}")
+            if os.path.exists(rendered):
+                os.remove(rendered)
+            return None
+
+    def _warm_one(self):
+        with self._lock:
+            sentence = self._warm.popleft()
+        key = self.cache.key(sentence, self.driver.settings)
+        if self.cache.get(key) is None:
+            self._render(sentence, key)
+
+    def _say(self, sentence: str):
+        """Play ``sentence`` from the cache if it is there or worth rendering, else speak it directly"""
+        if self.cache is not None:
+            key = self.cache.key(sentence, self.driver.settings)
+            path = self.cache.get(key)
+            if path is None and self.cache.wanted(key):
+                path = self._render(sentence, key)
+            if path is not None:
+                try:
+                    self.player.play(path)
+                    return
+                except Exception as e:
+                    print(f"Error playing cached speech: {e}")
+        self.driver.say(sentence)
+
+    def _speak(self, utterance: Utterance):
+        stream = self.get_stream() if self.get_stream else None
+        if stream is not None and stream.closed:
+            stream = None
+        self._current = utterance
+        self._onset = None
+        watching = threading.Event()
+        watcher = None
+        if self.barge_in and stream is not None:
+            watching.set()
+            watcher = threading.Thread(target=self._watch, args=(stream, utterance, watching),
+                                       name="tts-barge-in", daemon=True)
+            watcher.start()
+        self._notify(0, utterance.text)
+        for sentence in utterance.sentences:
+            if utterance.interrupted or self.driver is None:
+                break
+            try:
+                self._say(sentence)
+            except Exception as e:
+                print(f"Error in speech synthesis: {e}")
+                break
+        watching.clear()
+        if watcher is not None:
+            watcher.join()
+        self._current = None
+        if stream is not None:
+            if self._onset is not None:
+                # Let the next listen() start with what the user said over us
+                stream.position = self._onset
+            else:
+                stream.discard()
+        self._notify(1, utterance.text, utterance.interrupted)
+        utterance.done.set()
+
+    def _watch(self, stream, utterance: Utterance, watching: threading.Event):
+        """Stop playback once the user talks over it for ``barge_in_seconds``"""
+        needed = max(1, round(self.barge_in_seconds / stream.chunk_seconds))
+        position = stream.live_position
+        run = 0
+        while watching.is_set() and not stream.closed:
+            end, chunks = stream.read(position, timeout=0.1)
+            for offset, (frames, speech) in enumerate(chunks):
+                samples = np.frombuffer(frames, dtype=np.int16).astype(np.float32)
+                loud = (speech.any() and np.sqrt(np.mean(samples * samples))
+                        > stream.energy_threshold * self.barge_in_ratio)
+                run = run + 1 if loud else 0
+                if run >= needed:
+                    # A couple of chunks before the onset keep the start of the first word
+                    self._onset = max(end - len(chunks) + offset + 1 - run - 2, 0)
+                    self.interrupt()
+                    return
+            position = end
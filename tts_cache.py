@@ -0,0 +1,86 @@
+import collections
+import hashlib
+import os
+import threading
+from typing import Dict, Optional
+
+
+class AudioCache:
+    """Rendered speech on disk, addressed by a hash of the text and voice settings.
+
+    Files are evicted least recently used first once the directory grows
+    past ``max_bytes``; use order survives restarts through the files'
+    modification times. Sentences are only worth rendering once they
+    have come up ``min_uses`` times, so one-off answers are spoken
+    directly.
+    """
+
+    def __init__(self, directory: str = "tts_cache", max_bytes: int = 32 * 1024 * 1024,
+                 min_uses: int = 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_uses = min_uses
+        self._lock = threading.Lock()
+        self._uses: Dict[str, int] = collections.Counter()
+        self._entries = collections.OrderedDict()  # key -> size, least recently used first
+        self.hits = self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                # Left over from a render that didn't finish
+                os.remove(path)
+            elif name.endswith(".wav"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+
+    @staticmethod
+    def key(text: str, voice) -> str:
+        """Content address of ``text`` spoken with ``voice`` settings"""
+        return hashlib.sha1(f"{voice!r}\n{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".wav")
+
+    def get(self, key: str) -> Optional[str]:
+        """Path of the cached audio, marking it recently used"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        return path
+
+    def wanted(self, key: str) -> bool:
+        """Count a use of ``key``; True once it came up often enough to render"""
+        with self._lock:
+            self._uses[key] += 1
+            return self._uses[key] >= self.min_uses
+
+    def add(self, key: str, rendered: str) -> str:
+        """Move a freshly rendered file into the cache and evict to stay under ``max_bytes``"""
+        path = self.path(key)
+        os.replace(rendered, path)
+        with self._lock:
+            self._entries[key] = os.path.getsize(path)
+            self._entries.move_to_end(key)
+            total = sum(self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                oldest, size = self._entries.popitem(last=False)
+                total -= size
+                try:
+                    os.remove(self.path(oldest))
+                except OSError:
+                    pass
+        return path
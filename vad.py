@@ -0,0 +1,85 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """Frame-level speech detection from short-time energy and zero-crossing rate.
+
+    A frame is speech when its RMS energy is ``energy_ratio`` times above
+    the noise floor and its zero-crossing rate is below ``max_zcr``, as in
+    voiced sounds. Frames with hiss-like crossing rates (fricatives, fans,
+    static) only count when they are ``loud_ratio`` times louder still.
+    All frames of a block are classified in one vectorised pass.
+    """
+
+    def __init__(self, frame_size: int = 256, energy_ratio: float = 2.0, min_energy: float = 100,
+                 max_zcr: float = 0.25, loud_ratio: float = 3.0):
+        self.frame_size = frame_size
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr
+        self.loud_ratio = loud_ratio
+
+    def threshold(self, noise_floor: Optional[float]) -> float:
+        """RMS energy a frame needs to count as speech"""
+        if noise_floor is None:
+            return self.min_energy
+        return max(self.min_energy, noise_floor * self.energy_ratio)
+
+    def classify(self, samples: np.ndarray,
+                 noise_floor: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Speech flags and RMS energy for each whole frame of 16-bit ``samples``"""
+        count = len(samples) // self.frame_size
+        frames = samples[:count * self.frame_size].astype(np.float32).reshape(count, self.frame_size)
+        energy = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        threshold = self.threshold(noise_floor)
+        speech = (energy > threshold) & ((zcr < self.max_zcr) | (energy > threshold * self.loud_ratio))
+        return speech, energy
+
+
+class Endpointer:
+    """Turns per-frame VAD decisions into the start and end of one phrase.
+
+    The phrase starts after ``min_speech`` seconds of consecutive speech
+    frames (so clicks don't open it) and ends once ``end_silence``
+    seconds pass without speech. The phrase's audio keeps ``margin``
+    seconds of silence on both sides and drops the rest.
+    """
+
+    def __init__(self, frame_seconds: float, min_speech: float = 0.06, end_silence: float = 0.2,
+                 margin: float = 0.05):
+        self.frame_seconds = frame_seconds
+        self.min_speech_frames = max(1, round(min_speech / frame_seconds))
+        self.end_silence_frames = max(1, round(end_silence / frame_seconds))
+        self.margin_frames = round(margin / frame_seconds)
+        self.reset()
+
+    def reset(self):
+        self.frames = 0  # Frames pushed so far
+        self.start = None
+        self.last_speech = None
+        self._run = 0
+
+    @property
+    def started(self) -> bool:
+        return self.start is not None
+
+    @property
+    def lookback_frames(self) -> int:
+        """Frames before the current one that may still end up in the phrase"""
+        return self.min_speech_frames + self.margin_frames
+
+    def push(self, speech: bool) -> bool:
+        """Feed the next frame's decision; True once the phrase has ended"""
+        if speech:
+            self._run += 1
+            if self.start is None and self._run >= self.min_speech_frames:
+                self.start = max(self.frames + 1 - self._run - self.margin_frames, 0)
+            self.last_speech = self.frames
+        else:
+            self._run = 0
+        self.frames += 1
+        return self.start is not None and self.frames - 1 - self.last_speech >= self.end_silence_frames
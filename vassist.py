@@ -1,18 +1,25 @@
-import subprocess
 import speech_recognition as sr
 import datetime
-import wikipedia
 import webbrowser
-import pyttsx3
-import ollama
-from wikipedia.exceptions import DisambiguationError, PageError
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import os
 import time
-
-# Initialize text-to-speech engine
-engine = pyttsx3.init()
+import threading
+import atexit
+from audio_stream import AudioStream
+from wake_word import WakeWordDetector
+from recognizers import create_recognition_chain
+from tts import TTSWorker, split_sentences
+from tts_cache import AudioCache
+from llm_client import LLMClient
+from chat_context import ChatContext
+from response_cache import ResponseCache, context_digest
+from intents import Intent, IntentRegistry
+from mailer import Mailer, SMTPSession
+from wiki_client import WikipediaClient
+from email_dialog import ContactIndex, EmailDialog
+import skills
+from skills import SkillBusy, SkillExecutor
+import pipeline
 
 # Email configuration
 EMAIL_CONFIG = {
@@ -29,119 +36,210 @@ EMAIL_CONFIG = {
     }
 }
 
-def speak(audio):
-    """Text-to-speech output with fallback options"""
+# One microphone stream for the whole process, opened on first use
+_audio_stream = None
+_audio_stream_lock = threading.Lock()
+
+def get_audio_stream():
+    """Return the shared, already running microphone stream"""
+    global _audio_stream
+    with _audio_stream_lock:
+        if _audio_stream is None:
+            _audio_stream = AudioStream().start()
+        return _audio_stream
+
+def close_audio_stream():
+    """Release the microphone"""
+    global _audio_stream
+    with _audio_stream_lock:
+        if _audio_stream is not None:
+            _audio_stream.close()
+            _audio_stream = None
+
+# Speech recognition backends, tried in order ($VASSIST_RECOGNIZERS)
+_recognition = None
+_recognition_lock = threading.Lock()
+
+def get_recognizer():
+    """Return the shared speech recognition chain"""
+    global _recognition
+    with _recognition_lock:
+        if _recognition is None:
+            _recognition = create_recognition_chain()
+            # Keep the per-backend counters for the next run
+            atexit.register(_recognition.close)
+        return _recognition
+
+# Text-to-speech runs on its own thread; the user can talk over it (set VASSIST_BARGE_IN=0 to disable)
+_tts = None
+_tts_lock = threading.Lock()
+
+def get_tts():
+    """Return the shared speech worker, starting it on first use"""
+    global _tts
+    with _tts_lock:
+        if _tts is None:
+            _tts = TTSWorker(get_stream=lambda: _audio_stream,
+                             barge_in=os.environ.get("VASSIST_BARGE_IN", "1") != "0",
+                             cache=AudioCache())
+            atexit.register(_tts.close)
+        return _tts
+
+# The model is checked (and pulled if missing) once, then kept loaded between questions
+_llm = None
+_llm_lock = threading.Lock()
+
+def get_llm():
+    """Return the shared LLM session, preparing the model in the background on first use"""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = LLMClient().start()
+        return _llm
+
+# Answers to repeated questions; follow-ups and questions about the present always go out
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Return the shared answer cache, loading it from disk on first use"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+            atexit.register(_response_cache.close)
+        return _response_cache
+
+# Search-then-summary lookups with their own week-long cache
+_wiki = None
+_wiki_lock = threading.Lock()
+
+def get_wiki():
+    """Return the shared Wikipedia client, loading its cache on first use"""
+    global _wiki
+    with _wiki_lock:
+        if _wiki is None:
+            _wiki = WikipediaClient()
+            atexit.register(_wiki.cache.close)
+        return _wiki
+
+# Recent turns and a summary of older ones, sized to a fixed token budget
+_chat_context = None
+_chat_context_lock = threading.Lock()
+
+def get_chat_context():
+    """Return the shared conversation memory for the AI"""
+    global _chat_context
+    with _chat_context_lock:
+        if _chat_context is None:
+            from db_manager import db
+            _chat_context = ChatContext(db, get_llm())
+        return _chat_context
+
+# Said often enough to keep rendered, so they play without synthesis delay
+COMMON_PHRASES = [
+    "Good Morning!", "Good Afternoon!", "Good Evening!",
+    "I am your voice assistant. How can I help you?",
+    "How can I help you?",
+    "I didn't catch that. Can you repeat?",
+    "I didn't hear a command. Please try again.",
+    "I encountered an error processing your request.",
+    "I'm having trouble connecting to the speech recognition service.",
+    "Opening YouTube", "Opening Google",
+    "Okay, I stopped.", "Sorry, that is taking too long.",
+    "I'm still working on your last request. Say stop to cancel it.",
+    "Goodbye! Have a great day!",
+]
+
+def speak(audio, wait=True):
+    """Text-to-speech output; returns once it was spoken or the user interrupted it"""
+    # A cancelled skill stops at its next word
+    skills.check_cancelled()
     print(f"ASSISTANT: {audio}")
+    utterance = get_tts().say(audio)
+    if wait:
+        utterance.wait()
+    return utterance
+
+def take_command(timeout=5, is_complete=None):
+    """Listen for voice command and convert to text; ``is_complete`` lets short commands return early"""
+    recognizer = get_recognizer()
+    stream = get_audio_stream()
+    # speak() already moved the stream past our own prompt, or back to where the user interrupted it
+    print("Listening...")
+    
     try:
-        # Try macOS say command first
-        subprocess.run(["say", "-v", "Alex", audio], check=True)
-    except:
-        try:
-            # Fallback to pyttsx3
-            engine.say(audio)
-            engine.runAndWait()
-        except Exception as e:
-            print(f"Error in speech synthesis: {e}")
-
-def take_command(timeout=5):
-    """Listen for voice command and convert to text"""
-    recognizer = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("Listening...")
-        # Adjust for ambient noise
-        recognizer.adjust_for_ambient_noise(source, duration=1)
-        # Set energy threshold
-        recognizer.energy_threshold = 300
-        # Set dynamic energy threshold
-        recognizer.dynamic_energy_threshold = True
-        # Set pause threshold
-        recognizer.pause_threshold = 0.8
-        
-        try:
-            audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=10)
-            print("Processing...")
-            try:
-                text = recognizer.recognize_google(audio)
-                print(f"Recognized: {text}")
-                return text.lower()
-            except sr.UnknownValueError:
-                print("Could not understand audio")
-                return ""
-            except sr.RequestError as e:
-                print(f"Could not request results; {e}")
-                return ""
-        except sr.WaitTimeoutError:
-            print("No speech detected within timeout")
-            return ""
+        # Streaming backends show what they heard while the user is still speaking
+        text = pipeline.transcribe(stream, recognizer, timeout=timeout, is_complete=is_complete,
+                                   on_partial=lambda partial: print(f"... {partial}"))
+        print(f"Recognized: {text}")
+        return text.lower()
+    except sr.WaitTimeoutError:
+        print("No speech detected within timeout")
+        return ""
+    except sr.UnknownValueError:
+        print("Could not understand audio")
+        return ""
+    except sr.RequestError as e:
+        print(f"Could not request results; {e}")
+        return ""
+
+def on_email_result(message, error):
+    """Tell the user about an email that could not be sent"""
+    if error is None:
+        print(f"Email sent to {message['to']}")
+    else:
+        print(f"Email error: {error}")
+        speak(f"Sorry, I couldn't send your email about {message['subject']}.", wait=False)
+
+# Outgoing mail is queued on disk and sent over one kept-open SMTP connection
+_mailer = None
+_mailer_lock = threading.Lock()
+
+def get_mailer():
+    """Return the shared mail queue, starting its sender on first use"""
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer(SMTPSession(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port'],
+                                         EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password']),
+                             EMAIL_CONFIG['sender_email'], on_result=on_email_result).start()
+            atexit.register(_mailer.close)
+        return _mailer
 
 def send_email(recipient, subject, body):
-    """Send an email using configured settings"""
+    """Queue an email using configured settings; returns without waiting for the server"""
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_CONFIG['sender_email']
-        msg['To'] = recipient
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-        
-        with smtplib.SMTP(EMAIL_CONFIG['smtp_server'], EMAIL_CONFIG['smtp_port']) as server:
-            server.starttls()
-            server.login(EMAIL_CONFIG['sender_email'], EMAIL_CONFIG['sender_password'])
-            server.send_message(msg)
-        
+        get_mailer().send_email(recipient, subject, body)
         return True
     except Exception as e:
         print(f"Email error: {e}")
         return False
 
-def compose_email():
-    """Guide user through email composition process"""
-    # Get recipient
-    speak("Who would you like to email? Your contacts are: " + ", ".join(EMAIL_CONFIG['contacts'].keys()))
-    
-    recipient_name = "none"
-    while recipient_name == "none" or recipient_name not in EMAIL_CONFIG['contacts']:
-        recipient_name = take_command()
-        if recipient_name == "none":
-            speak("I didn't catch that. Please say a contact name.")
-        elif recipient_name not in EMAIL_CONFIG['contacts']:
-            speak(f"I don't have {recipient_name} in contacts. Please try again.")
-    
-    recipient_email = EMAIL_CONFIG['contacts'][recipient_name]
-    speak(f"Got it. Email for {recipient_name} is {recipient_email}.")
-
-    # Get subject
-    speak("What should the subject be?")
-    subject = take_command()
-    while subject == "none":
-        speak("I didn't catch the subject. Please try again.")
-        subject = take_command()
-
-    # Get body
-    speak("What would you like the email to say?")
-    body = take_command()
-    while body == "none":
-        speak("I didn't catch the message. Please try again.")
-        body = take_command()
-
-    # Confirm
-    speak(f"Ready to send to {recipient_name}. Subject: {subject}. Message: {body}. Say 'send' to confirm or 'cancel' to stop.")
-    confirmation = take_command()
-    
-    if "send" in confirmation or "yes" in confirmation:
-        if send_email(recipient_email, subject, body):
-            speak(f"Email sent successfully to {recipient_name}!")
+# Spoken forms of the contact names, for matching what the recognizer heard
+contact_index = ContactIndex(EMAIL_CONFIG['contacts'])
+
+def ask(question, timeout=8):
+    """Say ``question`` and return the reply, "" if nothing was understood"""
+    speak(question)
+    return take_command(timeout=timeout)
+
+def compose_email(command=""):
+    """Guide user through email composition, asking only for what ``command`` didn't already say"""
+    email = EmailDialog(contact_index, ask, speak).run(command)
+    if email is not None:
+        if send_email(email['to'], email['subject'], email['body']):
+            speak(f"Your email to {email['name']} is on its way!")
         else:
             speak("Sorry, I couldn't send the email.")
-    else:
-        speak("Email cancelled.")
     
     speak("Say 'Hey Assistant' if you need anything else.")
 
-def open_website(url):
+def open_website(url, name=None):
     """Open a website in the default web browser"""
     try:
         webbrowser.open(url)
-        speak(f"Opening {url}")
+        speak(f"Opening {name or url}")
         return True
     except Exception as e:
         speak(f"Sorry, I couldn't open {url}. Error: {str(e)}")
@@ -152,19 +250,20 @@ def search_wikipedia(query):
     try:
         # Remove 'wikipedia' from the query
         query = query.replace('wikipedia', '').strip()
+        if not query:
+            speak("What should I look up on Wikipedia?")
+            return
         
-        # Search Wikipedia
-        results = wikipedia.summary(query, sentences=2)
-        speak(f"According to Wikipedia: {results}")
+        # Ambiguous topics resolve to the best candidate; repeats come from the cache
+        article = get_wiki().lookup(query)
+        if article is None:
+            speak(f"Sorry, I couldn't find any information about {query} on Wikipedia.")
+            return
+        speak(f"According to Wikipedia: {' '.join(split_sentences(article.summary)[:2])}")
         
         # Open Wikipedia page
-        wikipedia_url = f"https://en.wikipedia.org/wiki/{query.replace(' ', '_')}"
-        open_website(wikipedia_url)
+        open_website(article.url, f"the Wikipedia page for {article.title}")
         
-    except DisambiguationError as e:
-        speak(f"There are multiple results for {query}. Please be more specific.")
-    except PageError:
-        speak(f"Sorry, I couldn't find any information about {query} on Wikipedia.")
     except Exception as e:
         speak(f"Sorry, I encountered an error while searching Wikipedia: {str(e)}")
 
@@ -190,74 +289,251 @@ def wish_me():
     except Exception as e:
         speak("Hello! I am your voice assistant. How can I help you?")
 
-def chat_with_ai(query):
-    """Chat with AI using Ollama"""
+def chat_with_ai(query, speak_response=False, conversation_id=None):
+    """Chat with AI using Ollama and return the answer.
+
+    Nothing is spoken by default. With ``speak_response=True``, as the
+    general intent passes, each sentence is spoken as soon as it is
+    generated.
+
+    Earlier turns of ``conversation_id`` are sent along, so follow-up questions work.
+    """
     try:
-        # First try to pull the model if it doesn't exist
+        messages = get_chat_context().messages(query, conversation_id)
+    except Exception as e:
+        print(f"AI error: {e}")
+        response = "I'm having trouble connecting to the AI service right now."
+        if speak_response:
+            speak(response)
+        return response
+    # The same question can have another answer after other turns
+    context = context_digest(messages[:-1])
+    cached = get_response_cache().get('llm', query, context)
+    if cached is not None:
+        if speak_response:
+            speak(cached)
+        return cached
+    
+    spoken = []
+    cut_short = False
+    
+    def on_sentence(sentence):
+        nonlocal cut_short
+        if skills.cancelled() or (spoken and spoken[-1].interrupted):
+            cut_short = True
+            return False  # The user talked over the answer, said stop or the skill timed out
+        if speak_response:
+            spoken.append(speak(sentence, wait=False))
+    
+    try:
+        response = get_llm().chat(messages, on_sentence=on_sentence)
+    except Exception as e:
+        print(f"AI error: {e}")
+        response = "I'm having trouble connecting to the AI service right now."
+        if speak_response:
+            speak(response)
+        return response
+    if spoken:
+        spoken[-1].wait()
+    if cut_short or skills.cancelled() or any(utterance.interrupted for utterance in spoken):
+        # Only part of the answer, so not worth keeping
+        return response
+    get_response_cache().put('llm', query, response, context)
+    return response
+
+# Words around the topic in "search wikipedia for alan turing", "what does wikipedia say about ..."
+WIKIPEDIA_FILLER = {"search", "look", "up", "for", "about", "tell", "me", "please", "find", "what",
+                    "who", "is", "does", "say", "says", "according", "to", "on", "from", "in"}
+
+def wikipedia_topic(match):
+    """The topic of a Wikipedia command, without the words around it"""
+    words = " ".join(part for part in (match.slots.get('before'), match.slots.get('after')) if part).split()
+    while words and words[0] in WIKIPEDIA_FILLER:
+        words.pop(0)
+    while words and words[-1] in WIKIPEDIA_FILLER:
+        words.pop()
+    return " ".join(words)
+
+def on_skill_cancelled(task):
+    """Silence a cancelled skill, and apologize if it ran out of time"""
+    get_tts().interrupt()
+    if task.reason == "timed out":
+        speak("Sorry, that is taking too long.", wait=False)
+
+# Skills run on worker threads, so the listener can still hear "stop" during a long answer
+_skills_executor = None
+_skills_executor_lock = threading.Lock()
+
+def get_skills_executor():
+    """Return the shared skill workers, starting them on first use"""
+    global _skills_executor
+    with _skills_executor_lock:
+        if _skills_executor is None:
+            _skills_executor = SkillExecutor(max_workers=4,
+                                             timeouts={'general': 90, 'wikipedia': 20, 'youtube': 10,
+                                                       'google': 10, 'time': 10, 'time_word': 10},
+                                             limits={'wikipedia': 2},
+                                             on_cancel=on_skill_cancelled)
+            atexit.register(_skills_executor.close)
+        return _skills_executor
+
+def stop_skills(match=None, **context):
+    """Cancel whatever the assistant is busy with"""
+    if get_skills_executor().cancel_all():
+        speak("Okay, I stopped.")
+    else:
+        get_tts().interrupt()
+
+def run_skill(match, on_done=None, **context):
+    """Carry out a command in the background, or right away for skills that talk with the user.
+
+    ``on_done(match, error)`` is called once it has finished; ``error`` is
+    None on success.
+    """
+    if not match.intent.background:
+        error = None
         try:
-            ollama.pull('llama2')
+            match.run(**context)
         except Exception as e:
-            print(f"Warning: Could not pull llama2 model: {e}")
-            return "I'm having trouble connecting to the AI service. Please try again later."
-
-        # Try to get a response
-        response = ollama.chat(model='llama2', messages=[
-            {
-                'role': 'user',
-                'content': query
-            }
-        ])
-        return response['message']['content']
+            error = str(e)
+            speak("I encountered an error processing your request.")
+        if on_done is not None:
+            on_done(match, error)
+        return
+    
+    def finished(task):
+        if task.error and not task.reason:
+            speak("I encountered an error processing your request.", wait=False)
+        if on_done is not None:
+            on_done(match, task.error)
+    
+    try:
+        get_skills_executor().submit(match, on_done=finished, **context)
+    except SkillBusy:
+        speak("I'm still working on your last request. Say stop to cancel it.")
+        if on_done is not None:
+            on_done(match, "busy")
+
+def is_stop_request(recognizer, audio):
+    """True if ``audio`` says "stop" or "cancel"; only worth asking while skills are running"""
+    match = intents.match(recognizer.recognize(audio))
+    return match is not None and match.intent.name == "stop"
+
+# What the assistant can do; both the CLI and the GUI route commands through this
+intents = IntentRegistry([
+    Intent("exit", ["exit", "quit", "goodbye", "bye"],
+           lambda match, **context: speak("Goodbye! Have a great day!"),
+           priority=100, complete=True, background=False),
+    Intent("stop", ["stop", "cancel", "stop it", "stop that", "cancel it", "cancel that", "never mind",
+                    "nevermind", "be quiet", "please stop"],
+           stop_skills, priority=90, complete=True, whole=True, background=False),
+    Intent("email", ["email", "e mail", "send email", "compose email", "send an email", "write an email"],
+           lambda match, **context: compose_email(match.command), priority=80, background=False),
+    Intent("wikipedia", ["{before} wikipedia {after}"],
+           lambda match, **context: search_wikipedia(wikipedia_topic(match)), priority=70),
+    Intent("youtube", ["open youtube"],
+           lambda match, **context: open_website("https://www.youtube.com", "YouTube"),
+           priority=60, complete=True),
+    Intent("google", ["open google"],
+           lambda match, **context: open_website("https://www.google.com", "Google"),
+           command_type="general", priority=60, complete=True),
+    Intent("time", ["what time is it", "time is it", "whats the time", "what is the time",
+                    "tell me the time", "current time", "time now"],
+           lambda match, **context: get_time(), priority=50, complete=True),
+    # Any other mention of "time", as before the registry; not complete, since "time" may be
+    # the start of "time zone in tokyo"
+    Intent("time_word", ["time"], lambda match, **context: get_time(), command_type="time", priority=50),
+], default=Intent("general", [],
+                  lambda match, conversation_id=None, **context: chat_with_ai(
+                      match.command, speak_response=True, conversation_id=conversation_id)))
+
+def get_wake_word():
+    """The wake word from the user's preferences"""
+    try:
+        from db_manager import db
+        return (db.get_user_preference("wake_word") or "hey assistant").lower()
     except Exception as e:
-        print(f"AI error: {e}")
-        return "I'm having trouble connecting to the AI service right now."
+        print(f"Could not read the wake word preference: {e}")
+        return "hey assistant"
 
 def run_assistant():
     """Main assistant control loop"""
-    recognizer = sr.Recognizer()
+    recognizer = get_recognizer()
+    stream = get_audio_stream()
+    # Spotted on the device; the recognizer only confirms it until a few examples are recorded
+    wake_word = get_wake_word().strip()
+    detector = WakeWordDetector(wake_word, confirm=recognizer.recognize)
     
-    while True:
-        try:
-            with sr.Microphone() as source:
-                print("\nWaiting for 'Hey Assistant'...")
-                audio = recognizer.listen(source, phrase_time_limit=5)
-                query = recognizer.recognize_google(audio).lower()
+    def on_wake_word(key, value):
+        # Called on whichever thread saved it; the loop below applies it
+        nonlocal wake_word
+        wake_word = value.lower().strip()
+    
+    # The session is logged, so the AI can follow up on earlier questions
+    unsubscribe_wake_word = None
+    try:
+        from db_manager import db
+        unsubscribe_wake_word = db.subscribe_preferences(on_wake_word, keys=["wake_word"])
+        conversation_id = db.start_conversation()
+        log_replies = get_tts().subscribe(
+            on_start=lambda text: db.log_message("ASSISTANT", text, conversation_id))
+    except Exception as e:
+        print(f"Conversation history is not available: {e}")
+        conversation_id = log_replies = None
+    
+    def log_command(match, error):
+        if conversation_id is not None:
+            db.log_command(match.intent.command_type, match.command, error is None, error)
+    
+    try:
+        while True:
+            try:
+                if detector.wake_word != wake_word:
+                    detector.set_wake_word(wake_word)
+                print(f"\nWaiting for '{detector.wake_word}'...")
+                audio = stream.listen(max_seconds=5)
                 
-                if "hey assistant" in query:
+                if detector.detect(audio):
                     speak("How can I help you?")
-                    command = take_command(timeout=8)
-                    
-                    if command == "none":
+                    command = take_command(timeout=8, is_complete=intents.is_complete)
+                    match = intents.match(command)
+                    if match is None:
                         continue
-                    elif "send email" in command or "compose email" in command:
-                        compose_email()
-                    elif "wikipedia" in command:
-                        search_wikipedia(command)
-                    elif "open youtube" in command:
-                        webbrowser.open("youtube.com")
-                        speak("Opening YouTube")
-                    elif "open google" in command:
-                        webbrowser.open("google.com")
-                        speak("Opening Google")
-                    elif "time" in command:
-                        get_time()
-                    elif "exit" in command or "quit" in command:
-                        speak("Goodbye! Have a great day!")
+                    if conversation_id is not None:
+                        db.log_message("USER", command, conversation_id)
+                    
+                    run_skill(match, on_done=log_command, conversation_id=conversation_id)
+                    if match.intent.name == "exit":
                         return  # Exit the function
-                    else:
-                        response = chat_with_ai(command)
-                        speak(response)
+                elif get_skills_executor().running() and is_stop_request(recognizer, audio):
+                    # No wake word needed to stop a skill that is still going
+                    stop_skills()
                         
-        except sr.WaitTimeoutError:
-            continue
-        except sr.UnknownValueError:
-            continue
-        except Exception as e:
-            print(f"Error: {e}")
-            time.sleep(1)
+            except sr.WaitTimeoutError:
+                continue
+            except sr.UnknownValueError:
+                continue
+            except Exception as e:
+                print(f"Error: {e}")
+                time.sleep(1)
+    finally:
+        get_skills_executor().cancel_all()
+        if unsubscribe_wake_word is not None:
+            unsubscribe_wake_word()
+        if conversation_id is not None:
+            get_tts().unsubscribe(log_replies)
+            db.end_conversation(conversation_id)
+
+def start_services():
+    """Get the slow parts going in the background before the first command needs them"""
+    get_llm()
+    # Sends whatever was still in the outbox at the last exit
+    get_mailer()
+    get_tts().prewarm(COMMON_PHRASES)
 
 def main():
     """Program entry point"""
+    start_services()
     wish_me()
     run_assistant()  # Start the main loop
 
@@ -8,7 +8,7 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QHBoxLayout, QPushButton, QLabel, QTextEdit, 
                             QFrame, QScrollArea, QTabWidget, QTableWidget,
                             QTableWidgetItem, QHeaderView, QComboBox, QMessageBox,
-                            QLineEdit, QFormLayout)
+                            QLineEdit, QFormLayout, QTableView, QAbstractItemView)
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QObject
 from PyQt5.QtGui import QFont, QColor, QPalette, QIcon, QPainter
 from PyQt5.QtChart import QChart, QChartView, QPieSeries, QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis
@@ -16,12 +16,22 @@ from PyQt5.QtChart import QChart, QChartView, QPieSeries, QBarSeries, QBarSet, Q
 # Import the voice assistant module and database manager
 import vassist
 from db_manager import db 
+from history_model import HistoryTableModel
+from write_behind import WriteBehindQueue
+from retention import Compactor
+from wake_word import WakeWordDetector
+import pipeline
 
 class WorkerSignals(QObject):
     """Defines the signals available from the worker thread."""
     conversation = pyqtSignal(str, str)
+    shown = pyqtSignal(str, str)  # Like conversation, for messages the worker already logged
     status = pyqtSignal(str, str)
     error = pyqtSignal(str)  # New signal for error messages
+    partial = pyqtSignal(str)  # What the user has said so far, "" when done
+    skill_done = pyqtSignal(str, str, str)  # Command type, command, error ("" on success)
+    finished = pyqtSignal()  # The worker is leaving; the GUI thread stops the assistant
+    wake_word = pyqtSignal(str)  # The wake word preference changed, possibly on another thread
 
     # Added __init__ to properly initialize the QObject base class
     def __init__(self):
@@ -51,6 +61,10 @@ class VoiceAssistantGUI(QMainWindow):
         try:
             self.conversation_id = db.start_conversation()
             self.db_connected = True
+            # Logging goes through a background writer so disk I/O never blocks the UI
+            self.db_writer = WriteBehindQueue(db)
+            # Old history moves to compressed archives in the background
+            self.compactor = Compactor(db).start()
         except Exception as e:
             self.signals.error.emit(f"Database connection failed: {str(e)}")
             self.db_connected = False
@@ -60,8 +74,13 @@ class VoiceAssistantGUI(QMainWindow):
         
         # Connect signals
         self.signals.conversation.connect(self.update_conversation)
+        self.signals.shown.connect(self.show_message)
         self.signals.status.connect(self.update_status)
         self.signals.error.connect(self.show_error)
+        self.signals.partial.connect(self.update_partial)
+        self.signals.skill_done.connect(self.on_skill_done)
+        self.signals.finished.connect(self.stop_assistant)
+        self.signals.wake_word.connect(self.update_wake_word_label)
         
         # Load user preferences
         self.load_preferences()
@@ -128,6 +147,12 @@ class VoiceAssistantGUI(QMainWindow):
         self.conversation_display.setFont(QFont("Arial", 10))
         conversation_layout.addWidget(self.conversation_display)
         
+        # Live transcript of the command being spoken
+        self.partial_label = QLabel("")
+        self.partial_label.setFont(QFont("Arial", 10, QFont.StyleItalic))
+        self.partial_label.setStyleSheet("color: #0066cc;")
+        conversation_layout.addWidget(self.partial_label)
+        
         layout.addWidget(conversation_frame)
         
         # Control buttons
@@ -156,12 +181,12 @@ class VoiceAssistantGUI(QMainWindow):
         
         layout.addWidget(control_frame)
         
-        # Wake word info
-        wake_word_label = QLabel("Wake Word: 'Hey Assistant'")
-        wake_word_label.setFont(QFont("Arial", 10, QFont.StyleItalic))
-        wake_word_label.setAlignment(Qt.AlignCenter)
-        wake_word_label.setStyleSheet("color: #666666;")
-        layout.addWidget(wake_word_label)
+        # Wake word info (text set from the preference in load_preferences)
+        self.wake_word_label = QLabel()
+        self.wake_word_label.setFont(QFont("Arial", 10, QFont.StyleItalic))
+        self.wake_word_label.setAlignment(Qt.AlignCenter)
+        self.wake_word_label.setStyleSheet("color: #666666;")
+        layout.addWidget(self.wake_word_label)
         
         # Add tab
         self.tab_widget.addTab(assistant_tab, "Assistant")
@@ -178,11 +203,30 @@ class VoiceAssistantGUI(QMainWindow):
         title_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(title_label)
         
-        # History table
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(3)
-        self.history_table.setHorizontalHeaderLabels(["Time", "Speaker", "Message"])
+        # Speaker filter
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Speaker:"))
+        self.speaker_filter_combo = QComboBox()
+        self.speaker_filter_combo.addItems(["All", "USER", "ASSISTANT", "SYSTEM"])
+        self.speaker_filter_combo.currentIndexChanged.connect(self.search_history)
+        filter_layout.addWidget(self.speaker_filter_combo)
+        
+        # Full-text search ("quoted phrases" supported)
+        self.history_search_edit = QLineEdit()
+        self.history_search_edit.setPlaceholderText('Search history, e.g. "alan turing"')
+        self.history_search_edit.returnPressed.connect(self.search_history)
+        filter_layout.addWidget(self.history_search_edit, stretch=1)
+        search_button = QPushButton("Search")
+        search_button.clicked.connect(self.search_history)
+        filter_layout.addWidget(search_button)
+        layout.addLayout(filter_layout)
+        
+        # History table, filled page by page as the user scrolls
+        self.history_model = HistoryTableModel(db)
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
         self.history_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.history_table.verticalScrollBar().valueChanged.connect(self.history_scrolled)
         layout.addWidget(self.history_table)
         
         # Refresh button
@@ -212,7 +256,7 @@ class VoiceAssistantGUI(QMainWindow):
         period_layout = QHBoxLayout()
         period_label = QLabel("Time Period:")
         self.period_combo = QComboBox()
-        self.period_combo.addItems(["Last 7 days", "Last 30 days", "All time"])
+        self.period_combo.addItems(["Last 7 days", "Last 30 days", "Last 90 days", "Last 365 days", "All time"])
         self.period_combo.currentIndexChanged.connect(self.update_statistics)
         period_layout.addWidget(period_label)
         period_layout.addWidget(self.period_combo)
@@ -295,6 +339,11 @@ class VoiceAssistantGUI(QMainWindow):
     
     def update_conversation(self, speaker, text):
         """Add a message to the conversation display and log to database"""
+        self.show_message(speaker, text)
+        self.log_message(speaker, text)
+    
+    def show_message(self, speaker, text):
+        """Add a message to the conversation display"""
         # Update the conversation display
         self.conversation_display.moveCursor(self.conversation_display.textCursor().End)
         
@@ -312,16 +361,26 @@ class VoiceAssistantGUI(QMainWindow):
         self.conversation_display.verticalScrollBar().setValue(
             self.conversation_display.verticalScrollBar().maximum()
         )
-        
-        # Log to database
-        if self.conversation_id:
-            db.log_message(speaker, text, self.conversation_id)
     
     def update_status(self, status, color="gray"):
         """Update the status display"""
         self.status_label.setText(f"Status: {status}")
         self.status_indicator.setStyleSheet(f"color: {color};")
     
+    def update_partial(self, text):
+        """Show the partial transcript of the command being spoken"""
+        self.partial_label.setText(f"You: {text}..." if text else "")
+    
+    def update_wake_word_label(self, wake_word):
+        """Show the wake word the assistant is listening for"""
+        self.wake_word_label.setText(f"Wake Word: '{wake_word}'")
+    
+    def on_skill_done(self, command_type, command, error):
+        """Log a finished command and report why it failed, if it did"""
+        self.log_command(command_type, command, not error, error or None)
+        if error:
+            self.signals.conversation.emit("SYSTEM", f"{command}: {error}")
+    
     def start_assistant(self):
         """Start the voice assistant in a separate thread"""
         if not self.is_running:
@@ -345,8 +404,10 @@ class VoiceAssistantGUI(QMainWindow):
             self.signals.status.emit("Stopping...", "orange")
             self.signals.conversation.emit("SYSTEM", "Stopping assistant...")
             
-            # Signal the thread to stop
+            # Signal the thread to stop, cutting off anything still being said
             self.should_stop.set()
+            vassist.get_skills_executor().cancel_all()
+            vassist.get_tts().interrupt()
             
             # Wait for the thread to finish
             if self.assistant_thread and self.assistant_thread.is_alive():
@@ -363,6 +424,7 @@ class VoiceAssistantGUI(QMainWindow):
             # End the conversation in the database if connected
             if self.db_connected and self.conversation_id:
                 try:
+                    self.db_writer.flush(timeout=2)
                     db.end_conversation(self.conversation_id)
                     # Start a new conversation for next time
                     self.conversation_id = db.start_conversation()
@@ -375,32 +437,34 @@ class VoiceAssistantGUI(QMainWindow):
         # End the conversation in the database if connected
         if self.db_connected and self.conversation_id:
             try:
+                self.compactor.stop()
+                self.db_writer.close()
                 db.end_conversation(self.conversation_id)
             except Exception as e:
                 self.signals.error.emit(f"Database error: {str(e)}")
+            finally:
+                # Signals still queued from the worker must not write to the closed queue
+                self.db_connected = False
+        vassist.close_audio_stream()
         event.accept()
     
     def run_assistant(self):
         """Run the voice assistant"""
-        # Initialize recognizer with adjusted settings
-        recognizer = sr.Recognizer()
-        recognizer.energy_threshold = 300
-        recognizer.dynamic_energy_threshold = True
-        recognizer.pause_threshold = 0.8
-        
-        # Override vassist's speak function to update the GUI
-        original_speak = vassist.speak
-        
-        def gui_speak(text):
-            """Override speak function to update GUI"""
-            self.signals.conversation.emit("ASSISTANT", text)
-            self.signals.status.emit("Speaking", "green")
-            original_speak(text)
-            if not self.should_stop.is_set():
-                self.signals.status.emit("Listening", "blue")
-        
-        # Replace the speak function
-        vassist.speak = gui_speak
+        recognizer = vassist.get_recognizer()
+        # The microphone stays open between iterations and tracks the noise level itself
+        try:
+            stream = vassist.get_audio_stream()
+        except Exception as e:
+            self.signals.error.emit(f"Microphone error: {str(e)}")
+            self.signals.finished.emit()
+            return
+        # The wake word is spotted on the device; the recognizer only confirms it
+        # until a few examples have been recorded
+        detector = WakeWordDetector(self.wake_word, confirm=recognizer.recognize)
+        
+        # Show everything the assistant says, as it starts saying it
+        speech_callbacks = vassist.get_tts().subscribe(on_start=self.on_speech_start,
+                                                       on_end=self.on_speech_end)
         
         # Greet the user
         self.signals.conversation.emit("SYSTEM", "Assistant is ready!")
@@ -412,81 +476,57 @@ class VoiceAssistantGUI(QMainWindow):
         while not self.should_stop.is_set():
             try:
                 # Listen for wake word
-                with sr.Microphone() as source:
-                    recognizer.adjust_for_ambient_noise(source, duration=1)
-                    self.signals.status.emit("Listening for wake word", "blue")
-                    try:
-                        audio = recognizer.listen(source, timeout=1, phrase_time_limit=3)
-                    except sr.WaitTimeoutError:
-                        continue
+                self.signals.status.emit("Listening for wake word", "blue")
+                try:
+                    audio = stream.listen(timeout=1, max_seconds=5)
+                except sr.WaitTimeoutError:
+                    continue
                 
                 try:
-                    # Try to recognize the wake word
-                    text = recognizer.recognize_google(audio).lower()
+                    # Follow wake word changes made in the settings tab
+                    if detector.wake_word != self.wake_word:
+                        detector.set_wake_word(self.wake_word)
                     
-                    if self.wake_word in text:
+                    if detector.detect(audio):
                         self.signals.conversation.emit("USER", self.wake_word)
                         self.signals.status.emit("Active", "green")
                         vassist.speak("How can I help you?")
                         
-                        # Listen for command
-                        with sr.Microphone() as cmd_source:
-                            recognizer.adjust_for_ambient_noise(cmd_source)
-                            self.signals.status.emit("Listening for command", "blue")
-                            try:
-                                cmd_audio = recognizer.listen(cmd_source, timeout=5, phrase_time_limit=10)
-                            except sr.WaitTimeoutError:
-                                vassist.speak("I didn't hear a command. Please try again.")
-                                continue
-                        
+                        # speak() leaves the stream after our prompt, or where the user talked over it
+                        self.signals.status.emit("Listening for command", "blue")
                         try:
-                            # Try to recognize the command
-                            command = recognizer.recognize_google(cmd_audio).lower()
-                            self.signals.conversation.emit("USER", command)
+                            # Recognized while it is spoken; short commands may finish early
+                            command = pipeline.transcribe(stream, recognizer, timeout=5,
+                                                          on_partial=self.signals.partial.emit,
+                                                          is_complete=vassist.intents.is_complete).lower()
+                            self.signals.partial.emit("")
+                            # Queued from here, so the flush below covers it
+                            self.log_message("USER", command)
+                            self.signals.shown.emit("USER", command)
                             
                             # Process the command
                             self.signals.status.emit("Processing", "orange")
+                            match = vassist.intents.match(command)
+                            if match is None:
+                                continue
+                            if match.intent.name == "general" and self.db_connected:
+                                # The AI reads this conversation as context, so it must be saved first
+                                self.db_writer.flush(timeout=1)
                             
-                            # Log the command if database is connected
-                            if self.db_connected:
-                                try:
-                                    command_type = "general"
-                                    if 'wikipedia' in command:
-                                        command_type = "wikipedia"
-                                    elif 'youtube' in command:
-                                        command_type = "youtube"
-                                    elif 'time' in command:
-                                        command_type = "time"
-                                    elif 'email' in command:
-                                        command_type = "email"
-                                    db.log_command(command_type, command)
-                                except Exception as e:
-                                    self.signals.error.emit(f"Database logging error: {str(e)}")
-                            
-                            # Handle different commands
-                            try:
-                                if any(word in command for word in ['exit', 'goodbye', 'quit', 'bye']):
-                                    vassist.speak("Goodbye! Have a great day!")
-                                    self.stop_assistant()
-                                    return
-                                elif 'wikipedia' in command:
-                                    vassist.search_wikipedia(command)
-                                elif 'open youtube' in command:
-                                    vassist.open_website("https://www.youtube.com")
-                                elif 'open google' in command:
-                                    vassist.open_website("https://www.google.com")
-                                elif 'time' in command:
-                                    vassist.get_time()
-                                elif 'email' in command:
-                                    vassist.compose_email()
-                                else:
-                                    # Use AI for general queries
-                                    response = vassist.chat_with_ai(command)
-                                    vassist.speak(response)
-                            except Exception as cmd_error:
-                                vassist.speak("I encountered an error processing your request.")
-                                self.signals.conversation.emit("SYSTEM", f"Error: {str(cmd_error)}")
+                            # Long skills run in the background and report back through skill_done
+                            vassist.run_skill(match, conversation_id=self.conversation_id,
+                                              on_done=lambda match, error: self.signals.skill_done.emit(
+                                                  match.intent.command_type, match.command, error or ""))
+                            if match.intent.name == "exit":
+                                # Let the goodbye play out; stopping interrupts whatever is still queued
+                                deadline = time.monotonic() + 10
+                                while vassist.get_tts().speaking and time.monotonic() < deadline:
+                                    time.sleep(0.05)
+                                self.signals.finished.emit()
+                                break
                             
+                        except sr.WaitTimeoutError:
+                            vassist.speak("I didn't hear a command. Please try again.")
                         except sr.UnknownValueError:
                             vassist.speak("I didn't catch that. Can you repeat?")
                         except sr.RequestError:
@@ -494,6 +534,12 @@ class VoiceAssistantGUI(QMainWindow):
                         except Exception as e:
                             vassist.speak("I encountered an error processing your request.")
                             self.signals.conversation.emit("SYSTEM", f"Error: {str(e)}")
+                        finally:
+                            self.signals.partial.emit("")
+                    elif vassist.get_skills_executor().running() and vassist.is_stop_request(recognizer, audio):
+                        # No wake word needed to stop a skill that is still going
+                        self.signals.conversation.emit("USER", "stop")
+                        vassist.stop_skills()
                 
                 except sr.UnknownValueError:
                     # No wake word detected, continue listening
@@ -506,8 +552,37 @@ class VoiceAssistantGUI(QMainWindow):
                 self.signals.conversation.emit("SYSTEM", f"Error: {str(e)}")
                 time.sleep(1)
         
-        # Restore original speak function
-        vassist.speak = original_speak
+        vassist.get_tts().unsubscribe(speech_callbacks)
+    
+    def on_speech_start(self, text):
+        """Called by the speech worker when it starts saying ``text``"""
+        self.signals.conversation.emit("ASSISTANT", text)
+        self.signals.status.emit("Speaking", "green")
+    
+    def on_speech_end(self, text, interrupted):
+        """Called by the speech worker when it finished or was talked over"""
+        if interrupted:
+            self.signals.conversation.emit("SYSTEM", "(interrupted)")
+        if not self.should_stop.is_set():
+            self.signals.status.emit("Listening", "blue")
+    
+    def log_message(self, speaker, text):
+        """Log a conversation message if the database is connected; safe from any thread"""
+        if not (self.db_connected and self.conversation_id):
+            return
+        try:
+            self.db_writer.log_message(speaker, text, self.conversation_id)
+        except Exception as e:
+            self.signals.error.emit(f"Database logging error: {str(e)}")
+    
+    def log_command(self, command_type, command, success=True, error=None):
+        """Log a command execution if the database is connected"""
+        if not self.db_connected:
+            return
+        try:
+            self.db_writer.log_command(command_type, command, success, error)
+        except Exception as e:
+            self.signals.error.emit(f"Database logging error: {str(e)}")
     
     def load_conversation_history(self):
         """Load conversation history from database"""
@@ -516,36 +591,40 @@ class VoiceAssistantGUI(QMainWindow):
             return
             
         try:
-            history = db.get_conversation_history(limit=50)
-            
-            # Clear the table
-            self.history_table.setRowCount(0)
-            
-            # Add rows to the table
-            for i, message in enumerate(history):
-                self.history_table.insertRow(i)
-                
-                # Format timestamp (handle both string and datetime objects)
-                try:
-                    timestamp = message['timestamp']
-                    if isinstance(timestamp, str):
-                        # If it's a string, just use it as is
-                        formatted_time = timestamp
-                    else:
-                        # If it's a datetime object, format it
-                        formatted_time = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                except Exception as e:
-                    formatted_time = "Unknown time"
-                    print(f"Error formatting timestamp: {e}")
-                
-                # Add items to the row
-                self.history_table.setItem(i, 0, QTableWidgetItem(formatted_time))
-                self.history_table.setItem(i, 1, QTableWidgetItem(message['speaker']))
-                self.history_table.setItem(i, 2, QTableWidgetItem(message['message_text']))
+            # Make sure queued messages are included
+            self.db_writer.flush(timeout=1)
+            speaker = self.speaker_filter_combo.currentText()
+            self.history_model.set_filters(speaker=None if speaker == "All" else speaker)
         except Exception as e:
             self.signals.error.emit(f"Error loading history: {str(e)}")
             print(f"Detailed error: {e}")  # Add detailed error logging
     
+    def history_scrolled(self, value):
+        """Read back pages the history model dropped once the view reaches its top"""
+        if value == self.history_table.verticalScrollBar().minimum() and self.history_model.canFetchPrevious():
+            added = self.history_model.fetchPrevious()
+            if added:
+                # Keep the row that was at the top in view
+                self.history_table.scrollTo(self.history_model.index(added, 0), QAbstractItemView.PositionAtTop)
+    
+    def search_history(self):
+        """Show full-text search results in the history table"""
+        query = self.history_search_edit.text().strip()
+        if not query:
+            self.load_conversation_history()
+            return
+        if not self.db_connected:
+            self.signals.error.emit("Cannot search history: Database not connected")
+            return
+        
+        try:
+            self.db_writer.flush(timeout=1)
+            speaker = self.speaker_filter_combo.currentText()
+            results = db.search_messages(query, limit=200, speaker=None if speaker == "All" else speaker)
+            self.history_model.show_results(results)
+        except Exception as e:
+            self.signals.error.emit(f"Error searching history: {str(e)}")
+    
     def update_statistics(self):
         """Update statistics charts and table"""
         if not self.db_connected:
@@ -555,9 +634,10 @@ class VoiceAssistantGUI(QMainWindow):
         try:
             # Determine time period
             period_index = self.period_combo.currentIndex()
-            days = [7, 30, 90, 365][period_index]
+            days = [7, 30, 90, 365, None][period_index]
             
-            # Get statistics
+            # Get statistics, including any commands still queued
+            self.db_writer.flush(timeout=1)
             stats = db.get_command_statistics(days=days)
             
             # Update charts and table
@@ -645,13 +725,18 @@ class VoiceAssistantGUI(QMainWindow):
     
     def load_preferences(self):
         """Load user preferences from database or use defaults"""
+        wake_word = "Hey Assistant"
         if self.db_connected:
             try:
-                self.wake_word = db.get_user_preference("wake_word", "Hey Assistant").lower()
-            except:
-                self.wake_word = "Hey Assistant"
-        else:
-            self.wake_word = "Hey Assistant"
+                wake_word = db.get_user_preference("wake_word") or wake_word
+                # Pick up changes without re-reading preferences per utterance
+                db.subscribe_preferences(self.on_preference_changed,
+                                         keys=["wake_word", "voice_speed", "voice_gender"])
+            except Exception as e:
+                print(f"Error loading preferences: {e}")
+        self.wake_word = wake_word.lower()
+        self.wake_word_edit.setText(self.wake_word)
+        self.update_wake_word_label(wake_word)
         
         # Load voice settings
         voice_speed = db.get_user_preference("voice_speed", "1.0")
@@ -663,11 +748,21 @@ class VoiceAssistantGUI(QMainWindow):
         # Apply voice settings
         self.apply_voice_settings()
     
+    def on_preference_changed(self, key, value):
+        """React to a preference change published by the database manager"""
+        if key == "wake_word":
+            # Read by the assistant thread on its next loop
+            self.wake_word = value.lower()
+            self.signals.wake_word.emit(value)
+        else:
+            self.apply_voice_settings()
+    
     def save_preferences(self):
         """Save user preferences to database"""
-        # Save wake word
-        wake_word = self.wake_word_edit.text()
-        db.set_user_preference("wake_word", wake_word)
+        # Save wake word (an empty wake word would match every phrase)
+        wake_word = self.wake_word_edit.text().strip()
+        if wake_word:
+            db.set_user_preference("wake_word", wake_word)
         
         # Save voice settings
         voice_speed = self.voice_speed_combo.currentText()
@@ -676,9 +771,6 @@ class VoiceAssistantGUI(QMainWindow):
         voice_gender = self.voice_gender_combo.currentText()
         db.set_user_preference("voice_gender", voice_gender)
         
-        # Apply voice settings
-        self.apply_voice_settings()
-        
         # Show confirmation
         QMessageBox.information(self, "Preferences Saved", "Your preferences have been saved successfully.")
     
@@ -686,20 +778,12 @@ class VoiceAssistantGUI(QMainWindow):
         """Apply voice settings to the speech engine"""
         try:
             # Get voice settings
-            voice_speed = float(self.voice_speed_combo.currentText())
-            voice_gender = self.voice_gender_combo.currentText()
-            
-            # Apply to pyttsx3 engine
-            engine = vassist.engine
-            engine.setProperty('rate', int(voice_speed * 200))  # Base rate is around 200
+            voice_speed = float(db.get_user_preference("voice_speed", "1.0"))
+            voice_gender = db.get_user_preference("voice_gender", "Male")
             
-            # Set voice gender
-            voices = engine.getProperty('voices')
-            for voice in voices:
-                # This is a simplistic approach - voice selection varies by platform
-                if voice_gender.lower() in voice.name.lower():
-                    engine.setProperty('voice', voice.id)
-                    break
+            # Applied by the speech worker before its next utterance
+            vassist.get_tts().configure(rate=int(voice_speed * 200),  # Base rate is around 200
+                                  gender=voice_gender)
         except Exception as e:
             print(f"Error applying voice settings: {e}")
     
@@ -720,6 +804,7 @@ def main():
     except Exception as e:
         print(f"Warning: Database connection error: {e}")
     
+    vassist.start_services()
     window = VoiceAssistantGUI()
     window.show()
     
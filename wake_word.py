@@ -0,0 +1,211 @@
+import functools
+import os
+import re
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import speech_recognition as sr
+
+SAMPLE_RATE = 16000
+# Average per-frame distance (0-2) accepted as a match when the templates can't tell us better
+DEFAULT_THRESHOLD = 0.35
+MAX_THRESHOLD = 0.6
+
+
+@functools.lru_cache(maxsize=4)
+def _mel_filterbank(n_mels: int, n_fft: int, sample_rate: int) -> np.ndarray:
+    """Triangular filters spaced evenly on the mel scale"""
+    def to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    mels = np.linspace(to_mel(0), to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * to_hz(mels) / sample_rate).astype(int)
+    filters = np.zeros((n_mels, n_fft // 2 + 1))
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            filters[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filters[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filters
+
+
+@functools.lru_cache(maxsize=4)
+def _dct_matrix(n_mfcc: int, n_mels: int) -> np.ndarray:
+    """Orthonormal DCT-II rows for the first ``n_mfcc`` coefficients"""
+    k = np.arange(n_mfcc)[:, None]
+    n = np.arange(n_mels)[None, :]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels)) * np.sqrt(2 / n_mels)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def mfcc(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, n_mfcc: int = 13, n_mels: int = 26,
+         frame_seconds: float = 0.025, hop_seconds: float = 0.010) -> np.ndarray:
+    """MFCC features, one row per 10 ms frame.
+
+    The energy coefficient is dropped and every frame is scaled to unit
+    length, so loudness does not matter and a frame's features do not
+    depend on the words around it.
+    """
+    frame, hop = int(sample_rate * frame_seconds), int(sample_rate * hop_seconds)
+    samples = samples.astype(np.float64)
+    if len(samples) < frame:
+        samples = np.pad(samples, (0, frame - len(samples)))
+    emphasized = np.append(samples[0], samples[1:] - 0.97 * samples[:-1])
+    n_frames = 1 + (len(emphasized) - frame) // hop
+    indexes = np.arange(frame)[None, :] + hop * np.arange(n_frames)[:, None]
+    frames = emphasized[indexes] * np.hamming(frame)
+
+    n_fft = 1 << (frame - 1).bit_length()
+    power = np.abs(np.fft.rfft(frames, n_fft)) ** 2 / n_fft
+    energies = np.log(np.maximum(power @ _mel_filterbank(n_mels, n_fft, sample_rate).T, 1e-10))
+    cepstra = energies @ _dct_matrix(n_mfcc, n_mels).T
+    cepstra = cepstra[:, 1:]
+    return cepstra / (np.linalg.norm(cepstra, axis=1, keepdims=True) + 1e-8)
+
+
+def match_cost(template: np.ndarray, features: np.ndarray) -> Tuple[float, int]:
+    """Best subsequence DTW alignment of ``template`` inside ``features``.
+
+    Returns the average per-frame distance and the frame where the match
+    ends. Each template frame may consume 0, 1 or 2 input frames, so
+    speech at half to twice the template's pace still lines up, and every
+    step is a vectorised operation over the whole input.
+    """
+    if len(features) < len(template) // 2:
+        return float('inf'), 0
+    squared = ((template ** 2).sum(axis=1)[:, None] + (features ** 2).sum(axis=1)[None, :]
+               - 2 * template @ features.T)
+    cost = np.sqrt(np.maximum(squared, 0))
+    inf = np.full(2, np.inf)
+    # The match may start at any input frame
+    best = cost[0]
+    for row in cost[1:]:
+        diagonal = np.concatenate((inf[:1], best[:-1]))
+        skip = np.concatenate((inf, best[:-2]))
+        best = row + np.minimum(np.minimum(best, diagonal), skip)
+    end = int(np.argmin(best))
+    return float(best[end] / len(template)), end
+
+
+def _slug(wake_word: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", wake_word.lower()).strip("_") or "wake_word"
+
+
+class WakeWordDetector:
+    """Spots the wake word on the device by comparing MFCC features with recorded examples.
+
+    Examples (templates) are kept per wake word under ``template_dir``.
+    Until ``min_templates`` exist, ``detect`` asks ``confirm`` (a speech
+    recognizer returning text) instead, and keeps every phrase that was
+    exactly the wake word as a new template. After a few uses detection
+    is local and offline; ``enroll`` adds templates directly.
+
+    Only phrases that already passed the audio stream's energy gate reach
+    ``detect``, so silence costs nothing.
+    """
+
+    def __init__(self, wake_word: str, confirm: Optional[Callable[[sr.AudioData], str]] = None,
+                 template_dir: str = "wake_words", threshold: Optional[float] = None,
+                 min_templates: int = 3, max_templates: int = 8):
+        self.confirm = confirm
+        self.template_dir = template_dir
+        self.fixed_threshold = threshold
+        self.min_templates = min_templates
+        self.max_templates = max_templates
+        self._lock = threading.Lock()
+        self.set_wake_word(wake_word)
+
+    @property
+    def ready(self) -> bool:
+        """True once detection no longer needs ``confirm``"""
+        return len(self.templates) >= self.min_templates
+
+    def set_wake_word(self, wake_word: str):
+        """Switch to another wake word and load its templates"""
+        with self._lock:
+            self.wake_word = wake_word.lower().strip()
+            self.directory = os.path.join(self.template_dir, _slug(self.wake_word))
+            self.templates: List[np.ndarray] = []
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    if name.endswith(".npy"):
+                        try:
+                            self.templates.append(np.load(os.path.join(self.directory, name)))
+                        except (OSError, ValueError) as e:
+                            print(f"Skipping wake word template {name}: {e}")
+            self._update_threshold()
+
+    def _update_threshold(self):
+        """Accept anything about as close as the templates are to each other"""
+        if self.fixed_threshold is not None:
+            self.threshold = self.fixed_threshold
+            return
+        spread = [match_cost(a, b)[0] for i, a in enumerate(self.templates)
+                  for j, b in enumerate(self.templates) if i != j]
+        spread = [value for value in spread if np.isfinite(value)]
+        self.threshold = min(max(spread) * 1.5, MAX_THRESHOLD) if spread else DEFAULT_THRESHOLD
+
+    @staticmethod
+    def _samples(audio: sr.AudioData) -> np.ndarray:
+        raw = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+        return np.frombuffer(raw, dtype=np.int16)
+
+    @staticmethod
+    def _trim(samples: np.ndarray) -> np.ndarray:
+        """Cut leading and trailing silence, so a template holds only the word"""
+        frame = SAMPLE_RATE // 100
+        count = len(samples) // frame
+        if not count:
+            return samples
+        frames = samples[:count * frame].astype(np.float64).reshape(count, frame)
+        energy = np.sqrt((frames ** 2).mean(axis=1))
+        voiced = np.nonzero(energy > energy.max() * 0.1)[0]
+        return samples[voiced[0] * frame:(voiced[-1] + 1) * frame]
+
+    def enroll(self, audio: sr.AudioData):
+        """Store ``audio`` (the wake word alone) as another template"""
+        features = mfcc(self._trim(self._samples(audio)))
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # Keep the newest examples so the templates follow the speaker's voice
+            if len(self.templates) >= self.max_templates:
+                oldest = sorted(name for name in os.listdir(self.directory) if name.endswith(".npy"))[0]
+                os.remove(os.path.join(self.directory, oldest))
+                self.templates.pop(0)
+            existing = [name for name in os.listdir(self.directory) if name.endswith(".npy")]
+            number = max([int(name[9:15]) for name in existing if name[9:15].isdigit()] or [0]) + 1
+            np.save(os.path.join(self.directory, f"template-{number:06d}.npy"), features)
+            self.templates.append(features)
+            self._update_threshold()
+
+    def score(self, audio: sr.AudioData) -> float:
+        """Distance of the closest template to any part of ``audio`` (lower is closer)"""
+        with self._lock:
+            templates = list(self.templates)
+        if not templates:
+            return float('inf')
+        features = mfcc(self._samples(audio))
+        return min(match_cost(template, features)[0] for template in templates)
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        """True if ``audio`` contains the wake word.
+
+        While not ``ready`` this calls ``confirm``, whose
+        ``sr.UnknownValueError``/``sr.RequestError`` propagate.
+        """
+        if self.ready:
+            return self.score(audio) <= self.threshold
+        if self.confirm is None:
+            return False
+        text = self.confirm(audio).lower().strip()
+        if self.wake_word not in text:
+            return False
+        if text == self.wake_word:
+            self.enroll(audio)
+        return True
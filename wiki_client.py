@@ -0,0 +1,111 @@
+import concurrent.futures
+import urllib.parse
+from typing import Dict, List, NamedTuple, Optional
+
+import requests
+
+from response_cache import ResponseCache
+
+USER_AGENT = "VVAProject/1.0 (voice assistant)"
+
+
+class WikipediaError(Exception):
+    """Wikipedia could not be reached or gave an unexpected answer"""
+
+
+class Article(NamedTuple):
+    """A Wikipedia page as the assistant needs it"""
+    title: str
+    summary: str
+    url: str
+
+
+class WikipediaClient:
+    """Looks up topics through the Wikipedia REST summary API.
+
+    One request returns the page's title, lead paragraph and canonical
+    URL, following redirects, so a query that names a page costs a
+    single round trip. Queries that don't (no such page, or a
+    disambiguation page) are searched, and the top ``candidates`` results
+    are fetched in parallel; the first real article in search order
+    wins. Articles are cached on disk per query for ``ttl`` seconds, so
+    a repeated question costs nothing. ``base_url`` can point at a local
+    stub server.
+    """
+
+    def __init__(self, base_url: str = "https://en.wikipedia.org", cache: Optional[ResponseCache] = None,
+                 ttl: float = 7 * 24 * 3600, candidates: int = 3, timeout: float = 5):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache or ResponseCache(cache_file="wikipedia_cache.json", ttl=ttl)
+        self.candidates = candidates
+        self.timeout = timeout
+        # Kept open between lookups
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+
+    def _get(self, path: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """JSON from ``path``, or None if there is no such page"""
+        try:
+            response = self.session.get(self.base_url + path, params=params, timeout=self.timeout)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise WikipediaError(f"Wikipedia request failed: {e}") from e
+
+    def summary(self, title: str) -> Optional[Dict]:
+        """The REST summary of the page called ``title`` (redirects followed), or None"""
+        return self._get("/api/rest_v1/page/summary/" + urllib.parse.quote(title.replace(" ", "_"), safe=""),
+                         {'redirect': "true"})
+
+    def search(self, query: str, limit: int = 5) -> List[str]:
+        """Titles of the pages that best match ``query``, best first"""
+        data = self._get("/w/api.php", {'action': "query", 'list': "search", 'srsearch': query,
+                                        'srlimit': limit, 'srprop': "", 'format': "json"}) or {}
+        return [result['title'] for result in data.get('query', {}).get('search', [])]
+
+    def lookup(self, query: str) -> Optional[Article]:
+        """The article ``query`` is about, or None if Wikipedia has nothing on it"""
+        query = query.strip()
+        if not query:
+            return None
+        cached = self.cache.get('article', query)
+        if cached is not None:
+            return Article(**cached)
+
+        page = self.summary(query)
+        if page is None or page.get('type') == "disambiguation" or not page.get('extract'):
+            skip = page['title'] if page else None
+            titles = [title for title in self.search(query, self.candidates + 1) if title != skip]
+            page = self._best(titles[:self.candidates])
+        if page is None:
+            return None
+        article = Article(page['title'], page.get('extract', ""), self._url(page))
+        self.cache.put('article', query, article._asdict())
+        return article
+
+    def _best(self, titles: List[str]) -> Optional[Dict]:
+        """The first of ``titles`` that is a real article, fetching them all at once"""
+        if not titles:
+            return None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(titles)) as pool:
+            futures = [pool.submit(self.summary, title) for title in titles]
+        error = None
+        for future in futures:
+            try:
+                page = future.result()
+            except WikipediaError as e:
+                error = error or e
+                continue
+            if page is not None and page.get('type') == "standard" and page.get('extract'):
+                return page
+        if error is not None:
+            raise error
+        return None
+
+    def _url(self, page: Dict) -> str:
+        try:
+            return page['content_urls']['desktop']['page']
+        except KeyError:
+            return f"{self.base_url}/wiki/{urllib.parse.quote(page['title'].replace(' ', '_'))}"
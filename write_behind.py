@@ -0,0 +1,151 @@
+import datetime
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+
+class WriteBehindQueue:
+    """Non-blocking front end for DatabaseManager writes.
+
+    Writes are queued and applied by a background thread in batches, one
+    ``db.batch()`` per flush. A batch is written once ``batch_size`` writes
+    are waiting or ``flush_interval`` seconds after the first one arrived,
+    and immediately on ``flush()``/``close()``. When ``max_pending`` writes
+    are already queued the caller blocks until there is room
+    (back-pressure), which is counted in ``metrics()``.
+    """
+
+    def __init__(self, db, max_pending: int = 1000, batch_size: int = 64,
+                 flush_interval: float = 0.5):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'largest_batch': 0,
+            'errors': 0,
+            'backpressure_waits': 0,
+            'backpressure_seconds': 0.0,
+            'last_flush_ms': 0.0
+        }
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _timestamp() -> str:
+        """Messages keep the time they were logged, not the time they were written"""
+        return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _put(self, item):
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            started = time.monotonic()
+            self._queue.put(item)
+            with self._stats_lock:
+                self._stats['backpressure_waits'] += 1
+                self._stats['backpressure_seconds'] += time.monotonic() - started
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+
+    def log_message(self, speaker: str, text: str, conversation_id: int):
+        """Queue a conversation message"""
+        self._put(('log_message', (speaker, text, conversation_id, self._timestamp())))
+
+    def log_command(self, command_type: str, command: str, success: bool = True, error: str = None):
+        """Queue a command execution record"""
+        self._put(('log_command', (command_type, command, success, error, self._timestamp())))
+
+    def set_user_preference(self, key: str, value: str):
+        """Queue a preference update"""
+        self._put(('set_user_preference', (key, value)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is written; False on timeout"""
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Write what is left and stop the writer thread"""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def metrics(self) -> Dict:
+        """Counters for queue depth, batching and back-pressure"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['pending'] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            # Gather a batch until it is full, the deadline passes or a flush is requested
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    self._queue.put(None)  # Handle shutdown after this batch
+                    break
+                if item[0] == 'flush':
+                    waiters.append(item[1])
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+            for done in waiters:
+                done.set()
+
+    def _write(self, batch):
+        """Apply one batch inside a single db transaction"""
+        if not batch:
+            return
+        # Only the last value matters when a preference is set repeatedly
+        latest_prefs = {}
+        for method, args in batch:
+            if method == 'set_user_preference':
+                latest_prefs[args[0]] = args
+        started = time.monotonic()
+        errors = 0
+        try:
+            with self.db.batch():
+                for method, args in batch:
+                    if method == 'set_user_preference' and latest_prefs.get(args[0]) is not args:
+                        continue
+                    try:
+                        getattr(self.db, method)(*args)
+                    except Exception as e:
+                        errors += 1
+                        print(f"Write-behind error in {method}: {e}")
+        except Exception as e:
+            errors = len(batch)
+            print(f"Write-behind batch failed: {e}")
+
+        with self._stats_lock:
+            self._stats['written'] += len(batch) - errors
+            self._stats['errors'] += errors
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['last_flush_ms'] = (time.monotonic() - started) * 1000